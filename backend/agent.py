@@ -1,58 +1,245 @@
-from llm.llama3 import LlamaClient
+import re
+from backend.intent import IntentClassifier
+from backend.memory import MemoryStore
+from llm.llama3 import FALLBACK_REPLIES, LlamaClient
 from tools.reservation import ReservationTool
 from tools.recommend import RecommendationTool
-from utils.logger import log_message, log_error
+from utils import tracing
+from utils.logger import log_message, log_debug
+
+SLOT_INTENTS = ('make_reservation', 'cancel_reservation', 'modify_reservation')
+EXTRACTION_CONTEXT_TOKENS = 300  # history given to structured extraction
+
+# Replies to "shall I book this?"
+CONFIRM_RE = re.compile(r"^\W*(yes|yeah|yep|yup|sure|ok|okay|confirm|confirmed|correct|please do|go ahead|"
+                        r"book it|sounds good|that'?s right)\b", re.IGNORECASE)
+DECLINE_RE = re.compile(r"^\W*(no|nope|don'?t|do not|stop|wait|never mind|nevermind)\b", re.IGNORECASE)
 
 class FoodieSpotAgent:
-    def __init__(self, api_key):
-        self.llama_client = LlamaClient(api_key)
-        self.reservation_tool = ReservationTool()
-        self.recommendation_tool = RecommendationTool()
+    def __init__(self, api_key, intent_threshold=0.75, structured_extraction=True, llama_client=None,
+                 data_file="data/restaurant_data.json", db_path="data/reservations.db"):
+        self.llama_client = llama_client or LlamaClient(api_key)
+        self.intent_classifier = IntentClassifier(threshold=intent_threshold)
+        self.structured_extraction = structured_extraction
+        self.reservation_tool = ReservationTool(data_file, db_path)
+        self.recommendation_tool = RecommendationTool(data_file)
+        self.memory = MemoryStore()
         log_message("FoodieSpot Agent initialized")
     
-    def process_message(self, user_message):
-        """Main function to process user messages"""
-        log_message(f"Processing: {user_message}")
-        
-        # Step 1: Detect intent
-        intent = self.llama_client.detect_intent(user_message)
-        log_message(f"Intent detected: {intent}")
+    def process_message(self, user_message, conversation_id=None):
+        """Main function to process user messages.
         
+        With a conversation_id, earlier turns of that conversation (recent
+        ones verbatim, older ones summarized) inform the reply, and booking
+        details carry over between messages.
+        """
+        log_message("Processing message (%d chars)", len(user_message), sample=True)
+        log_debug("Message: %s", user_message)
+        memory = self.memory.get(conversation_id) if conversation_id else None
+        with tracing.turn():
+            intent, reply = 'make_reservation', self.confirm_booking(user_message, memory)
+            if reply is None:
+                intent, slots = self.resolve_intent(user_message, memory)
+                reply = self.process_resolved(user_message, intent, slots, memory)
+            tracing.annotate(intent=intent)
+        self.remember(memory, user_message, intent, reply)
+        return reply
+    
+    def remember(self, memory, user_message, intent, reply):
+        """Record a finished turn in the conversation's memory"""
+        if memory is None:
+            return
+        memory.add_exchange(user_message, reply)
+        if intent in SLOT_INTENTS and reply.startswith("✅"):
+            # The booking, cancellation or change went through; start the next one fresh
+            memory.clear_slots()
+    
+    def refresh_summary(self, memory):
+        """Fold turns that left the memory's token budget into its summary (one LLM call, only when needed)"""
+        request = memory.summary_request() if memory is not None else None
+        if request is None:
+            return
+        messages, count = request
+        with tracing.span('summarize', turns=count):
+            summary = self.llama_client.chat_completion(messages, max_tokens=memory.summary_tokens, temperature=0.0)
+        memory.apply_summary(None if summary in FALLBACK_REPLIES else summary, count)
+    
+    def extraction_context(self, memory):
+        """Transcript of the conversation so far for structured extraction, or None"""
+        if memory is None or not memory.turns:
+            return None
+        self.refresh_summary(memory)
+        return memory.transcript(EXTRACTION_CONTEXT_TOKENS)
+    
+    def process_resolved(self, user_message, intent, slots, memory=None):
+        """Run the handler for an already resolved intent"""
         # Step 2: Call appropriate tool based on intent
         if "recommendation" in intent:
-            return self.handle_recommendation(user_message)
+            return self.handle_recommendation(user_message, slots)
         elif "make_reservation" in intent:
-            return self.handle_reservation(user_message)
+            return self.handle_reservation(user_message, slots, memory)
         elif "cancel_reservation" in intent:
-            return self.handle_cancellation(user_message)
+            return self.handle_cancellation(user_message, slots)
         elif "modify_reservation" in intent:
-            return self.handle_modification(user_message)
+            return self.handle_modification(user_message, slots)
         else:
-            return self.handle_general_info(user_message)
+            return self.handle_general_info(user_message, memory)
     
-    def handle_recommendation(self, user_message):
-        """Handle restaurant recommendations"""
-        # Extract cuisine from message using LLaMA
+    def process_message_stream(self, user_message, conversation_id=None):
+        """Like process_message, but yields the reply in chunks as it is generated"""
+        log_message("Processing message (%d chars, streaming)", len(user_message), sample=True)
+        log_debug("Message: %s", user_message)
+        memory = self.memory.get(conversation_id) if conversation_id else None
+        parts = []
+        with tracing.turn(streamed=True):
+            confirmed = self.confirm_booking(user_message, memory)
+            if confirmed is not None:
+                tracing.annotate(intent='make_reservation')
+                yield confirmed
+                self.remember(memory, user_message, 'make_reservation', confirmed)
+                return
+            intent, slots = self.resolve_intent(user_message, memory)
+            tracing.annotate(intent=intent)
+            
+            if any(name in intent for name in ("recommendation", "make_reservation",
+                                                "cancel_reservation", "modify_reservation")):
+                parts.append(self.process_resolved(user_message, intent, slots, memory))
+                yield parts[-1]
+            else:
+                self.refresh_summary(memory)
+                for chunk in self.llama_client.stream_chat_completion(
+                        self.general_info_messages(user_message, memory)):
+                    parts.append(chunk)
+                    yield chunk
+        self.remember(memory, user_message, intent, "".join(parts))
+    
+    def resolve_intent(self, user_message, memory=None):
+        """Return (intent, slots) for a message"""
+        # Step 1: Detect intent, locally when confident, otherwise with LLaMA.
+        # Structured extraction returns intent and slots in the same call.
+        slots = {}
+        with tracing.span('intent') as span:
+            intent = self.intent_classifier.predict(user_message)
+            span.set(local=bool(intent))
+        if intent:
+            log_message("Intent classified locally: %s", intent, sample=True)
+            if self.structured_extraction and intent in SLOT_INTENTS:
+                # The local classifier gives only the intent; restaurant, date, time and name need extracting
+                extraction = self.llama_client.extract_structured(user_message,
+                                                                  context=self.extraction_context(memory))
+                if extraction:
+                    extraction.pop('intent')
+                    slots = extraction
+        elif self.structured_extraction:
+            extraction = self.llama_client.extract_structured(user_message, context=self.extraction_context(memory))
+            if extraction:
+                intent = extraction.pop('intent')
+                slots = extraction
+                log_message("Intent extracted: %s", intent, sample=True)
+        if not intent:
+            intent = self.llama_client.detect_intent(user_message)
+            log_message("Intent detected: %s", intent, sample=True)
+        if memory is not None and intent in SLOT_INTENTS:
+            slots = memory.merge_slots(intent, slots)
+        return intent, slots
+    
+    def _clean_cuisine(self, cuisine):
+        cuisine = cuisine.strip().strip('."\'').lower()
+        for suffix in (" cuisine", " food", " restaurants", " restaurant"):
+            if cuisine.endswith(suffix):
+                cuisine = cuisine[:-len(suffix)]
+        return cuisine.strip()
+    
+    def recommendation_filters(self, user_message, slots=None):
+        """Return (cuisine, location) for a recommendation, or (None, None) if the cuisine needs LLaMA"""
+        slots = slots or {}
+        if 'cuisine' in slots:
+            # Slots came from structured extraction; None means no cuisine was asked for
+            return slots['cuisine'] or 'any', slots.get('location')
+        query = self.recommendation_tool.parse_query(user_message)
+        if not query['cuisine'] and not query['location'] and (query['ambience'] or query['features']):
+            # Other preferences are enough to search on; no need to ask LLaMA for a cuisine
+            return 'any', None
+        return query['cuisine'], query['location']
+    
+    def cuisine_messages(self, user_message):
+        """Prompt asking LLaMA for the cuisine in a message"""
         cuisine_prompt = f"""
         Extract the cuisine type from this message. If no specific cuisine mentioned, return 'any'.
         Message: "{user_message}"
         Respond with only the cuisine name.
         """
-        cuisine = self.llama_client.chat_completion([{"role": "user", "content": cuisine_prompt}], max_tokens=20)
+        return [{"role": "user", "content": cuisine_prompt}]
+    
+    def recommendation_reply(self, cuisine, location, user_message=''):
+        """Format recommendations for a cuisine and/or location (plus other preferences in user_message)"""
+        cuisine = self._clean_cuisine(cuisine or 'any')
+        if cuisine == 'any':
+            cuisine = None
         
-        if "any" in cuisine.lower():
-            restaurants = self.recommendation_tool.get_all_restaurants()[:5]
-        else:
-            restaurants = self.recommendation_tool.recommend_by_cuisine(cuisine.strip())
+        # Fuzzy search resolves misspelt or loosely phrased values ("japaneese", LLM output)
+        restaurants = self.recommendation_tool.search(user_message or '', cuisine=cuisine, location=location)
+        if not restaurants and not cuisine and not location:
+            with tracing.span('catalog_lookup') as span:
+                restaurants = self.recommendation_tool.get_all_restaurants()[:5]
+                span.set(results=len(restaurants))
         
         if restaurants:
-            formatted_list = self.recommendation_tool.format_restaurant_list(restaurants)
+            with tracing.span('rendering'):
+                formatted_list = self.recommendation_tool.format_restaurant_list(restaurants)
             return f"Here are some great restaurant recommendations:\n\n{formatted_list}"
         else:
             return "I couldn't find any restaurants matching your preferences. Would you like to see all our locations?"
     
-    def handle_reservation(self, user_message):
-        """Handle NEW reservation requests"""
+    def handle_recommendation(self, user_message, slots=None):
+        """Handle restaurant recommendations"""
+        cuisine, location = self.recommendation_filters(user_message, slots)
+        if not cuisine and not location:
+            # Extract cuisine from message using LLaMA
+            cuisine = self.llama_client.chat_completion(self.cuisine_messages(user_message), max_tokens=20)
+        return self.recommendation_reply(cuisine, location, user_message)
+    
+    def handle_reservation(self, user_message, slots=None, memory=None):
+        """Handle NEW reservation requests.
+        
+        A booking with every detail is not made straight away: it is read
+        back and held in the conversation's memory until the customer
+        confirms it (see confirm_booking).
+        """
+        slots = slots or {}
+        restaurant = self.recommendation_tool.find_restaurant(slots['restaurant']) if slots.get('restaurant') else None
+        if slots.get('restaurant') and restaurant is None:
+            return (f"Sorry, I couldn't find a restaurant called **{slots['restaurant']}**. "
+                    "Could you check the name, or ask me for recommendations?")
+        date, time, party_size = slots.get('date'), slots.get('time'), slots.get('party_size')
+        
+        if restaurant and date and time and party_size and slots.get('customer_name') and slots.get('phone'):
+            if self.reservation_tool.check_availability(restaurant['id'], date, time, party_size):
+                booking = {'restaurant_id': restaurant['id'], 'restaurant_name': restaurant['name'],
+                           'date': date, 'time': time, 'party_size': party_size,
+                           'customer_name': slots['customer_name'], 'phone': slots['phone']}
+                if memory is None:
+                    return (f"{self._describe_booking(booking)}\n\n"
+                            "Please use the booking form to confirm this reservation.")
+                memory.hold_booking(booking)
+                return (f"Please check these details:\n\n{self._describe_booking(booking)}\n\n"
+                        "Reply **yes** to book it, or tell me what to change.")
+        
+        if date and time and party_size:
+            restaurant_ids = [restaurant['id']] if restaurant else None
+            slots_found = self.reservation_tool.find_available_slots(date, time, party_size,
+                                                                     restaurant_ids=restaurant_ids)
+            if slots_found:
+                response = f"Here are the closest available tables for {party_size} on {date}:\n\n"
+                for i, slot in enumerate(slots_found, 1):
+                    info = self.reservation_tool.get_restaurant_info(slot['restaurant_id'])
+                    name = info['name'] if info else slot['restaurant_id']
+                    response += f"{i}. {name} at {slot['time']}\n"
+                response += "\nTell me which one you'd like, along with your name and phone number."
+                return response
+            return (f"Sorry, I couldn't find a free table for {party_size} around {time} on {date}. "
+                    "Would you like to try another date or time?")
+        
         restaurants = self.recommendation_tool.get_all_restaurants()
         restaurant_names = [r['name'] for r in restaurants[:5]]
         
@@ -63,8 +250,58 @@ class FoodieSpotAgent:
         response += "\n📅 **For your new reservation, please tell me:**\n- Which restaurant?\n- What date and time?\n- How many people?\n- Any special requests?"
         return response
     
-    def handle_cancellation(self, user_message):
+    @staticmethod
+    def _describe_booking(booking):
+        return (f"- **Restaurant:** {booking['restaurant_name']}\n"
+                f"- **Date:** {booking['date']}\n- **Time:** {booking['time']}\n"
+                f"- **Party Size:** {booking['party_size']} people\n"
+                f"- **Name:** {booking['customer_name']}\n- **Phone:** {booking['phone']}")
+    
+    def confirm_booking(self, user_message, memory):
+        """Reply to a message answering a held booking: book it on yes, drop it on no.
+        
+        Returns None (and drops the held booking) for any other message, which
+        is then handled as usual.
+        """
+        booking = memory.take_booking() if memory is not None else None
+        if booking is None:
+            return None
+        if DECLINE_RE.match(user_message):
+            return "Okay, I haven't booked it. What would you like to change?"
+        if not CONFIRM_RE.match(user_message):
+            return None
+        reservation = self.reservation_tool.make_reservation(
+            booking['restaurant_id'], booking['date'], booking['time'], booking['party_size'],
+            booking['customer_name'], booking['phone'])
+        if not reservation:
+            return (f"Sorry, that table at {booking['restaurant_name']} was just taken. "
+                    "Would you like to try another time?")
+        return (f"✅ **Reservation Confirmed!**\n\n"
+                f"- **Restaurant:** {booking['restaurant_name']}\n"
+                f"- **Date:** {booking['date']}\n- **Time:** {reservation['time']}\n"
+                f"- **Party Size:** {booking['party_size']} people\n"
+                f"- **Confirmation Number:** {reservation['id']}")
+    
+    def _describe_reservation(self, reservation):
+        info = self.reservation_tool.get_restaurant_info(reservation['restaurant_id'])
+        name = info['name'] if info else reservation['restaurant_id']
+        return (f"- **{name}** on {reservation['date']} at {reservation['time']}, "
+                f"{reservation['party_size']} people (confirmation {reservation['id']})")
+    
+    def handle_cancellation(self, user_message, slots=None):
         """Handle reservation cancellations"""
+        slots = slots or {}
+        if slots.get('confirmation_number'):
+            reservation = self.reservation_tool.cancel_reservation(slots['confirmation_number'])
+            if reservation:
+                return f"✅ **Reservation Cancelled Successfully**\n\n{self._describe_reservation(reservation)}"
+        elif slots.get('phone') or slots.get('customer_name'):
+            reservations = [r for r in self.reservation_tool.find_reservations(
+                phone=slots.get('phone'), customer_name=slots.get('customer_name')) if r['status'] == 'confirmed']
+            if reservations:
+                listing = "\n".join(self._describe_reservation(r) for r in reservations)
+                return f"I found these reservations:\n\n{listing}\n\nWhich confirmation number should I cancel?"
+        
         return """I can help you cancel your reservation. To cancel, I'll need:
 
 📋 **Cancellation Information:**
@@ -82,8 +319,17 @@ Please provide these details and I'll help you cancel your reservation right awa
 
 💡 **Note:** Cancellations made 24 hours in advance help us better serve other guests!"""
 
-    def handle_modification(self, user_message):
+    def handle_modification(self, user_message, slots=None):
         """Handle reservation modifications"""
+        slots = slots or {}
+        if slots.get('confirmation_number') and (slots.get('date') or slots.get('time') or slots.get('party_size')):
+            reservation = self.reservation_tool.modify_reservation(
+                slots['confirmation_number'], date=slots.get('date'), time=slots.get('time'),
+                party_size=slots.get('party_size'))
+            if reservation:
+                return f"✅ **Reservation Updated**\n\n{self._describe_reservation(reservation)}"
+            return "Sorry, I couldn't make that change. The new time may be fully booked - would you like to try another?"
+        
         return """I'd be happy to help you modify your reservation! 
 
 📝 **To modify your booking, I need:**
@@ -103,22 +349,27 @@ Please provide these details and I'll help you cancel your reservation right awa
 
 Please provide your current reservation details and what you'd like to change."""
     
-    def handle_general_info(self, user_message):
-        """Handle general information requests"""
-        # Get restaurant context
-        restaurants = self.recommendation_tool.get_all_restaurants()
-        context = f"FoodieSpot has {len(restaurants)} locations across the city."
+    def general_info_messages(self, user_message, memory=None):
+        """Prompt for a general information answer, with the conversation so far if there is one"""
+        # Only the restaurants the question is about, retrieved from the catalog
+        context = self.recommendation_tool.general_context(user_message)
         
-        # Generate response with LLaMA
         system_prompt = f"""
         You are FoodieBot for FoodieSpot restaurant chain.
         Context: {context}
         Be helpful, friendly, and informative about our restaurants.
+        Answer from the context; if it does not cover the question, say so instead of guessing.
         """
         
-        messages = [
-            {"role": "system", "content": system_prompt},
+        history = memory.context_messages() if memory is not None else []
+        return [{"role": "system", "content": system_prompt}] + history + [
             {"role": "user", "content": user_message}
         ]
-        
-        return self.llama_client.chat_completion(messages)
+    
+    def handle_general_info(self, user_message, memory=None):
+        """Handle general information requests"""
+        # Generate response with LLaMA
+        self.refresh_summary(memory)
+        messages = self.general_info_messages(user_message, memory)
+        with tracing.span('generation'):
+            return self.llama_client.chat_completion(messages)
@@ -0,0 +1,210 @@
+import asyncio
+from backend.agent import EXTRACTION_CONTEXT_TOKENS, FoodieSpotAgent, SLOT_INTENTS
+from llm.llama3 import FALLBACK_REPLIES
+from llm.async_llama import AsyncLlamaClient
+from tools.async_tools import AsyncReservationTool
+from utils import tracing
+from utils.logger import log_message, log_debug, log_error
+
+AVAILABILITY_INTENTS = ('make_reservation', 'modify_reservation')  # intents that search free slots
+
+
+class AsyncFoodieSpotAgent(FoodieSpotAgent):
+    """asyncio version of FoodieSpotAgent.
+
+    process_message, process_message_stream, resolve_intent,
+    handle_recommendation and handle_general_info are coroutines (or an
+    async generator) here; the reservation handlers are reused from the
+    sync agent and run in the thread pool. While an LLM call decides the
+    intent, candidate recommendations are computed and the availability
+    engine is warmed speculatively; either is cancelled if the intent turns
+    out not to need it.
+    """
+
+    def __init__(self, api_key, intent_threshold=0.75, structured_extraction=True, llama_client=None,
+                 data_file="data/restaurant_data.json", db_path="data/reservations.db"):
+        super().__init__(api_key, intent_threshold, structured_extraction,
+                         llama_client=llama_client or AsyncLlamaClient(api_key),
+                         data_file=data_file, db_path=db_path)
+        self.async_reservation_tool = AsyncReservationTool(self.reservation_tool)
+        self._prefetches = set()
+
+    async def aclose(self):
+        await self.llama_client.aclose()
+
+    def _filters_key(self, cuisine, location):
+        return self._clean_cuisine(cuisine or 'any'), (location or '').strip().lower()
+
+    def _prefetch_availability(self):
+        """Start warming the availability engine in the background; returns the task"""
+        task = asyncio.create_task(self.async_reservation_tool.prefetch_availability())
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetch_done)
+        return task
+
+    def _prefetch_done(self, task):
+        self._prefetches.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log_error("Availability prefetch failed: %s", task.exception())
+
+    async def _speculative_recommendation(self, user_message):
+        """Recommendations from filters found locally in the message, or None"""
+        cuisine, location = await asyncio.to_thread(self.recommendation_filters, user_message)
+        if not cuisine and not location:
+            return None
+        reply = await asyncio.to_thread(self.recommendation_reply, cuisine, location, user_message)
+        return (cuisine, location), reply
+
+    async def process_message(self, user_message, conversation_id=None):
+        """Main function to process user messages"""
+        log_message("Processing message (%d chars)", len(user_message), sample=True)
+        log_debug("Message: %s", user_message)
+        memory = self.memory.get(conversation_id) if conversation_id else None
+        with tracing.turn():
+            intent, reply = 'make_reservation', await asyncio.to_thread(self.confirm_booking, user_message, memory)
+            if reply is None:
+                intent, slots, speculative = await self.resolve_intent(user_message, memory)
+                try:
+                    reply = await self.process_resolved(user_message, intent, slots, speculative, memory)
+                finally:
+                    if speculative and not speculative.done():
+                        speculative.cancel()
+            tracing.annotate(intent=intent)
+        self.remember(memory, user_message, intent, reply)
+        return reply
+
+    async def process_message_stream(self, user_message, conversation_id=None):
+        """Like process_message, but yields the reply in chunks as it is generated"""
+        log_message("Processing message (%d chars, streaming)", len(user_message), sample=True)
+        log_debug("Message: %s", user_message)
+        memory = self.memory.get(conversation_id) if conversation_id else None
+        parts = []
+        with tracing.turn(streamed=True):
+            confirmed = await asyncio.to_thread(self.confirm_booking, user_message, memory)
+            if confirmed is not None:
+                tracing.annotate(intent='make_reservation')
+                yield confirmed
+                self.remember(memory, user_message, 'make_reservation', confirmed)
+                return
+            intent, slots, speculative = await self.resolve_intent(user_message, memory)
+            tracing.annotate(intent=intent)
+            try:
+                if any(name in intent for name in ("recommendation", "make_reservation",
+                                                    "cancel_reservation", "modify_reservation")):
+                    parts.append(await self.process_resolved(user_message, intent, slots, speculative, memory))
+                    yield parts[-1]
+                else:
+                    await self.refresh_summary(memory)
+                    messages = await asyncio.to_thread(self.general_info_messages, user_message, memory)
+                    async for chunk in self.llama_client.stream_chat_completion(messages):
+                        parts.append(chunk)
+                        yield chunk
+            finally:
+                if speculative and not speculative.done():
+                    speculative.cancel()
+        self.remember(memory, user_message, intent, "".join(parts))
+
+    async def refresh_summary(self, memory):
+        """Fold turns that left the memory's token budget into its summary"""
+        request = memory.summary_request() if memory is not None else None
+        if request is None:
+            return
+        messages, count = request
+        with tracing.span('summarize', turns=count):
+            summary = await self.llama_client.chat_completion(messages, max_tokens=memory.summary_tokens,
+                                                              temperature=0.0)
+        memory.apply_summary(None if summary in FALLBACK_REPLIES else summary, count)
+
+    async def extraction_context(self, memory):
+        """Transcript of the conversation so far for structured extraction, or None"""
+        if memory is None or not memory.turns:
+            return None
+        await self.refresh_summary(memory)
+        return memory.transcript(EXTRACTION_CONTEXT_TOKENS)
+
+    async def process_resolved(self, user_message, intent, slots, speculative=None, memory=None):
+        """Run the handler for an already resolved intent"""
+        if speculative and "recommendation" not in intent:
+            speculative.cancel()
+        if "recommendation" in intent:
+            return await self.handle_recommendation(user_message, slots, speculative)
+        elif "make_reservation" in intent:
+            return await asyncio.to_thread(self.handle_reservation, user_message, slots, memory)
+        elif "cancel_reservation" in intent:
+            return await asyncio.to_thread(self.handle_cancellation, user_message, slots)
+        elif "modify_reservation" in intent:
+            return await asyncio.to_thread(self.handle_modification, user_message, slots)
+        return await self.handle_general_info(user_message, memory)
+
+    async def resolve_intent(self, user_message, memory=None):
+        """Return (intent, slots, speculative_task) for a message"""
+        slots = {}
+        speculative = None
+        with tracing.span('intent') as span:
+            intent = self.intent_classifier.predict(user_message)
+            span.set(local=bool(intent))
+        if intent:
+            log_message("Intent classified locally: %s", intent, sample=True)
+            if intent in AVAILABILITY_INTENTS:
+                # Overlap the slot index build with extraction
+                self._prefetch_availability()
+            if self.structured_extraction and intent in SLOT_INTENTS:
+                extraction = await self.llama_client.extract_structured(
+                    user_message, context=await self.extraction_context(memory))
+                if extraction:
+                    extraction.pop('intent')
+                    slots = extraction
+            if memory is not None and intent in SLOT_INTENTS:
+                slots = memory.merge_slots(intent, slots)
+            return intent, slots, speculative
+
+        # The LLM decides the intent; overlap it with a local recommendation lookup and availability
+        speculative = asyncio.create_task(self._speculative_recommendation(user_message))
+        prefetch = self._prefetch_availability()
+        try:
+            if self.structured_extraction:
+                extraction = await self.llama_client.extract_structured(
+                    user_message, context=await self.extraction_context(memory))
+                if extraction:
+                    intent = extraction.pop('intent')
+                    slots = extraction
+                    log_message("Intent extracted: %s", intent, sample=True)
+            if not intent:
+                intent = await self.llama_client.detect_intent(user_message)
+                log_message("Intent detected: %s", intent, sample=True)
+        except BaseException:
+            speculative.cancel()
+            prefetch.cancel()
+            raise
+        if not any(name in intent for name in AVAILABILITY_INTENTS):
+            prefetch.cancel()
+        if memory is not None and intent in SLOT_INTENTS:
+            slots = memory.merge_slots(intent, slots)
+        return intent, slots, speculative
+
+    async def handle_recommendation(self, user_message, slots=None, speculative=None):
+        """Handle restaurant recommendations"""
+        cuisine, location = await asyncio.to_thread(self.recommendation_filters, user_message, slots)
+        if speculative is not None:
+            try:
+                result = await speculative
+            except asyncio.CancelledError:
+                if not speculative.cancelled():
+                    raise
+                result = None
+            except Exception as e:
+                log_error("Speculative recommendation failed: %s", e)
+                result = None
+            if result and self._filters_key(*result[0]) == self._filters_key(cuisine, location):
+                return result[1]
+
+        if not cuisine and not location:
+            cuisine = await self.llama_client.chat_completion(self.cuisine_messages(user_message), max_tokens=20)
+        return await asyncio.to_thread(self.recommendation_reply, cuisine, location, user_message)
+
+    async def handle_general_info(self, user_message, memory=None):
+        """Handle general information requests"""
+        await self.refresh_summary(memory)
+        messages = await asyncio.to_thread(self.general_info_messages, user_message, memory)
+        with tracing.span('generation'):
+            return await self.llama_client.chat_completion(messages)
@@ -0,0 +1,173 @@
+import math
+import re
+import threading
+from collections import Counter
+from utils import tracing
+
+# High-precision patterns; a message matching rules for more than one
+# intent is left to the model.
+RULES = {
+    'cancel_reservation': [
+        r"\b(cancel|call off|scrap|drop)\b.*\b(reservation|booking|table|dinner|lunch)\b",
+        r"\b(reservation|booking)\b.*\b(cancel(l?ed)?|call(ed)? off)\b",
+        r"\bcan'?t make it\b",
+    ],
+    'modify_reservation': [
+        r"\b(change|modify|move|reschedule|update|switch|push back|amend)\b.*\b(reservation|booking|table)\b",
+        r"\b(reservation|booking)\b.*\b(to|for) (a )?(different|another|later|earlier)\b",
+        r"\b(add|bring) (one|two|\d+) more (people|person|guests?)\b",
+    ],
+    'make_reservation': [
+        r"\b(book|reserve)\b.*\b(table|spot|seat|dinner|lunch|for \d+|tonight|tomorrow)\b",
+        r"\b(make|need|want|like) (a |to make a )?(new )?(reservation|booking)\b",
+        r"\btable for (\d+|one|two|three|four|five|six|seven|eight)\b",
+    ],
+    'restaurant_recommendation': [
+        r"\b(recommend|suggest|suggestions?|recommendations?)\b",
+        r"\b(show|list|find) (me )?(some |all )?(the )?\w*\s?(restaurants|places|spots|locations)\b",
+        r"\bwhere (can|should) (i|we) (eat|go)\b",
+    ],
+}
+
+TRAINING_EXAMPLES = {
+    'make_reservation': [
+        "I want to book a table for four tonight",
+        "can I reserve a table for 2 at 7pm",
+        "make a reservation for tomorrow evening",
+        "book dinner for six on Friday",
+        "I'd like a table at Sakura Garden",
+        "reserve a spot for my family this weekend",
+        "we need a table for 8 people",
+        "get me a booking at The Spice House",
+    ],
+    'modify_reservation': [
+        "change my reservation to 8pm",
+        "can I move my booking to tomorrow",
+        "modify my reservation party size to five",
+        "reschedule my dinner booking",
+        "update the time of my table",
+        "we need to add two more people to our booking",
+        "switch my reservation to a different day",
+        "push my booking back an hour",
+    ],
+    'cancel_reservation': [
+        "cancel my reservation",
+        "I need to cancel my booking tonight",
+        "please call off our table for tomorrow",
+        "we can't make it, cancel the dinner",
+        "delete my reservation",
+        "remove my booking at Casa di Pasta",
+        "I won't be coming, cancel it",
+        "cancel the table for four",
+    ],
+    'restaurant_recommendation': [
+        "show me Italian restaurants",
+        "recommend a good sushi place",
+        "any vegan restaurants nearby",
+        "what are the best places for Mexican food",
+        "suggest somewhere romantic for dinner",
+        "show me all restaurant locations",
+        "which restaurant has rooftop seating",
+        "I want Indian food recommendations",
+        "find me a family friendly restaurant downtown",
+    ],
+    'general_info': [
+        "hello",
+        "hi there what can you do",
+        "what are your opening hours",
+        "tell me about FoodieSpot",
+        "do you have parking",
+        "how many locations do you have",
+        "thanks for the help",
+        "is there a dress code",
+        "do you offer gift cards",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def tokenize(text):
+    """Lowercase word unigrams plus bigrams"""
+    words = _TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """Local intent classifier used before falling back to the LLM.
+
+    Regex rules answer unambiguous phrasings outright. Everything else is
+    scored by a TF-IDF nearest-centroid model trained on TRAINING_EXAMPLES;
+    its softmax probability is the confidence compared against threshold.
+    """
+
+    def __init__(self, threshold=0.75, examples=None, temperature=10.0):
+        self.threshold = threshold
+        self.temperature = temperature
+        self.rules = {intent: [re.compile(p) for p in patterns] for intent, patterns in RULES.items()}
+        self._train(examples or TRAINING_EXAMPLES)
+        self.hits = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def _train(self, examples):
+        documents = [(intent, Counter(tokenize(text))) for intent, texts in examples.items() for text in texts]
+        document_frequency = Counter(term for _, counts in documents for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1 for term, df in document_frequency.items()}
+
+        centroids = {}
+        for intent, counts in documents:
+            centroid = centroids.setdefault(intent, Counter())
+            for term, weight in self._vectorize(counts).items():
+                centroid[term] += weight
+        self.centroids = {intent: self._normalize(c) for intent, c in centroids.items()}
+
+    def _vectorize(self, counts):
+        vector = {term: (1 + math.log(count)) * self.idf[term]
+                  for term, count in counts.items() if term in self.idf}
+        return self._normalize(vector)
+
+    @staticmethod
+    def _normalize(vector):
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    def classify(self, message):
+        """Return (intent, confidence) for a message"""
+        text = message.lower()
+        matched = [intent for intent, patterns in self.rules.items() if any(p.search(text) for p in patterns)]
+        if len(matched) == 1:
+            return matched[0], 0.95
+
+        vector = self._vectorize(Counter(tokenize(text)))
+        if not vector:
+            return 'general_info', 0.0
+        scores = {intent: sum(w * centroid.get(term, 0.0) for term, w in vector.items())
+                  for intent, centroid in self.centroids.items()}
+        peak = max(scores.values())
+        exp_scores = {intent: math.exp(self.temperature * (s - peak)) for intent, s in scores.items()}
+        total = sum(exp_scores.values())
+        intent = max(exp_scores, key=exp_scores.get)
+        return intent, exp_scores[intent] / total
+
+    def predict(self, message):
+        """Return the intent if confidently classified, otherwise None"""
+        intent, confidence = self.classify(message)
+        confident = confidence >= self.threshold
+        with self._lock:
+            if confident:
+                self.hits += 1
+            else:
+                self.fallbacks += 1
+        tracing.count('foodiespot_intent_total', source='local' if confident else 'llm')
+        return intent if confident else None
+
+    def stats(self):
+        """Local hit rate so far"""
+        total = self.hits + self.fallbacks
+        return {
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,224 @@
+"""Per-conversation memory for the agent.
+
+Each conversation keeps its most recent turns verbatim, up to a token
+budget (FOODIESPOT_MEMORY_TOKENS, default 1000, estimated at about four
+characters per token). Turns pushed out of the budget are not dropped:
+the next time a prompt needs the history, they are folded into a running
+summary, and only those new turns are summarized, together with the
+previous summary (capped at FOODIESPOT_MEMORY_SUMMARY_TOKENS, default
+200). The summary is kept with the conversation, so prompts stay bounded
+however long a conversation runs, and no turn is summarized twice.
+
+Booking slots (restaurant, date, time, party size ...) given over several
+messages are merged here too, so "for 4 people" after "Sakura Garden
+tomorrow at 7" completes the same booking. A booking with every detail
+is held here until the customer confirms it.
+"""
+import os
+import threading
+import time
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = int(os.getenv('FOODIESPOT_MEMORY_TOKENS', '1000'))
+DEFAULT_SUMMARY_TOKENS = int(os.getenv('FOODIESPOT_MEMORY_SUMMARY_TOKENS', '200'))
+MIN_RECENT_TURNS = 2
+
+SUMMARY_PROMPT = """You maintain the memory of a conversation between a customer and FoodieBot, a restaurant booking assistant.
+Update the summary below with the new messages. Keep what matters for later turns: the customer's name,
+restaurants discussed, dates, times, party size, bookings made or cancelled (with confirmation numbers)
+and stated preferences. Reply with only the updated summary, at most {words} words.
+
+Current summary: {summary}
+
+New messages:
+{messages}
+"""
+
+ROLE_NAMES = {'user': 'Customer', 'assistant': 'FoodieBot'}
+
+
+def estimate_tokens(text):
+    """Rough token count of text (no tokenizer is available for the hosted model)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def format_turns(turns):
+    return "\n".join(f"{ROLE_NAMES.get(t['role'], t['role'])}: {t['content']}" for t in turns)
+
+
+class ConversationMemory:
+    """Recent turns of one conversation within a token budget, older turns folded into a summary"""
+
+    def __init__(self, conversation_id, token_budget=DEFAULT_TOKEN_BUDGET, summary_tokens=DEFAULT_SUMMARY_TOKENS):
+        self.id = conversation_id
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.turns = []
+        self.summary = ''
+        self.summarized_turns = 0
+        self.slots = {}
+        self.slots_intent = None
+        self.pending_booking = None
+        self.updated = time.monotonic()
+        self._pending = []  # pushed out of the budget, not yet in the summary
+        self._tokens = 0
+        self.lock = threading.RLock()
+
+    def add(self, role, content):
+        """Record one message; the oldest turns leave the budget (to be summarized) as needed"""
+        content = str(content)
+        with self.lock:
+            turn = {'role': role, 'content': content, 'tokens': estimate_tokens(content)}
+            self.turns.append(turn)
+            self._tokens += turn['tokens']
+            while self._tokens > self.token_budget and len(self.turns) > MIN_RECENT_TURNS:
+                oldest = self.turns.pop(0)
+                self._tokens -= oldest['tokens']
+                self._pending.append(oldest)
+            self.updated = time.monotonic()
+
+    def add_exchange(self, user_message, reply):
+        self.add('user', user_message)
+        self.add('assistant', reply)
+
+    # Summary, folded in lazily by whoever next needs the history
+
+    def summary_request(self):
+        """(messages, count) asking the LLM to fold pending turns into the summary, or None"""
+        with self.lock:
+            if not self._pending:
+                return None
+            pending = list(self._pending)
+            prompt = SUMMARY_PROMPT.format(words=int(self.summary_tokens * 0.75),
+                                           summary=self.summary or "(none yet)",
+                                           messages=format_turns(pending))
+            return [{"role": "user", "content": prompt}], len(pending)
+
+    def apply_summary(self, summary, count):
+        """Replace the summary with one covering the first count pending turns (None: summarize locally)"""
+        with self.lock:
+            folded = self._pending[:count]
+            del self._pending[:count]
+            summary = (summary or '').strip()
+            if not summary:
+                summary = self._local_summary(folded)
+            self.summary = self._clip(summary)
+            self.summarized_turns += len(folded)
+
+    def _local_summary(self, turns):
+        """Summary without the LLM: the previous one plus a clipped line per customer message"""
+        lines = [self.summary] if self.summary else []
+        for turn in turns:
+            if turn['role'] == 'user':
+                text = turn['content'].strip().replace("\n", " ")
+                lines.append(f"Customer said: {text[:160]}")
+        return "\n".join(lines)
+
+    def _clip(self, summary):
+        """Keep the newest part of a summary that fits summary_tokens"""
+        limit = self.summary_tokens * CHARS_PER_TOKEN
+        if len(summary) <= limit:
+            return summary
+        clipped = summary[-limit:]
+        return clipped[clipped.find("\n") + 1:] if "\n" in clipped else clipped
+
+    def has_pending(self):
+        return bool(self._pending)
+
+    # Prompt material
+
+    def context_messages(self, max_tokens=None):
+        """Summary (as a system message) plus the most recent turns that fit max_tokens"""
+        with self.lock:
+            budget = self.token_budget if max_tokens is None else max_tokens
+            messages = []
+            for turn in reversed(self.turns):
+                budget -= turn['tokens']
+                if budget < 0:
+                    break
+                messages.append({'role': turn['role'], 'content': turn['content']})
+            messages.reverse()
+            if self.summary or self._pending:
+                summary = self.summary
+                if self._pending:
+                    # Not summarized yet (e.g. the summary call failed); say what we can locally
+                    summary = self._clip(self._local_summary(self._pending))
+                messages.insert(0, {'role': 'system', 'content': f"Earlier in this conversation: {summary}"})
+            return messages
+
+    def transcript(self, max_tokens=300):
+        """Summary and latest turns as plain text, for prompts that take a single message"""
+        lines = []
+        for message in self.context_messages(max_tokens):
+            if message['role'] == 'system':
+                lines.append(message['content'])
+            else:
+                lines.append(format_turns([message]))
+        return "\n".join(lines)
+
+    # Booking slots carried between turns
+
+    def merge_slots(self, intent, slots):
+        """Slots from this turn on top of those remembered for the same kind of request"""
+        with self.lock:
+            if intent != self.slots_intent:
+                self.slots = {}
+                self.slots_intent = intent
+            self.slots.update({k: v for k, v in (slots or {}).items() if v not in (None, '')})
+            return dict(self.slots)
+
+    def clear_slots(self):
+        with self.lock:
+            self.slots = {}
+            self.slots_intent = None
+
+    def hold_booking(self, booking):
+        """Keep a complete booking until the customer confirms it"""
+        with self.lock:
+            self.pending_booking = booking
+
+    def take_booking(self):
+        """The booking waiting for confirmation (or None), no longer held"""
+        with self.lock:
+            booking, self.pending_booking = self.pending_booking, None
+            return booking
+
+
+class MemoryStore:
+    """ConversationMemory per conversation id, expired after idle_timeout seconds"""
+
+    def __init__(self, max_conversations=10000, idle_timeout=3600, token_budget=DEFAULT_TOKEN_BUDGET,
+                 summary_tokens=DEFAULT_SUMMARY_TOKENS):
+        self.max_conversations = max_conversations
+        self.idle_timeout = idle_timeout
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self._memories = {}
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id):
+        """Memory for a conversation, created on first use"""
+        now = time.monotonic()
+        with self._lock:
+            memory = self._memories.get(conversation_id)
+            if memory is None:
+                self._evict(now)
+                memory = ConversationMemory(conversation_id, self.token_budget, self.summary_tokens)
+                self._memories[conversation_id] = memory
+            memory.updated = now
+            return memory
+
+    def discard(self, conversation_id):
+        with self._lock:
+            self._memories.pop(conversation_id, None)
+
+    def _evict(self, now):
+        expired = [cid for cid, m in self._memories.items() if now - m.updated > self.idle_timeout]
+        for cid in expired:
+            del self._memories[cid]
+        if len(self._memories) >= self.max_conversations:
+            oldest = min(self._memories, key=lambda cid: self._memories[cid].updated)
+            del self._memories[oldest]
+
+    def __len__(self):
+        return len(self._memories)
@@ -0,0 +1,418 @@
+"""Headless HTTP API for FoodieSpotAgent.
+
+Run with:  python -m backend.server --port 8000
+
+One shared agent (and its tools and LLM client) serves every request. A
+fixed pool of worker threads handles connections; up to --queue more wait
+for a worker, and anything beyond that is refused immediately with 503 so
+a load balancer can retry elsewhere. SIGTERM/SIGINT stop accepting new
+connections and let in-flight requests finish.
+
+POST /catalog/changes rewrites the catalog, so it needs an
+"Authorization: Bearer <token>" header matching FOODIESPOT_ADMIN_TOKEN;
+without that variable set the route is disabled.
+"""
+import argparse
+import hmac
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.agent import FoodieSpotAgent
+from tools.ingest import ChangeError
+from utils import tracing
+from utils.logger import log_message, log_error
+
+
+class ConversationStore:
+    """Per-conversation state (id and turn lock) with idle expiry; history lives in the agent's memory"""
+
+    def __init__(self, max_conversations=10000, idle_timeout=3600):
+        self.max_conversations = max_conversations
+        self.idle_timeout = idle_timeout
+        self._conversations = {}
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id=None):
+        """Get (or start) a conversation; returns its state dict"""
+        now = time.monotonic()
+        with self._lock:
+            conversation = self._conversations.get(conversation_id) if conversation_id else None
+            if conversation is None:
+                self._evict(now)
+                conversation_id = conversation_id or str(uuid.uuid4())
+                conversation = {'id': conversation_id, 'lock': threading.Lock()}
+                self._conversations[conversation_id] = conversation
+            conversation['updated'] = now
+            return conversation
+
+    def _evict(self, now):
+        expired = [cid for cid, c in self._conversations.items() if now - c['updated'] > self.idle_timeout]
+        for cid in expired:
+            del self._conversations[cid]
+        if len(self._conversations) >= self.max_conversations:
+            oldest = min(self._conversations, key=lambda cid: self._conversations[cid]['updated'])
+            del self._conversations[oldest]
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+MAX_BATCH = 200  # items per batch availability or booking request
+MAX_LIMIT = 50  # results per recommendation or availability search
+MAX_CHANGES = 5000  # catalog changes per request
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    server_version = "FoodieSpotAPI/1.0"
+
+    routes = [
+        ('GET', r'^/health$', 'health'),
+        ('GET', r'^/metrics$', 'metrics'),
+        ('POST', r'^/chat$', 'chat'),
+        ('GET', r'^/recommend$', 'recommend'),
+        ('GET', r'^/recommend/nearby$', 'recommend_nearby'),
+        ('GET', r'^/availability$', 'availability'),
+        ('POST', r'^/availability/batch$', 'availability_batch'),
+        ('POST', r'^/reservations$', 'book'),
+        ('POST', r'^/reservations/batch$', 'book_batch'),
+        ('GET', r'^/reservations$', 'find_reservations'),
+        ('GET', r'^/reservations/(?P<reservation_id>[^/]+)$', 'get_reservation'),
+        ('PATCH', r'^/reservations/(?P<reservation_id>[^/]+)$', 'modify'),
+        ('POST', r'^/reservations/(?P<reservation_id>[^/]+)/cancel$', 'cancel'),
+        ('POST', r'^/catalog/changes$', 'catalog_changes'),
+    ]
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            for route_method, pattern, name in self.routes:
+                match = re.match(pattern, url.path)
+                if match and route_method == method:
+                    status, body = getattr(self, f"route_{name}")(**match.groupdict())
+                    break
+            else:
+                raise ApiError(404, "Not found")
+        except ApiError as e:
+            status, body = e.status, {'error': str(e)}
+        except Exception as e:
+            log_error("API request failed: %s", e)
+            status, body = 500, {'error': "Internal server error"}
+        if isinstance(body, str):
+            self._send(status, body.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send(status, json.dumps(body).encode('utf-8'), "application/json")
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON")
+        if not isinstance(body, dict):
+            raise ApiError(400, "Request body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _require(values, *names):
+        missing = [name for name in names if values.get(name) in (None, '')]
+        if missing:
+            raise ApiError(400, f"Missing: {', '.join(missing)}")
+
+    @staticmethod
+    def _int(value, name):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"{name} must be an integer")
+
+    def _limit(self):
+        """The limit query parameter, capped at MAX_LIMIT"""
+        limit = self._int(self.query.get('limit', 5), 'limit')
+        if limit < 1:
+            raise ApiError(400, "limit must be at least 1")
+        return min(limit, MAX_LIMIT)
+
+    @staticmethod
+    def _float(value, name):
+        try:
+            return float(value) if value not in (None, '') else None
+        except ValueError:
+            raise ApiError(400, f"{name} must be a number")
+
+    @property
+    def agent(self):
+        return self.server.agent
+
+    def route_health(self):
+        return 200, {'status': 'ok', 'conversations': len(self.server.conversations)}
+
+    def route_metrics(self):
+        # Prometheus text format; empty unless tracing is enabled
+        return 200, tracing.render_metrics()
+
+    def route_chat(self):
+        body = self._body()
+        self._require(body, 'message')
+        if not isinstance(body['message'], str):
+            raise ApiError(400, "message must be a string")
+        if not isinstance(body.get('conversation_id') or '', str):
+            raise ApiError(400, "conversation_id must be a string")
+        conversation = self.server.conversations.get(body.get('conversation_id'))
+        with conversation['lock']:
+            reply = self.agent.process_message(body['message'], conversation['id'])
+        return 200, {'conversation_id': conversation['id'], 'reply': reply}
+
+    def route_recommend(self):
+        q = self.query
+        features = [f for f in q.get('features', '').split(',') if f.strip()]
+        min_rating = self._float(q.get('min_rating'), 'min_rating')
+        restaurants = self.agent.recommendation_tool.recommend(
+            cuisine=q.get('cuisine'), location=q.get('location'), ambience=q.get('ambience'),
+            features=features, min_rating=min_rating, max_results=self._limit())
+        return 200, {'restaurants': restaurants}
+
+    def route_recommend_nearby(self):
+        q = self.query
+        self._require(q, 'lat', 'lng')
+        restaurants = self.agent.recommendation_tool.recommend_nearby(
+            self._float(q['lat'], 'lat'), self._float(q['lng'], 'lng'),
+            radius_km=self._float(q.get('radius_km'), 'radius_km'), cuisine=q.get('cuisine'),
+            min_rating=self._float(q.get('min_rating'), 'min_rating'), date=q.get('date'), time=q.get('time'),
+            party_size=self._int(q.get('party_size', 2), 'party_size'),
+            max_results=self._limit())
+        return 200, {'restaurants': restaurants}
+
+    def route_availability(self):
+        q = self.query
+        self._require(q, 'date', 'time', 'party_size')
+        party_size = self._int(q['party_size'], 'party_size')
+        tool = self.agent.reservation_tool
+        if q.get('restaurant_id'):
+            available = tool.check_availability(q['restaurant_id'], q['date'], q['time'], party_size)
+            remaining = tool.availability.remaining_tables(q['restaurant_id'], q['date'], q['time'])
+            return 200, {'available': available, 'remaining_tables': remaining}
+        slots = tool.find_available_slots(q['date'], q['time'], party_size,
+                                          max_results=self._limit())
+        return 200, {'slots': slots}
+
+    def _batch(self, body, key, *fields):
+        """The list of request objects under key, validated, with party_size as an int"""
+        items = body.get(key)
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, f"{key} must be a non-empty list")
+        if len(items) > MAX_BATCH:
+            raise ApiError(400, f"At most {MAX_BATCH} {key} per request")
+        batch = []
+        for i, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ApiError(400, f"{key}[{i}] must be an object")
+            missing = [name for name in fields if item.get(name) in (None, '')]
+            if missing:
+                raise ApiError(400, f"{key}[{i}] is missing: {', '.join(missing)}")
+            batch.append(dict(item, party_size=self._int(item['party_size'], f"{key}[{i}].party_size")))
+        return batch
+
+    def route_availability_batch(self):
+        requests = self._batch(self._body(), 'requests', 'restaurant_id', 'date', 'time', 'party_size')
+        return 200, {'results': self.agent.reservation_tool.check_availability_many(requests)}
+
+    def route_book(self):
+        body = self._body()
+        self._require(body, 'restaurant_id', 'date', 'time', 'party_size', 'customer_name', 'phone')
+        reservation = self.agent.reservation_tool.make_reservation(
+            body['restaurant_id'], body['date'], body['time'], self._int(body['party_size'], 'party_size'),
+            body['customer_name'], body['phone'], body.get('special_requests', ''))
+        if not reservation:
+            raise ApiError(409, "No availability for that slot")
+        return 201, reservation
+
+    def route_book_batch(self):
+        bookings = self._batch(self._body(), 'reservations', 'restaurant_id', 'date', 'time', 'party_size',
+                               'customer_name', 'phone')
+        reservations, unavailable = self.agent.reservation_tool.make_reservations(bookings)
+        if reservations is None:
+            if not unavailable:
+                raise ApiError(500, "Could not save the reservations; nothing was booked")
+            return 409, {'error': "No availability for some slots; nothing was booked",
+                         'unavailable': unavailable}
+        return 201, {'reservations': reservations}
+
+    def route_find_reservations(self):
+        q = self.query
+        reservations = self.agent.reservation_tool.find_reservations(
+            phone=q.get('phone'), customer_name=q.get('name'),
+            restaurant_id=q.get('restaurant_id'), date=q.get('date'))
+        return 200, {'reservations': reservations}
+
+    def route_get_reservation(self, reservation_id):
+        reservation = self.agent.reservation_tool.get_reservation(reservation_id)
+        if not reservation:
+            raise ApiError(404, "Reservation not found")
+        return 200, reservation
+
+    def route_modify(self, reservation_id):
+        body = self._body()
+        party_size = self._int(body['party_size'], 'party_size') if body.get('party_size') else None
+        reservation = self.agent.reservation_tool.modify_reservation(
+            reservation_id, date=body.get('date'), time=body.get('time'), party_size=party_size,
+            special_requests=body.get('special_requests'))
+        if not reservation:
+            raise ApiError(409, "Reservation not found, not active, or the new slot is unavailable")
+        return 200, reservation
+
+    def route_cancel(self, reservation_id):
+        reservation = self.agent.reservation_tool.cancel_reservation(reservation_id)
+        if not reservation:
+            raise ApiError(404, "No active reservation with that id")
+        return 200, reservation
+
+    def _require_admin(self):
+        token = self.server.admin_token
+        if not token:
+            raise ApiError(403, "Catalog changes are disabled (set FOODIESPOT_ADMIN_TOKEN)")
+        scheme, _, given = (self.headers.get('Authorization') or '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.strip().encode(), token.encode()):
+            raise ApiError(401, "Admin token required")
+
+    def route_catalog_changes(self):
+        # Table counts, restaurant upserts and closures pushed by POS and partner systems
+        self._require_admin()
+        body = self._body()
+        changes = body.get('changes')
+        if not isinstance(changes, list) or not changes:
+            raise ApiError(400, "changes must be a non-empty list")
+        if len(changes) > MAX_CHANGES:
+            raise ApiError(400, f"At most {MAX_CHANGES} changes per request")
+        try:
+            applied = self.agent.reservation_tool.catalog.apply_changes(changes)
+        except ChangeError as e:
+            raise ApiError(400, str(e))
+        return 202, {'applied': applied}
+
+
+class AgentServer(HTTPServer):
+    """HTTP server with a bounded worker pool and bounded accept queue"""
+
+    request_queue_size = 128
+
+    def __init__(self, address, agent, workers=16, queue_size=64, admin_token=None):
+        super().__init__(address, AgentRequestHandler)
+        self.agent = agent
+        self.admin_token = admin_token
+        self.conversations = ConversationStore()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        try:
+            self._executor.submit(self._process, request, client_address)
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            self._reject(request)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def _reject(self, request):
+        body = b'{"error": "Server busy, retry shortly"}'
+        try:
+            request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                            b"Content-Type: application/json\r\n"
+                            b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def drain(self):
+        """Wait for in-flight and queued requests to finish"""
+        self._executor.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FoodieSpot agent API server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--queue', type=int, default=64)
+    parser.add_argument('--tracing', action='store_true', help="record per-stage metrics (served on /metrics)")
+    parser.add_argument('--trace-file', help="also append one JSON trace line per turn to this file")
+    args = parser.parse_args()
+    if args.tracing or args.trace_file:
+        tracing.configure(enabled=True, trace_file=args.trace_file)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = os.getenv('OPENROUTER_API_KEY')
+    if not api_key:
+        sys.exit("Please set OPENROUTER_API_KEY")
+
+    server = AgentServer((args.host, args.port), FoodieSpotAgent(api_key), args.workers, args.queue,
+                         admin_token=os.getenv('FOODIESPOT_ADMIN_TOKEN'))
+
+    def stop(signum, frame):
+        log_message("Shutting down API server")
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    log_message("API server listening on %s:%s", args.host, args.port)
+    server.serve_forever()
+    server.drain()
+    server.server_close()
+    server.agent.reservation_tool.store.close()
+    log_message("API server stopped")
+
+
+if __name__ == '__main__':
+    main()
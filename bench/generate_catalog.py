@@ -0,0 +1,114 @@
+"""Generate synthetic restaurant catalogs in the restaurant_data.json schema.
+
+Run with:  python -m bench.generate_catalog --count 100000 --output /tmp/catalog.json
+
+Restaurants are written one at a time, so million-entry catalogs do not
+need to fit in memory.
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+CUISINES = [
+    "Indian", "Vegetarian", "Japanese", "Sushi", "Italian", "Pizza", "Vegan", "Organic",
+    "Mexican", "Tex-Mex", "American", "Fast Food", "Chinese", "Thai", "Korean", "French",
+    "Mediterranean", "Greek", "Lebanese", "Seafood", "Steakhouse", "BBQ", "Vietnamese",
+    "Spanish", "Ethiopian", "Brazilian", "Caribbean", "Fusion",
+]
+LOCATIONS = [
+    "Downtown", "Midtown", "Uptown", "Riverside", "Old Town", "Harbor", "Little Italy",
+    "Chinatown", "Financial District", "Arts District", "University Hill", "West End",
+    "East Village", "Lakeside", "Market Square", "Northgate", "Southpoint", "Garden District",
+]
+# Neighborhood centres scattered around a city centre, about 12 km across
+CITY_CENTER = (40.7128, -74.0060)
+_layout = random.Random(0)
+LOCATION_CENTERS = {
+    location: (CITY_CENTER[0] + _layout.uniform(-0.055, 0.055), CITY_CENTER[1] + _layout.uniform(-0.07, 0.07))
+    for location in LOCATIONS
+}
+AMBIENCES = ["casual", "romantic", "family", "lively", "upscale", "cozy", "modern", "rustic"]
+FEATURES = [
+    "outdoor seating", "live music", "rooftop", "romantic lighting", "kids menu",
+    "parking available", "pet friendly", "vegan desserts", "live mariachi", "happy hour",
+    "wine bar", "private dining", "wheelchair accessible", "free wifi", "late night",
+]
+NAME_PREFIXES = ["The", "Golden", "Little", "Blue", "Urban", "Old", "Royal", "Happy", "Green", "Silver"]
+NAME_NOUNS = ["Spoon", "Garden", "Table", "Kitchen", "Grill", "House", "Bistro", "Corner", "Oven", "Lantern"]
+SLOT_TIMES = ["17:00", "17:30", "18:00", "18:30", "19:00", "19:30", "20:00", "20:30", "21:00", "21:30"]
+
+
+def generate_restaurant(index, rng, dates):
+    cuisine = rng.sample(CUISINES, rng.choice([1, 1, 2, 2, 3]))
+    capacity = rng.choice([30, 40, 50, 60, 70, 80, 90, 100, 120, 150])
+    tables = max(2, capacity // 10)
+    available_tables = {}
+    for day in dates:
+        # Dinner peak has fewer free tables than early and late slots
+        slots = {}
+        for slot in SLOT_TIMES:
+            peak = 1.0 - 0.6 * (slot in ("19:00", "19:30", "20:00"))
+            slots[slot] = max(0, int(rng.gauss(tables * 0.5 * peak, tables * 0.2)))
+        available_tables[day] = slots
+
+    location = rng.choice(LOCATIONS)
+    lat, lng = LOCATION_CENTERS[location]
+    return {
+        "id": f"r{index + 1:07d}",
+        "name": f"{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_NOUNS)} {index + 1}",
+        "location": location,
+        "coordinates": {"lat": round(rng.gauss(lat, 0.006), 6), "lng": round(rng.gauss(lng, 0.008), 6)},
+        "cuisine": cuisine,
+        "seating_capacity": capacity,
+        "available_tables": available_tables,
+        "ambience": rng.choice(AMBIENCES),
+        "rating": round(min(5.0, max(2.5, rng.gauss(4.2, 0.35))), 1),
+        "features": rng.sample(FEATURES, rng.randint(1, 3)),
+        "contact": {
+            "phone": f"{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            "email": f"restaurant{index + 1}@foodiespot.com",
+        },
+    }
+
+
+def catalog_dates(start, days):
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+
+def generate_catalog(count, days=7, start=date(2025, 5, 27), seed=42):
+    """Build a catalog dict with count restaurants in memory"""
+    rng = random.Random(seed)
+    dates = catalog_dates(start, days)
+    return {"restaurants": [generate_restaurant(i, rng, dates) for i in range(count)]}
+
+
+def write_catalog(path, count, days=7, start=date(2025, 5, 27), seed=42):
+    """Stream a catalog with count restaurants to path"""
+    rng = random.Random(seed)
+    dates = catalog_dates(start, days)
+    with open(path, 'w') as f:
+        f.write('{"restaurants": [\n')
+        for i in range(count):
+            if i:
+                f.write(',\n')
+            json.dump(generate_restaurant(i, rng, dates), f)
+        f.write('\n]}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic restaurant catalog")
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=7, help="dates of available_tables per restaurant")
+    parser.add_argument('--start', default='2025-05-27', help="first date, YYYY-MM-DD")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    start = date.fromisoformat(args.start)
+    write_catalog(args.output, args.count, args.days, start, args.seed)
+    print(f"Wrote {args.count} restaurants to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Local stand-in for the OpenRouter chat completions endpoint.
+
+Run with:  python -m bench.mock_openrouter --port 8900 --latency-ms 400
+
+Replies are shaped like the real API (including `usage` and SSE streaming)
+and are chosen from the prompt so the agent's intent, extraction and
+cuisine prompts get answers it can parse.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CUISINES = ["Italian", "Japanese", "Mexican", "Indian", "American", "Vegan"]
+
+GENERAL_REPLY = ("FoodieSpot has locations all across the city, from casual family spots to "
+                 "romantic rooftop dining. Let me know a cuisine or neighborhood and I can "
+                 "suggest a few places or help you book a table.")
+
+
+class MockSettings:
+    def __init__(self, latency_ms=400.0, latency_sigma=0.5, error_rate=0.0, rate_limit_rate=0.0,
+                 tokens_per_second=80.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.tokens_per_second = tokens_per_second
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def latency(self):
+        """Time to first token: log-normal around latency_ms"""
+        with self.lock:
+            return self.random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000.0
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            return self.random.random()
+
+
+def reply_for(messages):
+    """Pick a plausible reply for the agent's prompts"""
+    prompt = messages[-1].get('content', '') if messages else ''
+    lowered = prompt.lower()
+    if 'reply with only a json object' in lowered or 'corrected json object' in lowered:
+        cuisine = next((c for c in CUISINES if c.lower() in lowered), None)
+        intent = 'restaurant_recommendation' if cuisine else 'general_info'
+        slots = {'intent': intent, 'cuisine': cuisine, 'location': None, 'restaurant': None,
+                 'date': None, 'time': None, 'party_size': None, 'customer_name': None,
+                 'phone': None, 'confirmation_number': None}
+        return json.dumps(slots)
+    if 'classify this message' in lowered:
+        return 'general_info'
+    if 'extract the cuisine type' in lowered:
+        return next((c for c in CUISINES if c.lower() in lowered), 'any')
+    return GENERAL_REPLY
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        settings = self.server.settings
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        time.sleep(settings.latency())
+
+        roll = settings.roll()
+        if roll < settings.error_rate:
+            self._json(503, {'error': {'message': 'mock upstream error'}})
+            return
+        if roll < settings.error_rate + settings.rate_limit_rate:
+            self._json(429, {'error': {'message': 'mock rate limit'}}, {'Retry-After': '1'})
+            return
+
+        content = reply_for(request.get('messages', []))
+        words = content.split(' ')
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in request.get('messages', []))
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(words),
+                 'total_tokens': prompt_tokens + len(words)}
+
+        if not request.get('stream'):
+            time.sleep(len(words) / settings.tokens_per_second)
+            self._json(200, {'id': 'mock', 'model': request.get('model'), 'usage': usage,
+                             'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                          'finish_reason': 'stop'}]})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._chunk(b': OPENROUTER PROCESSING\n\n')
+        for i, word in enumerate(words):
+            delta = word if i == 0 else ' ' + word
+            event = {'id': 'mock', 'choices': [{'index': 0, 'delta': {'content': delta}}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+            time.sleep(1 / settings.tokens_per_second)
+        final = {'id': 'mock', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage}
+        self._chunk(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+        self._chunk(b'data: [DONE]\n\n')
+        self._chunk(b'')
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, settings):
+        super().__init__(address, MockHandler)
+        self.settings = settings
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+
+def start_mock_server(settings=None, host='127.0.0.1', port=0):
+    """Start the mock in a background thread; returns the server (see .url)"""
+    server = MockServer((host, port), settings or MockSettings())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat completions endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=400.0, help="median time to first token")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="log-normal spread of latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of 503 replies")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="fraction of 429 replies")
+    parser.add_argument('--tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency_ms, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                            args.tokens_per_second, args.seed)
+    server = MockServer((args.host, args.port), settings)
+    print(f"Mock OpenRouter listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""Load scenarios for the agent and tools.
+
+Run with:
+    python -m bench.scenarios recommendation_storm --restaurants 100000
+    python -m bench.scenarios booking_rush --concurrency 64 --duration 20
+    python -m bench.scenarios agent_turns --latency-ms 300 --output results.json
+
+Each run prints (and optionally writes) one JSON object with throughput,
+error count and p50/p95/p99 latency, for regression tracking.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from bench.generate_catalog import CUISINES, FEATURES, LOCATIONS, SLOT_TIMES, write_catalog
+from bench.mock_openrouter import MockSettings, start_mock_server
+
+AGENT_MESSAGES = [
+    "Show me Italian restaurants",
+    "Show me all restaurant locations",
+    "Any good Japanese places in Midtown?",
+    "What are your opening hours?",
+    "I want to book a table for 4 tonight",
+    "cancel my reservation please",
+    "Do you have anything romantic with a rooftop?",
+    "hello!",
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_load(operation, concurrency, duration, warmup=1.0):
+    """Call operation(rng) from concurrency threads for duration seconds.
+
+    operation returns True on success. Latencies from the first warmup
+    seconds are discarded.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        local_latencies = []
+        local_errors = 0
+        while True:
+            begin = time.perf_counter()
+            if begin >= stop_at:
+                break
+            try:
+                ok = operation(rng)
+            except Exception:
+                ok = False
+            end = time.perf_counter()
+            if begin >= measure_from:
+                local_latencies.append(end - begin)
+                local_errors += 0 if ok else 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'operations': len(latencies),
+        'errors': errors[0],
+        'throughput_per_s': round(len(latencies) / duration, 2),
+        'latency_ms': {
+            'p50': ms(percentile(latencies, 0.50)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def recommendation_storm(args, workdir):
+    """Random single- and multi-filter recommendation queries"""
+    from tools.recommend import RecommendationTool
+
+    tool = RecommendationTool(args.catalog, compact=args.compact)
+    tool.get_index()  # build outside the measured window
+
+    def operation(rng):
+        kind = rng.random()
+        if kind < 0.4:
+            tool.recommend_by_cuisine(rng.choice(CUISINES))
+        elif kind < 0.7:
+            tool.recommend_by_location(rng.choice(LOCATIONS))
+        else:
+            tool.recommend(cuisine=rng.choice(CUISINES), location=rng.choice(LOCATIONS),
+                           features=[rng.choice(FEATURES)] if rng.random() < 0.5 else None,
+                           min_rating=rng.choice([None, 4.0, 4.5]))
+        return True
+
+    return run_load(operation, args.concurrency, args.duration)
+
+
+def booking_rush(args, workdir):
+    """Many clients booking dinner-peak slots at a small set of hot restaurants"""
+    from tools.reservation import ReservationTool
+
+    tool = ReservationTool(args.catalog, os.path.join(workdir, 'reservations.db'))
+    restaurants = tool.load_restaurants()
+    hot = [r['id'] for r in restaurants[:max(1, min(len(restaurants), args.hot_restaurants))]]
+    dates = sorted({d for r in restaurants[:len(hot)] for d in r.get('available_tables', {})})
+    peak_times = [t for t in SLOT_TIMES if t in ("19:00", "19:30", "20:00")]
+    tool.find_available_slots(dates[0], peak_times[0], 2)  # build the slot index outside the measured window
+
+    def operation(rng):
+        restaurant_id = rng.choice(hot)
+        date, time_slot = rng.choice(dates), rng.choice(peak_times)
+        if rng.random() < 0.3:
+            tool.find_available_slots(date, time_slot, rng.randint(2, 6))
+            return True
+        # A sold-out slot is a normal outcome, not an error
+        tool.make_reservation(restaurant_id, date, time_slot, rng.randint(1, 6),
+                              f"Guest {rng.randint(1, 10 ** 6)}", f"555-{rng.randint(1000000, 9999999)}")
+        return True
+
+    return run_load(operation, args.concurrency, args.duration)
+
+
+def agent_turns(args, workdir):
+    """Full FoodieSpotAgent turns against the mock LLM endpoint"""
+    from backend.agent import FoodieSpotAgent
+    from llm.llama3 import FALLBACK_REPLIES, LlamaClient
+    from llm.throttle import RateLimiter
+
+    settings = MockSettings(args.latency_ms, args.latency_sigma, args.error_rate, args.rate_limit_rate,
+                            seed=args.seed)
+    server = start_mock_server(settings)
+    limiter = RateLimiter(args.llm_rpm, args.llm_tpm) if args.llm_rpm or args.llm_tpm else False
+    client = LlamaClient('bench', url=server.url, pool_size=args.concurrency,
+                         cache=None if args.llm_cache else False, rate_limiter=limiter)
+    agent = FoodieSpotAgent('bench', llama_client=client, data_file=args.catalog,
+                            db_path=os.path.join(workdir, 'reservations.db'))
+
+    def operation(rng):
+        reply = agent.process_message(rng.choice(AGENT_MESSAGES))
+        return bool(reply) and not reply.startswith(FALLBACK_REPLIES)
+
+    try:
+        result = run_load(operation, args.concurrency, args.duration)
+    finally:
+        server.shutdown()
+    result['mock_requests'] = settings.requests
+    result['local_intent'] = agent.intent_classifier.stats()
+    if limiter:
+        result['llm_throttled'] = limiter.throttled
+    return result
+
+
+SCENARIOS = {
+    'recommendation_storm': recommendation_storm,
+    'booking_rush': booking_rush,
+    'agent_turns': agent_turns,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FoodieSpot load scenarios")
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--catalog', help="catalog JSON to use (default: generate one)")
+    parser.add_argument('--restaurants', type=int, default=10000, help="size of the generated catalog")
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help="measured seconds")
+    parser.add_argument('--hot-restaurants', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=300.0)
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--compact', action='store_true', help="use the columnar catalog representation")
+    parser.add_argument('--llm-cache', action='store_true', help="keep the LLM response cache enabled")
+    parser.add_argument('--llm-rpm', type=float, default=0, help="client-side LLM requests/minute limit (0: none)")
+    parser.add_argument('--llm-tpm', type=float, default=0, help="client-side LLM tokens/minute limit (0: none)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='foodiespot-bench-') as workdir:
+        if not args.catalog:
+            args.catalog = os.path.join(workdir, 'catalog.json')
+            write_catalog(args.catalog, args.restaurants, args.days, seed=args.seed)
+
+        result = {
+            'scenario': args.scenario,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'params': {k: v for k, v in vars(args).items() if k not in ('output',)},
+        }
+        result.update(SCENARIOS[args.scenario](args, workdir))
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
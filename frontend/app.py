@@ -1,5 +1,6 @@
 import sys
 import os
+import uuid
 from dotenv import load_dotenv  # Add this import
 # Add the parent directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -7,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import streamlit as st
 from datetime import datetime, timedelta
 from backend.agent import FoodieSpotAgent
+from tools.reservation_store import phone_key
 
 # Load environment variables
 load_dotenv()
@@ -19,17 +21,49 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource(show_spinner=False)
+def get_agent(api_key):
+    """One agent (catalog, indexes, LLM client) shared by every session; conversation ids keep chats apart"""
+    return FoodieSpotAgent(api_key)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def all_restaurant_options(catalog_version, _recommendation_tool):
+    """'Name - Location' -> restaurant id for every restaurant, built once per catalog snapshot and shared"""
+    return restaurant_options(_recommendation_tool.get_all_restaurants())
+
+
+def restaurant_options(restaurants):
+    return {f"{r['name']} - {r['location']}": r['id'] for r in restaurants}
+
+
+def close_form(flag, reply):
+    """Add a form's reply to the chat and close the form, rerunning only the form's fragment"""
+    st.session_state.messages.append({"role": "assistant", "content": reply})
+    st.session_state[flag] = False
+    st.rerun(scope="fragment")
+
+
+def show_form_reply():
+    """In place of a just-submitted form: its reply (the chat history shows it from the next full run)"""
+    with st.chat_message("assistant"):
+        st.markdown(st.session_state.messages[-1]["content"])
+
 # Initialize session state
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
+if 'conversation_id' not in st.session_state:
+    # Keys the agent's memory of this chat (recent turns, summary, booking details so far)
+    st.session_state.conversation_id = str(uuid.uuid4())
+
 if 'agent' not in st.session_state:
     # Use environment variable instead of hardcoded key
     API_KEY = os.getenv('OPENROUTER_API_KEY')  # Changed this line
     if not API_KEY:
         st.error("⚠️ Please set OPENROUTER_API_KEY in your .env file")
         st.stop()
-    st.session_state.agent = FoodieSpotAgent(API_KEY)
+    st.session_state.agent = get_agent(API_KEY)
 
 if 'show_booking_form' not in st.session_state:
     st.session_state.show_booking_form = False
@@ -41,21 +75,34 @@ if 'show_cancel_form' not in st.session_state:
 st.title("🍽️ FoodieSpot Reservation Agent")
 st.markdown("Welcome to FoodieSpot! I can help you find restaurants and make reservations.")
 
-# Booking Form Function
+# Booking Form Function; a fragment, so searching and filling it in rerun only the form
+@st.fragment
 def show_booking_form():
+    if not st.session_state.show_booking_form:
+        show_form_reply()
+        return
     st.markdown("### 📅 Make a Reservation")
     
-    # Get restaurant list
-    restaurants = st.session_state.agent.recommendation_tool.get_all_restaurants()
-    restaurant_names = [f"{r['name']} - {r['location']}" for r in restaurants]
-    
+    # Get restaurant list, narrowed by a typo-tolerant name search when one is typed
+    recommendation_tool = st.session_state.agent.recommendation_tool
+    restaurant_query = st.text_input("🔎 Find a restaurant", placeholder="Name, e.g. sakura or spice house")
+    restaurant_ids = None
+    if restaurant_query.strip():
+        restaurants = recommendation_tool.search_restaurants(restaurant_query, max_results=20)
+        if restaurants:
+            restaurant_ids = restaurant_options(restaurants)
+        else:
+            st.info("No restaurant names match that search; showing all restaurants.")
+    if restaurant_ids is None:
+        restaurant_ids = all_restaurant_options(recommendation_tool.catalog.snapshot().version, recommendation_tool)
+
     with st.form("booking_form"):
         col1, col2 = st.columns(2)
         
         with col1:
             selected_restaurant = st.selectbox(
                 "🏪 Select Restaurant",
-                restaurant_names,
+                list(restaurant_ids),
                 help="Choose your preferred restaurant location"
             )
             
@@ -97,18 +144,20 @@ def show_booking_form():
         
         if submitted:
             if customer_name and phone_number:
-                # Process the reservation
-                reservation_details = {
-                    'restaurant': selected_restaurant,
-                    'date': reservation_date.strftime('%Y-%m-%d'),
-                    'time': reservation_time.strftime('%H:%M'),
-                    'party_size': party_size,
-                    'customer_name': customer_name,
-                    'phone': phone_number,
-                    'special_requests': special_requests
-                }
-                
-                success_message = f"""
+                # Book it in the reservation store; None means the slot is not (or no longer) free
+                reservation = st.session_state.agent.reservation_tool.make_reservation(
+                    restaurant_ids[selected_restaurant],
+                    reservation_date.strftime('%Y-%m-%d'),
+                    reservation_time.strftime('%H:%M'),
+                    int(party_size),
+                    customer_name,
+                    phone_number,
+                    special_requests
+                )
+                if reservation is None:
+                    st.error("Sorry, there is no free table for that time. Please try another date or time.")
+                else:
+                    success_message = f"""
 ✅ **Reservation Confirmed!**
 
 📋 **Reservation Details:**
@@ -119,23 +168,20 @@ def show_booking_form():
 - **Name:** {customer_name}
 - **Phone:** {phone_number}
 
-📧 **Confirmation:** A confirmation email will be sent shortly.
-📱 **SMS Reminder:** You'll receive a reminder 24 hours before your reservation.
+🎫 **Confirmation Number:** `{reservation['id']}`
 
 Thank you for choosing FoodieSpot! We look forward to serving you.
 """
-                
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": success_message
-                })
-                st.session_state.show_booking_form = False
-                st.rerun()
+                    close_form('show_booking_form', success_message)
             else:
                 st.error("Please fill in your name and phone number.")
 
 # Cancellation Form Function
+@st.fragment
 def show_cancel_form():
+    if not st.session_state.show_cancel_form:
+        show_form_reply()
+        return
     st.markdown("### ❌ Cancel Reservation")
     
     with st.form("cancel_form"):
@@ -173,26 +219,33 @@ def show_cancel_form():
         
         if submitted:
             if cancel_name and cancel_phone:
-                cancel_message = f"""
+                reservation_tool = st.session_state.agent.reservation_tool
+                if confirmation_number.strip():
+                    reservation = reservation_tool.get_reservation(confirmation_number)
+                    # The number alone is not enough: it must have been booked with this phone
+                    matches = [reservation] if reservation and phone_key(reservation['phone']) == phone_key(cancel_phone) else []
+                else:
+                    matches = reservation_tool.find_reservations(phone=cancel_phone, customer_name=cancel_name,
+                                                                 date=cancel_date.strftime('%Y-%m-%d'))
+                matches = [r for r in matches if r['status'] == 'confirmed']
+                if len(matches) != 1:
+                    st.error("I couldn't find exactly one reservation with those details. "
+                             "Please check them, or add the confirmation number.")
+                elif reservation_tool.cancel_reservation(matches[0]['id']) is None:
+                    st.error("Sorry, that reservation could not be cancelled.")
+                else:
+                    cancel_message = f"""
 ✅ **Reservation Cancelled Successfully**
 
 📋 **Cancelled Reservation:**
 - **Name:** {cancel_name}
 - **Phone:** {cancel_phone}
-- **Date:** {cancel_date.strftime('%B %d, %Y')}
-
-📧 **Confirmation:** A cancellation confirmation will be sent to your email.
-💰 **Refund:** If applicable, refunds will be processed within 3-5 business days.
+- **Date:** {matches[0]['date']} at {matches[0]['time']}
+- **Confirmation Number:** `{matches[0]['id']}`
 
 We're sorry to see you cancel. We hope to serve you again soon at FoodieSpot!
 """
-                
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": cancel_message
-                })
-                st.session_state.show_cancel_form = False
-                st.rerun()
+                    close_form('show_cancel_form', cancel_message)
             else:
                 st.error("Please provide your name and phone number.")
 
@@ -203,19 +256,22 @@ if st.session_state.show_booking_form:
 if st.session_state.show_cancel_form:
     show_cancel_form()
 
-# Chat interface
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# Chat input
-if prompt := st.chat_input("Ask me about restaurants or reservations..."):
+# Chat interface; a fragment, so sending a message reruns only the chat, not the page
+@st.fragment
+def show_chat():
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+    
+    prompt = st.chat_input("Ask me about restaurants or reservations...")
+    if not prompt:
+        return
     # Add user message
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Check if user wants to book or cancel
+    # Check if user wants to book or cancel; the forms live outside this fragment, so rerun the page
     if any(word in prompt.lower() for word in ["book", "reserve", "reservation", "table"]) and not any(word in prompt.lower() for word in ["cancel", "modify"]):
         st.session_state.show_booking_form = True
         st.rerun()
@@ -225,13 +281,13 @@ if prompt := st.chat_input("Ask me about restaurants or reservations..."):
     else:
         # Get agent response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.agent.process_message(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.agent.process_message_stream(prompt, st.session_state.conversation_id))
         
         # Add assistant message
         st.session_state.messages.append({"role": "assistant", "content": response})
 
+show_chat()
+
 # Sidebar with quick actions
 with st.sidebar:
     st.header("Quick Actions")
@@ -239,7 +295,7 @@ with st.sidebar:
     if st.button("🍝 Italian Restaurants"):
         prompt = "Show me Italian restaurants"
         st.session_state.messages.append({"role": "user", "content": prompt})
-        response = st.session_state.agent.process_message(prompt)
+        response = st.session_state.agent.process_message(prompt, st.session_state.conversation_id)
         st.session_state.messages.append({"role": "assistant", "content": response})
         st.rerun()
     
@@ -254,6 +310,6 @@ with st.sidebar:
     if st.button("🏪 All Locations"):
         prompt = "Show me all restaurant locations"
         st.session_state.messages.append({"role": "user", "content": prompt})
-        response = st.session_state.agent.process_message(prompt)
+        response = st.session_state.agent.process_message(prompt, st.session_state.conversation_id)
         st.session_state.messages.append({"role": "assistant", "content": response})
         st.rerun()
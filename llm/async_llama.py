@@ -0,0 +1,190 @@
+import asyncio
+import time
+import httpx
+from llm.llama3 import LlamaAPIError, LlamaClientBase
+from llm.throttle import PRIORITY_BOOKING, PRIORITY_CHAT, AsyncSingleFlight, ThrottledError, estimate_tokens
+from llm.structured import ExtractionError, parse_extraction
+from utils import tracing
+from utils.logger import log_message, log_error
+
+
+class AsyncLlamaClient(LlamaClientBase):
+    """asyncio counterpart of LlamaClient on a pooled httpx.AsyncClient.
+
+    Shares the response cache, circuit breaker and rate limiter with
+    LlamaClient, so sync and async callers in one process see the same
+    cached answers, the same view of provider health and one request
+    budget. Identical requests in flight on this client are coalesced.
+    """
+
+    def __init__(self, api_key, pool_size=100, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, cache=None, url=None, rate_limiter=None,
+                 retry_after_max=60.0):
+        super().__init__(api_key, max_retries, backoff_base, backoff_max, cache, url, rate_limiter,
+                         retry_after_max)
+        self.pool_size = pool_size
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.single_flight = AsyncSingleFlight()
+        self._client = None
+        log_message("AsyncLlamaClient initialized")
+
+    def _get_client(self):
+        # Created lazily so it binds to the running event loop
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _acquire(self, priority, estimated):
+        if self.rate_limiter:
+            await self.rate_limiter.acquire_async(estimated, priority)
+
+    async def _post(self, data, priority=PRIORITY_CHAT):
+        """POST and return the JSON body, settling its token usage with the rate limiter"""
+        estimated = estimate_tokens(data['messages'], data['max_tokens'])
+        response = await self._send(data, priority=priority, estimated=estimated)
+        return self._settle(response.json(), estimated)
+
+    async def _send(self, data, stream=False, priority=PRIORITY_CHAT, estimated=None):
+        """POST with retries on 429/5xx and network errors; returns the 200 response.
+
+        Every attempt first waits for room under the rate limit.
+        """
+        client = self._get_client()
+        if estimated is None:
+            estimated = estimate_tokens(data['messages'], data['max_tokens'])
+        await self._acquire(priority, estimated)
+        self.circuit_breaker.before_call()
+        attempt = 0
+        while True:
+            try:
+                request = client.build_request("POST", self.url, headers=self._headers(), json=data)
+                response = await client.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.TimeoutException, httpx.NetworkError) as e:
+                delay = self._network_retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            except httpx.HTTPError:
+                self.circuit_breaker.record_failure()
+                raise
+            except asyncio.CancelledError:
+                self.circuit_breaker.abandon()
+                raise
+            else:
+                status = response.status_code
+                delay = self._response_retry_delay(attempt, status, response.headers.get("Retry-After"))
+                if status == 200:
+                    return response
+                if delay is None:
+                    detail = (await response.aread()).decode('utf-8', 'replace')
+                    await response.aclose()
+                    raise LlamaAPIError(f"API Error {status}: {detail}")
+                await response.aclose()
+            attempt += 1
+            try:
+                await asyncio.sleep(delay)
+                await self._acquire(priority, estimated)
+            except (asyncio.CancelledError, ThrottledError):
+                self.circuit_breaker.abandon()
+                raise
+
+    async def _complete(self, messages, max_tokens=500, temperature=0.7, use_cache=True, validate=None,
+                        priority=PRIORITY_CHAT, persist=False):
+        """Return the completion text, raising on failure; only validated replies are cached"""
+        data = self._payload(messages, max_tokens, temperature)
+
+        with tracing.span('llm_call', max_tokens=max_tokens) as span:
+            key = self._cache_key(messages, max_tokens, temperature)
+            if use_cache and self.cache:
+                cached = self._cached(key, span)
+                if cached is not None:
+                    return cached
+
+            content = self._content(await self.single_flight.do(key, lambda: self._post(data, priority)))
+            if validate:
+                validate(content)
+            if use_cache and self.cache:
+                self.cache.set(key, content, persist=persist)
+            return content
+
+    async def chat_completion(self, messages, max_tokens=500, temperature=0.7, use_cache=True,
+                              priority=PRIORITY_CHAT, persist=False):
+        """Make API call to LLaMA"""
+        try:
+            return await self._complete(messages, max_tokens, temperature, use_cache, priority=priority,
+                                        persist=persist)
+        except Exception as e:
+            # Cancellation is a BaseException and still propagates
+            return self._fallback_reply(e)
+
+    async def stream_chat_completion(self, messages, max_tokens=500, temperature=0.7, use_cache=True,
+                                     persist=False):
+        """Yield the completion incrementally as the API streams it"""
+        with tracing.span('generation', streamed=True) as span:
+            async for chunk in self._stream_completion(messages, max_tokens, temperature, use_cache, persist, span):
+                yield chunk
+
+    async def _stream_completion(self, messages, max_tokens, temperature, use_cache, persist, span):
+        key = None
+        if use_cache and self.cache:
+            key = self._cache_key(messages, max_tokens, temperature)
+            cached = self._cached(key, span)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        started = time.perf_counter()
+        try:
+            response = await self._send(self._payload(messages, max_tokens, temperature, stream=True), stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    done, delta = self._stream_event(line)
+                    if done:
+                        break
+                    if delta:
+                        if not parts:
+                            span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 3))
+                        parts.append(delta)
+                        yield delta
+            finally:
+                await response.aclose()
+        except Exception as e:
+            fallback = self._stream_fallback_reply(e)
+            if not parts:
+                yield fallback
+            return
+
+        if key and parts:
+            self.cache.set(key, "".join(parts), persist=persist)
+
+    async def detect_intent(self, user_message):
+        """Detect user intent"""
+        with tracing.span('intent_llm'):
+            intent = await self.chat_completion(self._intent_messages(user_message), max_tokens=20,
+                                                priority=PRIORITY_BOOKING, persist=True)
+        return intent.strip().lower()
+
+    async def extract_structured(self, user_message, max_retries=1, context=None):
+        """Detect intent and extract booking slots in one call; returns None on failure"""
+        with tracing.span('extraction') as span:
+            return await self._extract_structured(user_message, max_retries, span, context)
+
+    async def _extract_structured(self, user_message, max_retries, span, context=None):
+        messages = self._extraction_messages(user_message, context)
+        for attempt in range(max_retries + 1):
+            try:
+                reply = await self._complete(messages, max_tokens=200, temperature=0.0, validate=parse_extraction,
+                                             priority=PRIORITY_BOOKING)
+                return parse_extraction(reply)
+            except ExtractionError as e:
+                messages = self._correction_messages(messages, e, attempt, span)
+            except Exception as e:
+                log_error("Structured extraction failed: %s", e)
+                return None
+        return None
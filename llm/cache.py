@@ -0,0 +1,173 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.logger import log_message, log_error
+
+
+def _normalize_text(text):
+    return ' '.join(str(text).split())
+
+
+def make_key(model, messages, max_tokens, temperature):
+    """Cache key for a chat completion request, insensitive to whitespace.
+
+    Case is kept: names in a prompt ("book for jo" vs "book for Jo") can
+    change the reply, e.g. the name structured extraction returns.
+    """
+    normalized = {
+        'model': model,
+        'messages': [[m.get('role'), _normalize_text(m.get('content', ''))] for m in messages],
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+    }
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM responses bounded by entry count and total bytes.
+
+    With persist_path set, entries are loaded on startup and written back
+    every persist_every new entries and at interpreter exit. Only entries
+    set with persist=True are written; the default keeps a reply (which may
+    repeat a customer's name or phone) in memory only.
+    """
+
+    def __init__(self, max_entries=2048, max_bytes=8 * 1024 * 1024, ttl=3600,
+                 persist_path=None, persist_every=50):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+        self._entries = OrderedDict()  # key -> (expires_at, value, persist)
+        self._bytes = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + len(value.encode('utf-8'))
+
+    def _remove(self, key):
+        _, value, _ = self._entries.pop(key)
+        self._bytes -= self._size(key, value)
+
+    def get(self, key):
+        """Get a cached response, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, _ = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _store(self, key, value, expires_at, persist):
+        """Insert an entry and evict down to the limits; call with the lock held"""
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, value, persist)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def set(self, key, value, ttl=None, persist=False):
+        """Store a response, evicting least recently used entries to stay within limits"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(key, value, expires_at, persist)
+            if persist:
+                self._unsaved += 1
+            should_save = self.persist_path and self._unsaved >= self.persist_every
+        if should_save:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+    def load(self):
+        """Load persisted entries, skipping expired ones"""
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r') as f:
+                stored = json.load(f)
+        except Exception as e:
+            log_error("Failed to load LLM cache: %s", e)
+            return
+        now = time.time()
+        with self._lock:
+            # Straight into the entries: going through set() could save the file while it is being read
+            for key, expires_at, value in stored:
+                if expires_at > now:
+                    self._store(key, value, expires_at, True)
+            self._unsaved = 0
+        log_message("LLM cache loaded: %d entries", len(self._entries))
+
+    def save(self):
+        """Write live entries to persist_path atomically"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            now = time.time()
+            stored = [[key, expires_at, value] for key, (expires_at, value, persist) in self._entries.items()
+                      if persist and expires_at > now]
+            self._unsaved = 0
+        temp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(stored, f)
+            os.replace(temp_path, self.persist_path)
+        except Exception as e:
+            log_error("Failed to save LLM cache: %s", e)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Get the process-wide response cache, persisted to LLM_CACHE_PATH if that is set"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache(persist_path=os.getenv('LLM_CACHE_PATH'))
+    return _shared_cache
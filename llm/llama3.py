@@ -1,54 +1,414 @@
 import requests
 import json
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from llm.cache import get_response_cache, make_key
+from llm.structured import ExtractionError, build_extraction_prompt, parse_extraction
+from llm.resilience import CircuitBreaker, CircuitOpenError, backoff_delay, retry_after_seconds
+from llm.throttle import (PRIORITY_BOOKING, PRIORITY_CHAT, RateLimiter, SingleFlight, ThrottledError,
+                          estimate_tokens)
+from utils import tracing
 from utils.logger import log_message, log_error
 
-class LlamaClient:
-    def __init__(self, api_key):
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# What chat_completion returns instead of raising when the API fails
+TECHNICAL_DIFFICULTIES_REPLY = "I'm having technical difficulties."
+SERVICE_ISSUES_REPLY = "Sorry, I'm experiencing issues."
+BUSY_REPLY = "We're handling a lot of requests right now. Please try again in a moment."
+FALLBACK_REPLIES = (TECHNICAL_DIFFICULTIES_REPLY, SERVICE_ISSUES_REPLY, BUSY_REPLY)
+
+INTENT_PROMPT = """
+Classify this message into ONE intent:
+- make_reservation: wants to book a table
+- modify_reservation: wants to change booking
+- cancel_reservation: wants to cancel booking
+- restaurant_recommendation: wants restaurant suggestions
+- general_info: asking about restaurants
+
+Message: "{user_message}"
+Respond with only the intent name.
+"""
+
+_sessions = {}
+_breakers = {}
+_limiters = {}
+_flights = {}
+_shared_lock = threading.Lock()
+
+
+def get_session(pool_size=20):
+    """Get a process-wide keep-alive session with a connection pool of pool_size"""
+    with _shared_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[pool_size] = session
+        return session
+
+
+def get_circuit_breaker(url, failure_threshold=5, reset_timeout=30.0):
+    """Get the circuit breaker shared by every client talking to url"""
+    with _shared_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, reset_timeout)
+            _breakers[url] = breaker
+        return breaker
+
+
+def get_rate_limiter(url):
+    """Get the rate limiter shared by every client (sync or async) talking to url"""
+    with _shared_lock:
+        limiter = _limiters.get(url)
+        if limiter is None:
+            limiter = RateLimiter.from_env()
+            _limiters[url] = limiter
+        return limiter
+
+
+def get_single_flight(url):
+    """Get the in-flight request registry shared by the sync clients talking to url"""
+    with _shared_lock:
+        flight = _flights.get(url)
+        if flight is None:
+            flight = SingleFlight()
+            _flights[url] = flight
+        return flight
+
+
+class LlamaAPIError(Exception):
+    """Raised when the LLM API returns an unusable response"""
+
+
+class LlamaClientBase:
+    """What LlamaClient and AsyncLlamaClient share: request payloads, reply
+    parsing, caching, retry decisions and fallback replies.
+
+    Subclasses only do the I/O, with requests or httpx.
+    """
+
+    def __init__(self, api_key, max_retries=3, backoff_base=0.5, backoff_max=8.0, cache=None, url=None,
+                 rate_limiter=None, retry_after_max=60.0):
         self.api_key = api_key
-        self.url = "https://openrouter.ai/api/v1/chat/completions"
+        self.url = url or "https://openrouter.ai/api/v1/chat/completions"
         self.model = "meta-llama/llama-3.1-8b-instruct"
-        log_message("LlamaClient initialized")
-    
-    def chat_completion(self, messages, max_tokens=500):
-        """Make API call to LLaMA"""
-        headers = {
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.circuit_breaker = get_circuit_breaker(self.url)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(self.url)
+        self.cache = cache if cache is not None else get_response_cache()
+
+    def _headers(self):
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
+
+    def _payload(self, messages, max_tokens, temperature, stream=False):
         data = {
             "model": self.model,
             "messages": messages,
             "max_tokens": max_tokens,
-            "temperature": 0.7
+            "temperature": temperature
         }
-        
-        try:
-            response = requests.post(self.url, headers=headers, json=data)
-            result = response.json()
-            
-            if response.status_code == 200:
-                return result['choices'][0]['message']['content']
+        if stream:
+            data["stream"] = True
+        return data
+
+    # Response cache
+
+    def _cache_key(self, messages, max_tokens, temperature):
+        return make_key(self.model, messages, max_tokens, temperature)
+
+    def _cached(self, key, span):
+        """Cached reply for key, or None; counts the lookup"""
+        cached = self.cache.get(key)
+        tracing.count('foodiespot_llm_cache_total', result='miss' if cached is None else 'hit')
+        if cached is not None:
+            span.set(cached=True)
+        return cached
+
+    # Rate limit accounting
+
+    def _settle(self, result, estimated):
+        """Record a reply's token usage and correct the rate limiter's estimate; returns result"""
+        usage = result.get('usage')
+        tracing.record_usage(usage)
+        if self.rate_limiter and usage:
+            self.rate_limiter.settle(estimated, usage.get('total_tokens'))
+        return result
+
+    @staticmethod
+    def _content(result):
+        return result['choices'][0]['message']['content']
+
+    # Retry decisions; the subclass sends, sleeps and raises
+
+    def _network_retry_delay(self, attempt, error):
+        """Seconds to wait before retrying after a connection error or timeout, or None to give up"""
+        tracing.count('foodiespot_llm_requests_total', status=type(error).__name__)
+        if attempt >= self.max_retries:
+            self.circuit_breaker.record_failure()
+            return None
+        delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+        log_error("LLaMA API network error, retrying in %.1fs: %s", delay, error)
+        tracing.count('foodiespot_llm_retries_total', reason='network')
+        return delay
+
+    def _response_retry_delay(self, attempt, status, retry_after=None):
+        """Seconds to wait before retrying a response, or None if it is final (200 or an error to raise)"""
+        tracing.count('foodiespot_llm_requests_total', status=status)
+        if status == 200:
+            self.circuit_breaker.record_success()
+            return None
+        retry_after = retry_after_seconds(retry_after)
+        delay = None
+        if status in RETRY_STATUSES:
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_max, retry_after, self.retry_after_max)
+            if status == 429 and self.rate_limiter:
+                # Over the provider's limit: hold everyone back, not just this call, but never
+                # longer than retry_after_max, however long the provider asked for
+                self.rate_limiter.pause(delay if delay is not None else self.retry_after_max)
+            if delay is None:
+                log_error("LLaMA API returned %s with Retry-After %.0fs, not retrying", status, retry_after)
+        if delay is None or attempt >= self.max_retries:
+            if status >= 500:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
+            return None
+        log_error("LLaMA API returned %s, retrying in %.1fs", status, delay)
+        tracing.count('foodiespot_llm_retries_total', reason=status)
+        return delay
+
+    # Streaming
+
+    @staticmethod
+    def _stream_event(line):
+        """(done, text) for one server-sent event line; text is None for lines without content"""
+        # Skip keep-alive blank lines and ': comment' lines
+        if not line or not line.startswith("data:"):
+            return False, None
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return True, None
+        chunk = json.loads(payload)
+        if 'error' in chunk:
+            raise LlamaAPIError(f"Stream error: {chunk['error']}")
+        tracing.record_usage(chunk.get('usage'))
+        choices = chunk.get('choices') or [{}]
+        return False, choices[0].get('delta', {}).get('content') or None
+
+    # What callers get instead of an exception
+
+    @staticmethod
+    def _fallback_reply(error):
+        if isinstance(error, (LlamaAPIError, KeyError, IndexError)):
+            log_error(str(error))
+            return TECHNICAL_DIFFICULTIES_REPLY
+        if isinstance(error, CircuitOpenError):
+            log_error(str(error))
+            return SERVICE_ISSUES_REPLY
+        if isinstance(error, ThrottledError):
+            log_error(str(error))
+            return BUSY_REPLY
+        log_error("LLaMA API Error: %s", error)
+        return SERVICE_ISSUES_REPLY
+
+    @staticmethod
+    def _stream_fallback_reply(error):
+        log_error("LLaMA streaming error: %s", error)
+        return BUSY_REPLY if isinstance(error, ThrottledError) else SERVICE_ISSUES_REPLY
+
+    # Prompts
+
+    @staticmethod
+    def _intent_messages(user_message):
+        return [{"role": "user", "content": INTENT_PROMPT.format(user_message=user_message)}]
+
+    @staticmethod
+    def _extraction_messages(user_message, context=None):
+        return [{"role": "user", "content": build_extraction_prompt(user_message, context=context)}]
+
+    @staticmethod
+    def _correction_messages(messages, error, attempt, span):
+        """Extraction messages asking the model to fix a malformed reply"""
+        log_error("Malformed extraction (attempt %s): %s", attempt + 1, error)
+        span.set(malformed=attempt + 1)
+        return messages[:1] + [
+            {"role": "assistant", "content": error.reply or ""},
+            {"role": "user", "content": f"That reply was invalid: {str(error)}. "
+                                        "Reply with only the corrected JSON object."}
+        ]
+
+
+class LlamaClient(LlamaClientBase):
+    def __init__(self, api_key, pool_size=20, connect_timeout=5.0, read_timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, cache=None, url=None, rate_limiter=None,
+                 retry_after_max=60.0):
+        super().__init__(api_key, max_retries, backoff_base, backoff_max, cache, url, rate_limiter,
+                         retry_after_max)
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = get_session(pool_size)
+        self.single_flight = get_single_flight(self.url)
+        log_message("LlamaClient initialized")
+
+    def _post(self, data, priority=PRIORITY_CHAT):
+        """POST to the API and return the JSON body, settling its token usage with the rate limiter"""
+        estimated = estimate_tokens(data['messages'], data['max_tokens'])
+        return self._settle(self._send(data, priority=priority, estimated=estimated).json(), estimated)
+
+    def _acquire(self, priority, estimated):
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated, priority)
+
+    def _send(self, data, stream=False, priority=PRIORITY_CHAT, estimated=None):
+        """POST to the API with retries on 429/5xx and network errors; returns the 200 response.
+
+        Every attempt first waits for room under the rate limit.
+        """
+        if estimated is None:
+            estimated = estimate_tokens(data['messages'], data['max_tokens'])
+
+        self._acquire(priority, estimated)
+        self.circuit_breaker.before_call()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, headers=self._headers(), json=data, timeout=self.timeout,
+                                             stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._network_retry_delay(attempt, e)
+                if delay is None:
+                    raise
+            except requests.RequestException:
+                self.circuit_breaker.record_failure()
+                raise
             else:
-                log_error(f"API Error: {result}")
-                return "I'm having technical difficulties."
+                status = response.status_code
+                delay = self._response_retry_delay(attempt, status, response.headers.get("Retry-After"))
+                if status == 200:
+                    return response
+                if delay is None:
+                    try:
+                        detail = response.json()
+                    except ValueError:
+                        detail = response.text
+                    raise LlamaAPIError(f"API Error {status}: {detail}")
+                response.close()
+            attempt += 1
+            time.sleep(delay)
+            try:
+                self._acquire(priority, estimated)
+            except ThrottledError:
+                self.circuit_breaker.abandon()
+                raise
+
+    def _complete(self, messages, max_tokens=500, temperature=0.7, use_cache=True, validate=None,
+                  priority=PRIORITY_CHAT, persist=False):
+        """Return the completion text, raising on failure; only validated replies are cached.
+
+        Identical requests already in flight are not sent again: they wait
+        for the one being made and share its reply. Replies reach the
+        on-disk cache only with persist, for prompts whose reply cannot
+        carry what a customer typed (intent labels).
+        """
+        data = self._payload(messages, max_tokens, temperature)
+
+        with tracing.span('llm_call', max_tokens=max_tokens) as span:
+            key = self._cache_key(messages, max_tokens, temperature)
+            if use_cache and self.cache:
+                cached = self._cached(key, span)
+                if cached is not None:
+                    return cached
+
+            content = self._content(self.single_flight.do(key, lambda: self._post(data, priority)))
+            if validate:
+                validate(content)
+            if use_cache and self.cache:
+                self.cache.set(key, content, persist=persist)
+            return content
+
+    def chat_completion(self, messages, max_tokens=500, temperature=0.7, use_cache=True,
+                        priority=PRIORITY_CHAT, persist=False):
+        """Make API call to LLaMA, answering repeated prompts from the response cache"""
+        try:
+            return self._complete(messages, max_tokens, temperature, use_cache, priority=priority,
+                                  persist=persist)
+        except Exception as e:
+            return self._fallback_reply(e)
+
+    def stream_chat_completion(self, messages, max_tokens=500, temperature=0.7, use_cache=True,
+                               persist=False):
+        """Yield the completion incrementally as the API streams it (server-sent events)"""
+        with tracing.span('generation', streamed=True) as span:
+            yield from self._stream_completion(messages, max_tokens, temperature, use_cache, persist, span)
+
+    def _stream_completion(self, messages, max_tokens, temperature, use_cache, persist, span):
+        key = None
+        if use_cache and self.cache:
+            key = self._cache_key(messages, max_tokens, temperature)
+            cached = self._cached(key, span)
+            if cached is not None:
+                yield cached
+                return
+
+        parts = []
+        started = time.perf_counter()
+        try:
+            response = self._send(self._payload(messages, max_tokens, temperature, stream=True), stream=True)
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    done, delta = self._stream_event(line)
+                    if done:
+                        break
+                    if delta:
+                        if not parts:
+                            span.set(first_token_ms=round((time.perf_counter() - started) * 1000, 3))
+                        parts.append(delta)
+                        yield delta
         except Exception as e:
-            log_error(f"LLaMA API Error: {str(e)}")
-            return "Sorry, I'm experiencing issues."
-    
+            fallback = self._stream_fallback_reply(e)
+            if not parts:
+                yield fallback
+            return
+
+        if key and parts:
+            self.cache.set(key, "".join(parts), persist=persist)
+
+    def extract_structured(self, user_message, max_retries=1, context=None):
+        """Detect intent and extract booking slots in one call; returns None on failure.
+
+        context is an optional transcript of the conversation so far.
+        """
+        with tracing.span('extraction') as span:
+            return self._extract_structured(user_message, max_retries, span, context)
+
+    def _extract_structured(self, user_message, max_retries, span, context=None):
+        messages = self._extraction_messages(user_message, context)
+        for attempt in range(max_retries + 1):
+            try:
+                reply = self._complete(messages, max_tokens=200, temperature=0.0, validate=parse_extraction,
+                                       priority=PRIORITY_BOOKING)
+                return parse_extraction(reply)
+            except ExtractionError as e:
+                messages = self._correction_messages(messages, e, attempt, span)
+            except Exception as e:
+                log_error("Structured extraction failed: %s", e)
+                return None
+        return None
+
     def detect_intent(self, user_message):
         """Detect user intent"""
-        prompt = f"""
-Classify this message into ONE intent:
-- make_reservation: wants to book a table
-- modify_reservation: wants to change booking
-- cancel_reservation: wants to cancel booking
-- restaurant_recommendation: wants restaurant suggestions
-- general_info: asking about restaurants
-
-Message: "{user_message}"
-Respond with only the intent name.
-"""
-        messages = [{"role": "user", "content": prompt}]
-        intent = self.chat_completion(messages, max_tokens=20)
+        with tracing.span('intent_llm'):
+            # Decides whether this is a booking, so it goes ahead of general chat
+            intent = self.chat_completion(self._intent_messages(user_message), max_tokens=20,
+                                          priority=PRIORITY_BOOKING, persist=True)
         return intent.strip().lower()
@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls are rejected because the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected for reset_timeout seconds. The first call after that is let
+    through as a trial: success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call should not be attempted"""
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("LLM provider circuit is open")
+                self.state = 'half_open'
+            elif self.state == 'half_open':
+                raise CircuitOpenError("LLM provider circuit is half-open, trial call in progress")
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+
+    def abandon(self):
+        """Forget a call that was cancelled before it finished, freeing the trial slot"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+def retry_after_seconds(header_value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not header_value:
+        return None
+    try:
+        return max(0.0, float(header_value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(header_value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, maximum=8.0, retry_after=None, retry_after_max=60.0):
+    """Delay before retry number attempt (0-based), capped at maximum.
+
+    A server-sent Retry-After is honored as given rather than cut down to
+    maximum, which would only retry into another rejection. If it asks for
+    more than retry_after_max, None is returned: give up instead of waiting.
+    """
+    if retry_after is not None:
+        return retry_after if retry_after <= retry_after_max else None
+    delay = min(maximum, base * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.0)
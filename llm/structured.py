@@ -0,0 +1,115 @@
+import json
+import re
+from datetime import datetime
+
+INTENTS = (
+    'make_reservation',
+    'modify_reservation',
+    'cancel_reservation',
+    'restaurant_recommendation',
+    'general_info',
+)
+
+# slot name -> (type, description used in the prompt)
+SLOTS = {
+    'cuisine': (str, "cuisine type, e.g. Italian"),
+    'location': (str, "neighborhood, e.g. Downtown"),
+    'restaurant': (str, "restaurant name"),
+    'date': (str, "YYYY-MM-DD"),
+    'time': (str, "HH:MM, 24-hour"),
+    'party_size': (int, "number of people"),
+    'customer_name': (str, "name for the booking"),
+    'phone': (str, "phone number"),
+    'confirmation_number': (str, "existing reservation confirmation number"),
+}
+
+EXTRACTION_PROMPT = """Read the customer's message to a restaurant booking assistant and reply with ONLY a JSON object:
+{{"intent": one of {intents},
+{slots}}}
+Use null for anything the message does not state. Do not guess.
+Today is {today}.
+{context}
+Message: "{message}"
+"""
+
+CONTEXT_BLOCK = """
+The conversation so far, for details the message refers to ("same time", "make it 4") but does not repeat:
+{context}
+"""
+
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+class ExtractionError(ValueError):
+    """Raised when a model reply does not match the extraction schema"""
+
+    def __init__(self, message, reply=None):
+        super().__init__(message)
+        self.reply = reply
+
+
+def build_extraction_prompt(user_message, today=None, context=None):
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    slots = ",\n".join(f' "{name}": {description} or null' for name, (_, description) in SLOTS.items())
+    return EXTRACTION_PROMPT.format(intents=", ".join(INTENTS), slots=slots, today=today,
+                                    context=CONTEXT_BLOCK.format(context=context) if context else "",
+                                    message=user_message)
+
+
+def parse_extraction(text):
+    """Parse and validate a model reply into {'intent': ..., <slot>: value or None}"""
+    try:
+        return _parse(text)
+    except ExtractionError as e:
+        e.reply = text
+        raise
+
+
+def _parse(text):
+    match = _JSON_RE.search(text or '')
+    if not match:
+        raise ExtractionError("reply contains no JSON object")
+    try:
+        data = json.loads(match.group(0))
+    except json.JSONDecodeError as e:
+        raise ExtractionError(f"invalid JSON: {e.msg}")
+    if not isinstance(data, dict):
+        raise ExtractionError("reply is not a JSON object")
+
+    intent = str(data.get('intent') or '').strip().lower()
+    if intent not in INTENTS:
+        raise ExtractionError(f"intent must be one of {', '.join(INTENTS)}")
+
+    result = {'intent': intent}
+    for name, (slot_type, _) in SLOTS.items():
+        value = data.get(name)
+        if isinstance(value, str):
+            value = value.strip().rstrip('.')
+            if value.lower() in ('', 'null', 'none', 'any', 'n/a'):
+                value = None
+        if value is not None and slot_type is int:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                raise ExtractionError(f"{name} must be an integer")
+            if value <= 0:
+                raise ExtractionError(f"{name} must be positive")
+        elif value is not None:
+            value = str(value)
+        result[name] = value
+
+    if result['date'] and not _DATE_RE.match(result['date']):
+        raise ExtractionError("date must be YYYY-MM-DD")
+    if result['time']:
+        result['time'] = _parse_time(result['time'])
+    return result
+
+
+def _parse_time(value):
+    for fmt in ('%H:%M', '%I:%M %p', '%I %p'):
+        try:
+            return datetime.strptime(value.upper(), fmt).strftime('%H:%M')
+        except ValueError:
+            continue
+    raise ExtractionError("time must be HH:MM")
@@ -0,0 +1,249 @@
+"""Keeping bursts of identical or excess LLM calls away from the provider.
+
+SingleFlight (and AsyncSingleFlight) let concurrent identical requests
+share one upstream call: the first caller makes it, the others wait for
+its result. RateLimiter holds calls to a requests-per-minute and
+tokens-per-minute budget with token buckets; callers over budget wait in
+a bounded queue, booking-path calls ahead of general chat, and are turned
+away with ThrottledError when the queue is full or the wait too long.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from utils import tracing
+
+PRIORITY_BOOKING = 0  # intent detection and slot extraction: someone is waiting to book
+PRIORITY_CHAT = 1
+
+DEFAULT_REQUESTS_PER_MINUTE = 300
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_MAX_WAIT = 15.0
+CHARS_PER_TOKEN = 4
+POLL_INTERVAL = 0.05  # longest sleep between checks while queued behind another caller
+
+
+class ThrottledError(Exception):
+    """Raised when a call cannot get under the rate limit in time"""
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough token cost of a request: its prompt plus the most it may generate"""
+    return sum(len(str(m.get('content', ''))) for m in messages) // CHARS_PER_TOKEN + max_tokens
+
+
+class TokenBucket:
+    """capacity units, refilled continuously at rate units per second; may go into debt"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount):
+        """Seconds until amount (capped at capacity) is available; call after refill"""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+
+class RateLimiter:
+    """Requests- and tokens-per-minute limits with a bounded priority queue of waiting callers.
+
+    A limit of 0 (or None) disables it. Callers are served strictly in
+    (priority, arrival) order, so a large request is not starved by a
+    stream of small ones.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_queue=DEFAULT_MAX_QUEUE,
+                 max_wait=DEFAULT_MAX_WAIT):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.throttled = 0
+
+    @classmethod
+    def from_env(cls):
+        """A limiter configured by FOODIESPOT_LLM_RPM/TPM/QUEUE/MAX_WAIT, read now (after any .env load)"""
+        return cls(float(os.getenv('FOODIESPOT_LLM_RPM', DEFAULT_REQUESTS_PER_MINUTE)),
+                   float(os.getenv('FOODIESPOT_LLM_TPM', DEFAULT_TOKENS_PER_MINUTE)),
+                   int(os.getenv('FOODIESPOT_LLM_QUEUE', DEFAULT_MAX_QUEUE)),
+                   float(os.getenv('FOODIESPOT_LLM_MAX_WAIT', DEFAULT_MAX_WAIT)))
+
+    def _enqueue(self, priority):
+        with self._lock:
+            if len(self._waiting) >= self.max_queue:
+                self.throttled += 1
+                tracing.count('foodiespot_llm_throttled_total', reason='queue_full')
+                raise ThrottledError("LLM request queue is full")
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            return ticket
+
+    def _leave(self, ticket):
+        """Drop a ticket that gave up waiting; call under _lock"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._changed.notify_all()
+
+    def _try_take(self, ticket, tokens):
+        """Take the budget if ticket is first in line and it is there; else seconds to wait. Call under _lock"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._waiting[0] != ticket:
+            return POLL_INTERVAL
+        wait = 0.0
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_for(amount))
+        if wait > 0:
+            return wait
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= tokens
+        heapq.heappop(self._waiting)
+        self._changed.notify_all()
+        return 0.0
+
+    def _give_up(self, ticket):
+        self._leave(ticket)
+        self.throttled += 1
+        tracing.count('foodiespot_llm_throttled_total', reason='timeout')
+        raise ThrottledError(f"LLM rate limit: no capacity within {self.max_wait:g}s")
+
+    def acquire(self, tokens=0, priority=PRIORITY_CHAT):
+        """Block until the call fits the limits; raises ThrottledError instead of waiting too long"""
+        ticket = self._enqueue(priority)
+        deadline = time.monotonic() + self.max_wait
+        with self._lock:
+            while True:
+                wait = self._try_take(ticket, tokens)
+                if not wait:
+                    return
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    # Give up now rather than at the deadline
+                    self._give_up(ticket)
+                self._changed.wait(wait)
+
+    async def acquire_async(self, tokens=0, priority=PRIORITY_CHAT):
+        """acquire for coroutines: waits with asyncio.sleep instead of blocking the loop"""
+        ticket = self._enqueue(priority)
+        deadline = time.monotonic() + self.max_wait
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_take(ticket, tokens)
+                    if not wait:
+                        return
+                    if wait > deadline - time.monotonic():
+                        self._give_up(ticket)
+                await asyncio.sleep(min(wait, POLL_INTERVAL))
+        except asyncio.CancelledError:
+            with self._lock:
+                self._leave(ticket)
+            raise
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once a call reports the tokens it really used"""
+        if self.tokens is None or not actual:
+            return
+        with self._lock:
+            self.tokens.level += estimated - actual
+
+    def pause(self, seconds):
+        """Hold every caller for seconds (the provider answered 429 with Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def queued(self):
+        return len(self._waiting)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """At most one in-flight call per key; concurrent callers with the same key share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            tracing.count('foodiespot_llm_coalesced_total')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task; it is cancelled only when every
+    caller waiting for it has been cancelled.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiters]
+
+    async def do(self, key, coroutine_function):
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(coroutine_function())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _, key=key, entry=entry: self._forget(key, entry))
+        else:
+            tracing.count('foodiespot_llm_coalesced_total')
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            if not entry[0].done() and entry[1] == 1:
+                entry[0].cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _forget(self, key, entry):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
@@ -0,0 +1,68 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    """A private copy of the sample catalog (shared catalogs and engines are keyed by path)"""
+    path = tmp_path / 'restaurant_data.json'
+    shutil.copy(os.path.join(ROOT, 'data', 'restaurant_data.json'), path)
+    return str(path)
+
+
+@pytest.fixture
+def reservation_tool(data_file, tmp_path):
+    from tools.reservation import ReservationTool
+    return ReservationTool(data_file, db_path=str(tmp_path / 'reservations.db'))
+
+
+@pytest.fixture
+def metrics():
+    """Tracing switched on for one test; yields the metrics registry"""
+    from utils import tracing
+    registry = tracing.get_metrics_registry()
+    registry.reset()
+    tracing.configure(enabled=True)
+    yield registry
+    tracing.configure(enabled=False)
+    registry.reset()
+
+
+class RecordingClient:
+    """LLM client double: records structured extraction calls and answers with fixed slots and replies"""
+
+    def __init__(self, extraction=None, intent='general_info'):
+        self.extraction = extraction
+        self.intent = intent
+        self.extracted = []
+        self.detected = []
+
+    def extract_structured(self, message, context=None):
+        self.extracted.append(message)
+        return dict(self.extraction) if self.extraction else None
+
+    def detect_intent(self, message):
+        self.detected.append(message)
+        return self.intent
+
+    def chat_completion(self, messages, max_tokens=500, temperature=0.7, **kwargs):
+        return "Happy to help!"
+
+
+@pytest.fixture
+def agent_with(data_file, tmp_path):
+    """agent_with(extraction) -> (agent, client): an agent whose LLM always extracts the given slots"""
+    from backend.agent import FoodieSpotAgent
+
+    def build(extraction=None, intent='general_info'):
+        client = RecordingClient(extraction, intent)
+        agent = FoodieSpotAgent('test-key', llama_client=client, data_file=data_file,
+                                db_path=str(tmp_path / 'reservations.db'))
+        return agent, client
+    return build
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from backend.async_agent import AsyncFoodieSpotAgent
+
+
+class AsyncRecordingClient:
+    """Async LLM client double that always detects one intent"""
+
+    def __init__(self, intent):
+        self.intent = intent
+
+    async def extract_structured(self, message, context=None):
+        return None
+
+    async def detect_intent(self, message):
+        # Give speculative work a chance to start while the "LLM" thinks
+        await asyncio.sleep(0.01)
+        return self.intent
+
+    async def chat_completion(self, messages, max_tokens=500, temperature=0.7, **kwargs):
+        return "Happy to help!"
+
+    async def aclose(self):
+        pass
+
+
+def run_turn(data_file, tmp_path, intent, message, prefetch_seconds=0):
+    """Resolve one message's intent; returns (agent, intent, prefetch tasks started)"""
+    agent = AsyncFoodieSpotAgent('test-key', llama_client=AsyncRecordingClient(intent), data_file=data_file,
+                                 db_path=str(tmp_path / 'reservations.db'))
+    warm = agent.reservation_tool.prefetch_availability
+
+    def slow_warm():
+        time.sleep(prefetch_seconds)
+        warm()
+    agent.reservation_tool.prefetch_availability = slow_warm
+    started = []
+    prefetch = agent._prefetch_availability
+
+    def record():
+        started.append(prefetch())
+        return started[-1]
+    agent._prefetch_availability = record
+
+    async def run():
+        intent_found, slots, speculative = await agent.resolve_intent(message)
+        if speculative:
+            speculative.cancel()
+        await asyncio.gather(*started, return_exceptions=True)
+        return intent_found
+    return agent, asyncio.run(run()), started
+
+
+def test_availability_is_prefetched_while_the_intent_is_detected(data_file, tmp_path):
+    agent, intent, started = run_turn(data_file, tmp_path, 'make_reservation', 'zzz qqq')
+    assert intent == 'make_reservation'
+    assert len(started) == 1 and not started[0].cancelled()
+    assert agent.reservation_tool.availability._slot_index is not None
+    assert not agent._prefetches
+
+
+def test_prefetch_is_cancelled_for_other_intents(data_file, tmp_path):
+    agent, intent, started = run_turn(data_file, tmp_path, 'general_info', 'zzz qqq', prefetch_seconds=0.1)
+    assert intent == 'general_info'
+    assert len(started) == 1 and started[0].cancelled()
+    assert not agent._prefetches
@@ -0,0 +1,62 @@
+import pytest
+
+from tools.availability import get_availability_engine, normalize_time, tables_needed
+
+DATE = '2025-05-27'  # r001 has 4 tables at 18:00, 3 at 19:00 and 2 at 20:00 in the sample catalog
+
+
+@pytest.fixture
+def engine(data_file):
+    return get_availability_engine(data_file)
+
+
+def test_parties_take_tables_until_the_slot_is_full(engine):
+    assert tables_needed(1) == 1 and tables_needed(4) == 1 and tables_needed(5) == 2
+    assert engine.reserve('r001', DATE, '20:00', 3)
+    assert engine.remaining_tables('r001', DATE, '20:00') == 1
+    assert not engine.reserve('r001', DATE, '20:00', 5)  # needs two tables
+    assert engine.reserve('r001', DATE, '8:00 PM', 2)
+    assert not engine.is_available('r001', DATE, '20:00', 1)
+    assert not engine.reserve('r001', DATE, '20:00', 1)
+
+
+def test_unknown_slots_and_oversized_parties_are_refused(engine):
+    assert not engine.reserve('r001', DATE, '21:00', 2)
+    assert not engine.reserve('r001', '2025-06-01', '18:00', 2)
+    assert not engine.reserve('nope', DATE, '18:00', 2)
+    assert not engine.reserve('r001', DATE, '18:00', 61)  # The Spice House seats 60
+    assert engine.remaining_tables('r001', DATE, '18:00') == 4
+
+
+def test_release_gives_tables_back_and_never_goes_below_zero(engine):
+    assert engine.reserve('r001', DATE, '19:00', 8)
+    assert engine.release('r001', DATE, '19:00', 8)
+    assert engine.remaining_tables('r001', DATE, '19:00') == 3
+    assert engine.release('r001', DATE, '19:00', 8)
+    assert engine.remaining_tables('r001', DATE, '19:00') == 3
+
+
+def test_move_is_all_or_nothing(engine):
+    assert engine.reserve('r001', DATE, '18:00', 2)
+    assert engine.reserve('r001', DATE, '20:00', 8)
+    # Target full: the booking stays where it was
+    assert not engine.move('r001', DATE, '18:00', 2, DATE, '20:00', 2)
+    assert engine.remaining_tables('r001', DATE, '18:00') == 3
+    assert engine.move('r001', DATE, '18:00', 2, DATE, '19:00', 2)
+    assert (engine.remaining_tables('r001', DATE, '18:00'), engine.remaining_tables('r001', DATE, '19:00')) == (4, 2)
+    # Growing within the same slot counts the tables it already holds
+    assert engine.move('r001', DATE, '19:00', 2, DATE, '19:00', 12)
+    assert engine.remaining_tables('r001', DATE, '19:00') == 0
+    assert not engine.move('r001', DATE, '19:00', 12, DATE, '19:00', 13)
+
+
+def test_nearest_slots_skip_full_tables(engine):
+    slots = engine.find_nearest_slots(DATE, '20:00', 2, max_results=3, restaurant_ids=['r001'])
+    assert [s['time'] for s in slots] == ['20:00', '19:00', '18:00']
+    engine.reserve('r001', DATE, '20:00', 8)
+    slots = engine.find_nearest_slots(DATE, '20:00', 2, max_results=3, restaurant_ids=['r001'])
+    assert [s['time'] for s in slots] == ['19:00', '18:00']
+
+
+def test_times_are_normalized():
+    assert normalize_time('7:00 PM') == normalize_time('19:00:00') == normalize_time('7 PM') == '19:00'
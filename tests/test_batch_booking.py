@@ -0,0 +1,60 @@
+import threading
+
+DATE = '2025-05-27'  # r001 has 4 tables at 18:00, 3 at 19:00 and 2 at 20:00 in the sample catalog
+
+
+def booking(time, party_size=2, restaurant_id='r001'):
+    return {'restaurant_id': restaurant_id, 'date': DATE, 'time': time, 'party_size': party_size,
+            'customer_name': 'Ana', 'phone': '555-0100'}
+
+
+def remaining(tool, time):
+    return tool.availability.remaining_tables('r001', DATE, time)
+
+
+def test_one_full_slot_books_nothing(reservation_tool):
+    reservations, unavailable = reservation_tool.make_reservations(
+        [booking('18:00'), booking('20:00'), booking('20:00'), booking('20:00')])
+    assert reservations is None
+    assert unavailable == [1, 2, 3]
+    assert (remaining(reservation_tool, '18:00'), remaining(reservation_tool, '20:00')) == (4, 2)
+    assert reservation_tool.find_reservations(phone='555-0100') == []
+
+
+def test_unknown_restaurant_books_nothing(reservation_tool):
+    assert reservation_tool.make_reservations([booking('18:00'), booking('18:00', restaurant_id='nope')]) == \
+        (None, [1])
+    assert remaining(reservation_tool, '18:00') == 4
+
+
+def test_batch_is_saved_in_one_go(reservation_tool):
+    reservations, unavailable = reservation_tool.make_reservations([booking('18:00'), booking('19:00')])
+    assert unavailable == []
+    assert len(reservation_tool.find_reservations(phone='555-0100')) == 2
+    assert (remaining(reservation_tool, '18:00'), remaining(reservation_tool, '19:00')) == (3, 2)
+
+
+def test_failed_save_releases_the_tables(reservation_tool, monkeypatch):
+    def fail(reservations):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(reservation_tool.store, 'add_many', fail)
+    assert reservation_tool.make_reservations([booking('18:00'), booking('19:00')]) == (None, [])
+    assert (remaining(reservation_tool, '18:00'), remaining(reservation_tool, '19:00')) == (4, 3)
+
+
+def test_concurrent_batches_do_not_oversell(reservation_tool):
+    results = []
+    start = threading.Barrier(8)
+
+    def book():
+        start.wait()
+        results.append(reservation_tool.make_reservations([booking('19:00'), booking('18:00')])[0])
+
+    threads = [threading.Thread(target=book) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(r is not None for r in results) == 3
+    assert (remaining(reservation_tool, '18:00'), remaining(reservation_tool, '19:00')) == (1, 0)
+    assert len(reservation_tool.find_reservations(phone='555-0100')) == 6
@@ -0,0 +1,52 @@
+import pytest
+
+BOOKING = {'intent': 'make_reservation', 'restaurant': 'Sakura Garden', 'date': '2025-05-27', 'time': '19:00',
+           'party_size': 2, 'customer_name': 'Jo Smith', 'phone': '555-0100'}
+MESSAGE = "Book a table at Sakura Garden on 2025-05-27 at 19:00 for 2, Jo Smith, 555-0100"
+
+
+def bookings(agent):
+    return agent.reservation_tool.find_reservations(phone='555-0100')
+
+
+def test_complete_booking_waits_for_confirmation(agent_with):
+    agent, _ = agent_with(BOOKING)
+    reply = agent.process_message(MESSAGE, 'c1')
+    assert "Reply **yes**" in reply
+    assert not bookings(agent)
+
+    reply = agent.process_message("Yes please", 'c1')
+    assert reply.startswith("✅")
+    assert len(bookings(agent)) == 1
+    # Confirming again does not book twice
+    agent.process_message("yes", 'c1')
+    assert len(bookings(agent)) == 1
+
+
+def test_declined_booking_is_not_made(agent_with):
+    agent, _ = agent_with(BOOKING)
+    agent.process_message(MESSAGE, 'c1')
+    assert "haven't booked" in agent.process_message("No, wait", 'c1')
+    assert not bookings(agent)
+
+
+@pytest.mark.parametrize('conversation_id', [None, 'c2'])
+def test_confirmation_belongs_to_its_conversation(agent_with, conversation_id):
+    agent, _ = agent_with(BOOKING)
+    agent.process_message(MESSAGE, 'c1')
+    agent.process_message("yes", conversation_id)
+    assert not bookings(agent)
+
+
+def test_suggested_slots_survive_a_missing_restaurant_record(agent_with, monkeypatch):
+    agent, _ = agent_with()
+    monkeypatch.setattr(agent.reservation_tool, 'get_restaurant_info', lambda restaurant_id: None)
+    reply = agent.handle_reservation("", {'date': '2025-05-27', 'time': '19:00', 'party_size': 2})
+    assert "closest available tables" in reply
+
+
+def test_unknown_restaurant_is_reported_not_replaced(agent_with):
+    agent, _ = agent_with(dict(BOOKING, restaurant='Chez Nowhere'))
+    reply = agent.process_message(MESSAGE.replace('Sakura Garden', 'Chez Nowhere'), 'c1')
+    assert "couldn't find a restaurant called **Chez Nowhere**" in reply
+    assert "Reply **yes**" not in reply
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from tools.catalog import RestaurantCatalog, get_catalog
+from tools.columnar import MAX_TABLES
+from tools.ingest import ChangeError
+
+
+def restaurant(catalog, restaurant_id):
+    return dict(catalog.get_restaurant(restaurant_id))
+
+
+def test_slot_changes_update_availability(reservation_tool):
+    catalog = reservation_tool.catalog
+    version = catalog.snapshot().version
+    catalog.apply_changes([{'op': 'slots', 'id': 'r001',
+                            'available_tables': {'2025-05-27': {'19:00': 9}, '2025-06-01': {'12:00': 2}}}])
+    assert catalog.snapshot().version == version
+    assert reservation_tool.availability.remaining_tables('r001', '2025-05-27', '19:00') == 9
+    assert reservation_tool.availability.remaining_tables('r001', '2025-06-01', '12:00') == 2
+
+
+def test_mixed_batch_applies_table_counts(reservation_tool):
+    catalog = reservation_tool.catalog
+    engine = reservation_tool.availability
+    assert engine.remaining_tables('r002', '2025-05-27', '18:00') == 5
+    catalog.apply_changes([
+        {'op': 'upsert', 'restaurant': dict(restaurant(catalog, 'r001'), name='Renamed')},
+        {'op': 'slots', 'id': 'r002', 'available_tables': {'2025-05-27': {'18:00': 0}}},
+    ])
+    assert catalog.get_restaurant('r002')['available_tables']['2025-05-27']['18:00'] == 0
+    assert engine.remaining_tables('r002', '2025-05-27', '18:00') == 0
+    assert not reservation_tool.check_availability('r002', '2025-05-27', '18:00', 2)
+
+
+def test_slot_changes_while_engine_is_behind(reservation_tool):
+    catalog = reservation_tool.catalog
+    engine = reservation_tool.availability
+    engine.remaining_tables('r002', '2025-05-27', '18:00')
+    # Two separate writes: the engine has not synced the upsert when the slots event arrives
+    with catalog._lock:
+        catalog.changelog.append([{'op': 'upsert', 'id': 'r001', 'at': 'x',
+                                   'restaurant': dict(restaurant(catalog, 'r001'), name='Renamed')}])
+        catalog._tail()
+    catalog._dispatch()
+    catalog.apply_changes([{'op': 'slots', 'id': 'r002', 'available_tables': {'2025-05-27': {'18:00': 1}}}])
+    assert engine.remaining_tables('r002', '2025-05-27', '18:00') == 1
+
+
+def test_upsert_and_close(reservation_tool):
+    catalog = reservation_tool.catalog
+    new = dict(restaurant(catalog, 'r002'), id='r999', name='Brand New Sushi')
+    catalog.apply_changes([{'op': 'upsert', 'restaurant': new}, {'op': 'close', 'id': 'r003'}])
+    assert catalog.get_restaurant('r003') is None
+    assert catalog.get_restaurant('r999')['name'] == 'Brand New Sushi'
+    assert reservation_tool.availability.remaining_tables('r999', '2025-05-27', '18:00') == 5
+    assert reservation_tool.availability.remaining_tables('r003', '2025-05-27', '18:00') == 0
+
+
+def test_replay_on_load(data_file):
+    catalog = get_catalog(data_file)
+    catalog.apply_changes([
+        {'op': 'slots', 'id': 'r001', 'available_tables': {'2025-05-27': {'19:00': 7}}},
+        {'op': 'close', 'id': 'r003'},
+    ])
+    replayed = RestaurantCatalog(data_file)
+    assert replayed.get_restaurant('r001')['available_tables']['2025-05-27']['19:00'] == 7
+    assert replayed.get_restaurant('r003') is None
+
+
+def test_compaction_folds_the_log_into_the_data_file(reservation_tool, data_file):
+    catalog = reservation_tool.catalog
+    reservation_tool.make_reservation('r001', '2025-05-27', '19:00', 2, 'Ana', '555-0100')
+    catalog.apply_changes([
+        {'op': 'slots', 'id': 'r001', 'available_tables': {'2025-05-27': {'19:00': 8}}},
+        {'op': 'close', 'id': 'r003'},
+    ])
+    catalog.compact_changes()
+
+    with open(data_file) as f:
+        restaurants = {r['id']: r for r in json.load(f)['restaurants']}
+    assert 'r003' not in restaurants
+    assert restaurants['r001']['available_tables']['2025-05-27']['19:00'] == 8
+    assert catalog.changelog.read(0) == ([], 0)
+    # The booking made before compaction still holds a table
+    assert reservation_tool.availability.remaining_tables('r001', '2025-05-27', '19:00') == 7
+
+
+def test_slot_changes_replace_published_counts(data_file):
+    catalog = get_catalog(data_file)
+    catalog.apply_changes([{'op': 'slots', 'id': 'r001', 'available_tables': {'2025-05-27': {'19:00': 7}}}])
+    published = catalog._slot_updates['r001']
+    catalog.apply_changes([{'op': 'slots', 'id': 'r001', 'available_tables': {'2025-05-27': {'19:00': 3}}}])
+    # Readers that took the old counts without the lock never see them change
+    assert published == {'2025-05-27': {'19:00': 7}}
+    assert catalog.get_restaurant('r001')['available_tables']['2025-05-27']['19:00'] == 3
+
+
+def test_compaction_keeps_changes_logged_while_writing(data_file, monkeypatch):
+    catalog = get_catalog(data_file)
+    catalog.apply_changes([{'op': 'slots', 'id': 'r001', 'available_tables': {'2025-05-27': {'19:00': 8}}}])
+    dump = json.dump
+
+    def dump_and_log(*args, **kwargs):
+        # The catalog lock is free while the data file is written
+        catalog.apply_changes([{'op': 'close', 'id': 'r003'}])
+        dump(*args, **kwargs)
+
+    monkeypatch.setattr('tools.catalog.json.dump', dump_and_log)
+    catalog.compact_changes()
+    monkeypatch.undo()
+
+    with open(data_file) as f:
+        restaurants = {r['id']: r for r in json.load(f)['restaurants']}
+    assert restaurants['r001']['available_tables']['2025-05-27']['19:00'] == 8
+    assert 'r003' in restaurants
+    entries, _ = catalog.changelog.read(0)
+    assert [entry['op'] for entry in entries] == ['close']
+    assert catalog.get_restaurant('r003') is None
+
+
+def test_table_counts_are_limited_to_what_columnar_storage_holds(data_file):
+    catalog = RestaurantCatalog(data_file, compact=True)
+    with pytest.raises(ChangeError):
+        catalog.apply_changes([{'op': 'slots', 'id': 'r001',
+                                'available_tables': {'2025-05-27': {'19:00': MAX_TABLES + 1}}}])
+    new = dict(catalog.get_restaurant('r002'), id='r999', available_tables={'2025-05-27': {'19:00': MAX_TABLES + 1}})
+    with pytest.raises(ChangeError):
+        catalog.apply_changes([{'op': 'upsert', 'restaurant': new}])
+    new['available_tables'] = {'2025-05-27': {'19:00': MAX_TABLES}}
+    catalog.apply_changes([{'op': 'upsert', 'restaurant': new}])
+    assert catalog.get_restaurant('r999')['available_tables']['2025-05-27']['19:00'] == MAX_TABLES
@@ -0,0 +1,62 @@
+import json
+
+from tools.catalog import RestaurantCatalog, get_catalog
+
+
+def rewrite(data_file, change):
+    with open(data_file) as f:
+        data = json.load(f)
+    change(data['restaurants'])
+    with open(data_file, 'w') as f:
+        json.dump(data, f)
+
+
+def test_edited_file_is_swapped_in_without_touching_old_snapshots(data_file):
+    catalog = RestaurantCatalog(data_file, check_interval=0)
+    before = catalog.snapshot()
+    names = before.derived('names', lambda s: [r['name'] for r in s.restaurants])
+
+    rewrite(data_file, lambda restaurants: restaurants.append(dict(restaurants[0], id='r031', name='Spice Annex')))
+    after = catalog.snapshot()
+    assert after.version == before.version + 1
+    assert len(after.restaurants) == 31 and len(before.restaurants) == 30
+    assert after.by_id['r031']['name'] == 'Spice Annex' and 'r031' not in before.by_id
+    # Derived structures belong to their snapshot
+    assert before.derived('names', lambda s: None) is names
+    assert len(after.derived('names', lambda s: [r['name'] for r in s.restaurants])) == 31
+
+
+def test_unchanged_file_keeps_the_snapshot(data_file):
+    catalog = RestaurantCatalog(data_file, check_interval=0)
+    assert catalog.snapshot() is catalog.snapshot()
+
+
+def test_changes_are_noticed_only_after_check_interval(data_file):
+    catalog = RestaurantCatalog(data_file, check_interval=3600)
+    before = catalog.snapshot()
+    rewrite(data_file, lambda restaurants: restaurants.pop())
+    assert catalog.snapshot() is before
+    assert len(catalog.refresh().restaurants) == 29
+
+
+def test_broken_file_keeps_serving_the_last_good_snapshot(data_file):
+    catalog = RestaurantCatalog(data_file, check_interval=0)
+    before = catalog.snapshot()
+    with open(data_file, 'w') as f:
+        f.write('{"restaurants": [')
+    assert catalog.snapshot() is before
+    assert catalog.get_restaurant('r002')['name'] == 'Sakura Garden'
+
+
+def test_reload_is_announced_to_subscribers(data_file):
+    catalog = RestaurantCatalog(data_file, check_interval=0)
+    catalog.snapshot()
+    events = []
+    catalog.subscribe(events.append)
+    rewrite(data_file, lambda restaurants: restaurants.pop())
+    version = catalog.snapshot().version
+    assert events == [{'kind': 'reload', 'ids': None, 'version': version}]
+
+
+def test_tools_share_one_catalog_per_file(data_file):
+    assert get_catalog(data_file) is get_catalog(data_file)
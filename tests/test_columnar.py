@@ -0,0 +1,80 @@
+import json
+import random
+
+import pytest
+
+from tools.catalog import CatalogSnapshot
+from tools import columnar as columnar_module
+from tools.columnar import MAX_TABLES, ColumnarCatalog
+from tools.index import RestaurantIndex
+
+
+@pytest.fixture
+def restaurants(data_file):
+    with open(data_file) as f:
+        return json.load(f)['restaurants']
+
+
+@pytest.fixture
+def indexes(restaurants):
+    return RestaurantIndex(CatalogSnapshot(restaurants, 1)), ColumnarCatalog.from_restaurants(restaurants)
+
+
+def ids(restaurants):
+    return [r['id'] for r in restaurants]
+
+
+def random_query(rng, restaurants):
+    """A query built from terms in the catalog (or fragments of them), sometimes with no match"""
+    def term(field):
+        values = [v for r in restaurants for v in (r[field] if isinstance(r[field], list) else [r[field]])]
+        value = rng.choice(values).lower()
+        start = rng.randrange(len(value))
+        return rng.choice([value, value[start:start + 4], 'nowhere'])
+
+    query = {}
+    for field in ('cuisine', 'location', 'ambience'):
+        if rng.random() < 0.4:
+            query[field] = term(field)
+    if rng.random() < 0.3:
+        query['features'] = [term('features') for _ in range(rng.randint(1, 2))]
+    if rng.random() < 0.3:
+        query['min_rating'] = rng.choice([4.0, 4.3, 4.5, 4.8])
+    query['max_results'] = rng.randint(1, 10)
+    return query
+
+
+@pytest.mark.parametrize('use_numpy', [True, False], ids=['numpy', 'scan'])
+def test_columnar_queries_match_the_inverted_index(indexes, restaurants, use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(columnar_module, '_numpy_module', None)
+    elif columnar_module._numpy() is None:
+        pytest.skip("NumPy is not installed")
+    index, columnar = indexes
+    rng = random.Random(15)
+    for _ in range(500):
+        query = random_query(rng, restaurants)
+        assert ids(columnar.query(**query)) == ids(index.query(**query)), query
+
+
+def test_columnar_lookups_match_the_inverted_index(indexes):
+    index, columnar = indexes
+    assert ids(columnar.top_rated(7)) == ids(index.top_rated(7))
+    for field, term in (('cuisine', 'indian'), ('location', 'town'), ('features', 'view'), ('ambience', 'x')):
+        assert ids(columnar.lookup(field, term, 10)) == ids(index.lookup(field, term, 10))
+        assert sorted(columnar.values_in_text(field, f"any {term} here")) == \
+            sorted(index.values_in_text(field, f"any {term} here"))
+
+
+def test_records_read_back_like_the_source(indexes, restaurants):
+    _, columnar = indexes
+    assert list(columnar) == restaurants
+    assert columnar.by_id['r002']['name'] == 'Sakura Garden'
+    assert columnar.by_id.get('nope') is None
+
+
+def test_table_counts_are_clamped_to_the_column_width(restaurants):
+    restaurants[0]['available_tables'] = {'2025-05-27': {'18:00': 100000, '19:00': -3}}
+    columnar = ColumnarCatalog.from_restaurants(restaurants)
+    tables = columnar.available_tables(0)
+    assert tables == {'2025-05-27': {'18:00': MAX_TABLES, '19:00': 0}}
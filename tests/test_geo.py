@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from tools.geo import haversine_km
+from tools.recommend import RecommendationTool
+
+
+@pytest.fixture
+def tool(data_file):
+    return RecommendationTool(data_file)
+
+
+def brute_force(tool, lat, lng, max_results):
+    restaurants = tool.catalog.get_restaurants()
+    ranked = sorted(haversine_km(lat, lng, r['coordinates']['lat'], r['coordinates']['lng']) for r in restaurants)
+    return [round(distance, 2) for distance in ranked[:max_results]]
+
+
+@pytest.mark.parametrize('lat, lng', [(40.73, -73.99), (30.0, -74.0), (10.0, -74.0), (-33.9, 151.2), (89.9, 0.0)])
+def test_nearest_matches_a_full_scan(tool, lat, lng):
+    results = tool.recommend_nearby(lat, lng, max_results=3)
+    assert [r['distance_km'] for r in results] == brute_force(tool, lat, lng, 3)
+
+
+def test_far_query_does_not_walk_empty_rings(tool):
+    tool.recommend_nearby(40.73, -73.99)  # build the index outside the timing
+    started = time.perf_counter()
+    results = tool.recommend_nearby(-33.9, 151.2, max_results=5)
+    assert time.perf_counter() - started < 0.5
+    assert len(results) == 5
+
+
+def test_radius_still_limits_results(tool):
+    assert tool.recommend_nearby(-33.9, 151.2, radius_km=100) == []
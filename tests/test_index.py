@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from tools.catalog import CatalogSnapshot
+from tools.index import RestaurantIndex
+
+
+@pytest.fixture
+def restaurants(data_file):
+    with open(data_file) as f:
+        return json.load(f)['restaurants']
+
+
+@pytest.fixture
+def index(restaurants):
+    return RestaurantIndex(CatalogSnapshot(restaurants, 1))
+
+
+def ids(restaurants):
+    return [r['id'] for r in restaurants]
+
+
+def full_scan(restaurants, predicate, max_results):
+    ranked = sorted(enumerate(restaurants), key=lambda item: (-item[1]['rating'], item[0]))
+    return [r['id'] for _, r in ranked if predicate(r)][:max_results]
+
+
+def test_restaurants_are_ranked_by_rating_then_file_order(index):
+    assert ids(index.top_rated(4)) == ['r002', 'r021', 'r007', 'r016']
+    assert index.ratings == sorted(index.ratings, reverse=True)
+
+
+def test_resolve_merges_every_value_containing_the_term(index):
+    # "indian" is in both "Indian" and "North Indian"
+    posting = index.resolve('cuisine', '  Indian ')
+    assert [index.id_at(rank) for rank in posting] == ['r001', 'r015', 'r013', 'r023']
+    assert posting == sorted(set(posting))
+    assert index.resolve('cuisine', 'indian') is posting  # cached
+    assert index.resolve('cuisine', 'klingon') == []
+
+
+def test_lookup_and_query_match_a_full_scan(index, restaurants):
+    assert ids(index.lookup('location', 'town', 10)) == full_scan(
+        restaurants, lambda r: 'town' in r['location'].lower(), 10)
+    assert ids(index.query(cuisine='american', features=['craft'], max_results=5)) == full_scan(
+        restaurants, lambda r: any('american' in c.lower() for c in r['cuisine']) and any('craft' in f for f in r['features']), 5)
+    assert ids(index.query(ambience='casual', min_rating=4.5, max_results=10)) == full_scan(
+        restaurants, lambda r: 'casual' in r['ambience'] and r['rating'] >= 4.5, 10)
+    assert index.query(cuisine='italian', location='midtown') == []
+
+
+def test_values_in_text_and_matcher(index):
+    assert index.values_in_text('location', "somewhere in old town or midtown?") == ['old town', 'midtown']
+    is_bbq = index.matcher('cuisine', 'bbq')
+    assert [index.id_at(rank) for rank in range(len(index.restaurants)) if is_bbq(rank)] == ['r017', 'r015', 'r025']
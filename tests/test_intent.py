@@ -0,0 +1,52 @@
+import pytest
+
+from backend.intent import IntentClassifier
+
+
+@pytest.mark.parametrize('message, intent', [
+    ("Cancel my reservation please", 'cancel_reservation'),
+    ("I'd like to book a table for 4 tomorrow", 'make_reservation'),
+    ("Can you recommend a good Italian place?", 'restaurant_recommendation'),
+])
+def test_clear_messages_are_classified_locally(message, intent):
+    classifier = IntentClassifier()
+    assert classifier.predict(message) == intent
+    assert classifier.stats()['hits'] == 1
+
+
+def test_ambiguous_message_falls_back_to_the_llm():
+    classifier = IntentClassifier()
+    assert classifier.predict("hmm") is None
+    assert classifier.stats()['fallbacks'] == 1
+
+
+@pytest.mark.parametrize('message', [
+    "Book a table at Sakura Garden tomorrow for John",
+    "Cancel my booking, name is Priya",
+])
+def test_local_slot_intents_still_extract_slots_without_digits(agent_with, message):
+    agent, client = agent_with({'intent': 'make_reservation', 'restaurant': 'Sakura Garden',
+                                'customer_name': 'John'})
+    intent, slots = agent.resolve_intent(message)
+    assert intent in ('make_reservation', 'cancel_reservation')
+    assert client.extracted == [message]
+    assert slots['customer_name'] == 'John'
+    assert not client.detected
+
+
+def test_local_non_slot_intents_skip_the_llm(agent_with):
+    agent, client = agent_with()
+    intent, slots = agent.resolve_intent("Can you recommend a good Italian place?")
+    assert intent == 'restaurant_recommendation'
+    assert slots == {}
+    assert not client.extracted and not client.detected
+
+
+def test_intent_sources_are_counted(metrics):
+    classifier = IntentClassifier()
+    classifier.predict("Cancel my reservation please")
+    classifier.predict("hmm")
+    text = metrics.render()
+    assert '# TYPE foodiespot_intent_total counter' in text
+    assert 'foodiespot_intent_total{source="local"} 1' in text
+    assert 'foodiespot_intent_total{source="llm"} 1' in text
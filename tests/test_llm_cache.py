@@ -0,0 +1,87 @@
+from llm.cache import ResponseCache, make_key
+
+MODEL = 'test-model'
+
+
+def key(content, role='user', max_tokens=100, temperature=0.0):
+    return make_key(MODEL, [{'role': role, 'content': content}], max_tokens, temperature)
+
+
+def test_key_ignores_whitespace():
+    assert key("Book a table  for\n4") == key(" Book a table for 4 ")
+
+
+def test_key_keeps_case():
+    assert key("Book for Jo Smith") != key("book for jo smith")
+
+
+def test_key_covers_role_and_parameters():
+    assert key("hi") != key("hi", role='system')
+    assert key("hi") != key("hi", max_tokens=200)
+    assert key("hi") != key("hi", temperature=0.7)
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResponseCache(max_entries=2)
+    cache.set('a', 'A')
+    cache.set('b', 'B')
+    cache.get('a')
+    cache.set('c', 'C')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'A'
+    cache.set('d', 'D', ttl=-1)
+    assert cache.get('d') is None
+
+
+def reply(content):
+    return {'choices': [{'message': {'content': content}}]}
+
+
+def test_only_shareable_entries_are_persisted(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(persist_path=path)
+    cache.set('intent', 'make_reservation', persist=True)
+    cache.set('extraction', '{"customer_name": "Jo"}')
+    cache.save()
+    reloaded = ResponseCache(persist_path=path)
+    assert reloaded.get('intent') == 'make_reservation'
+    assert reloaded.get('extraction') is None
+    # Still served from memory in the process that made it
+    assert cache.get('extraction') == '{"customer_name": "Jo"}'
+
+
+def test_structured_extraction_is_not_persisted(tmp_path):
+    from llm.llama3 import LlamaClient
+    path = tmp_path / 'cache.json'
+    client = LlamaClient('test-key', cache=ResponseCache(persist_path=str(path)), rate_limiter=False)
+    client._post = lambda data, priority: reply(
+        '{"intent": "make_reservation", "customer_name": "Jo Smith", "phone": "555-0100"}')
+    assert client.extract_structured("Book for Jo Smith, 555-0100")['customer_name'] == 'Jo Smith'
+    client.cache.save()
+    assert 'Jo Smith' not in path.read_text()
+
+
+def test_general_replies_are_not_persisted(tmp_path):
+    from llm.llama3 import LlamaClient
+    path = tmp_path / 'cache.json'
+    client = LlamaClient('test-key', cache=ResponseCache(persist_path=str(path)), rate_limiter=False)
+    client._post = lambda data, priority: reply("Hi Jo Smith, we open at noon.")
+    client.chat_completion([{'role': 'user', 'content': "I'm Jo Smith, 555-0100. When do you open?"}])
+    client._post = lambda data, priority: reply("general_info")
+    assert client.detect_intent("When do you open?") == 'general_info'
+    client.cache.save()
+    assert 'Jo Smith' not in path.read_text()
+    assert ResponseCache(persist_path=str(path)).stats()['entries'] == 1
+
+
+def test_loading_does_not_rewrite_the_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.json')
+    cache = ResponseCache(persist_path=path)
+    for i in range(5):
+        cache.set(f'k{i}', 'v', persist=True)
+    cache.save()
+    saves = []
+    monkeypatch.setattr(ResponseCache, 'save', lambda self: saves.append(1))
+    reloaded = ResponseCache(persist_path=path, persist_every=1)
+    assert saves == []
+    assert reloaded.stats()['entries'] == 5
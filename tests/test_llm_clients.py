@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+
+from bench.mock_openrouter import GENERAL_REPLY, MockSettings, start_mock_server
+from llm.async_llama import AsyncLlamaClient
+from llm.cache import ResponseCache
+from llm.llama3 import TECHNICAL_DIFFICULTIES_REPLY, LlamaClient
+from llm.resilience import backoff_delay
+from llm.throttle import RateLimiter
+
+MESSAGES = [{'role': 'user', 'content': "What kinds of restaurants do you have?"}]
+
+
+@pytest.fixture
+def mock_api():
+    server = start_mock_server(MockSettings(latency_ms=0, latency_sigma=0, tokens_per_second=1e6))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class SyncCalls:
+    """Drives LlamaClient"""
+
+    def __init__(self, url, **options):
+        self.client = LlamaClient('test-key', url=url, cache=ResponseCache(), rate_limiter=False, **options)
+
+    def chat(self, messages):
+        return self.client.chat_completion(messages)
+
+    def stream(self, messages):
+        return list(self.client.stream_chat_completion(messages))
+
+    def extract(self, message):
+        return self.client.extract_structured(message)
+
+
+class AsyncCalls:
+    """Drives AsyncLlamaClient with the same calls, each on a fresh event loop"""
+
+    def __init__(self, url, **options):
+        self.url = url
+        self.options = options
+
+    def _run(self, call):
+        async def run():
+            client = AsyncLlamaClient('test-key', url=self.url, cache=self.cache, rate_limiter=False,
+                                      **self.options)
+            try:
+                return await call(client)
+            finally:
+                await client.aclose()
+        return asyncio.run(run())
+
+    @property
+    def cache(self):
+        if not hasattr(self, '_cache'):
+            self._cache = ResponseCache()
+        return self._cache
+
+    def chat(self, messages):
+        return self._run(lambda client: client.chat_completion(messages))
+
+    def stream(self, messages):
+        async def collect(client):
+            return [chunk async for chunk in client.stream_chat_completion(messages)]
+        return self._run(collect)
+
+    def extract(self, message):
+        return self._run(lambda client: client.extract_structured(message))
+
+
+@pytest.fixture(params=[SyncCalls, AsyncCalls], ids=['sync', 'async'])
+def calls(request, mock_api):
+    return lambda **options: request.param(mock_api.url, **options)
+
+
+def test_chat_completion_is_cached(calls, mock_api):
+    llm = calls()
+    assert llm.chat(MESSAGES) == GENERAL_REPLY
+    assert llm.chat(MESSAGES) == GENERAL_REPLY
+    assert mock_api.settings.requests == 1
+
+
+def test_streamed_reply_is_reassembled_and_cached(calls, mock_api):
+    llm = calls()
+    messages = [{'role': 'user', 'content': "Tell me about FoodieSpot"}]
+    assert "".join(llm.stream(messages)) == GENERAL_REPLY
+    assert llm.stream(messages) == [GENERAL_REPLY]
+    assert mock_api.settings.requests == 1
+
+
+def test_structured_extraction(calls):
+    assert calls().extract("any good Italian places?") == {
+        'intent': 'restaurant_recommendation', 'cuisine': 'Italian', 'location': None, 'restaurant': None,
+        'date': None, 'time': None, 'party_size': None, 'customer_name': None, 'phone': None,
+        'confirmation_number': None}
+
+
+def test_server_errors_are_retried_then_answered_with_a_fallback(calls, mock_api):
+    mock_api.settings.error_rate = 1.0
+    llm = calls(max_retries=2, backoff_base=0.001)
+    assert llm.chat(MESSAGES) == TECHNICAL_DIFFICULTIES_REPLY
+    assert mock_api.settings.requests == 3
+
+
+def test_retry_after_is_honored_beyond_backoff_max():
+    assert backoff_delay(0, maximum=8.0, retry_after=20.0) == 20.0
+    assert backoff_delay(0, maximum=8.0, retry_after=90.0, retry_after_max=60.0) is None
+    assert backoff_delay(5, base=0.5, maximum=8.0) <= 8.0
+
+
+def test_client_gives_up_when_retry_after_is_too_long(mock_api):
+    client = LlamaClient('test-key', url=mock_api.url, cache=ResponseCache(), rate_limiter=False,
+                         backoff_max=0.1, retry_after_max=30.0)
+    assert client._response_retry_delay(0, 429, '5') == 5.0
+    assert client._response_retry_delay(0, 429, '120') is None
+    assert client._response_retry_delay(0, 503) <= 0.1
+
+
+def test_giving_up_pauses_the_shared_limiter_at_most_retry_after_max(mock_api):
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=None)
+    client = LlamaClient('test-key', url=mock_api.url, cache=ResponseCache(), rate_limiter=limiter,
+                         retry_after_max=30.0)
+    started = time.monotonic()
+    assert client._response_retry_delay(0, 429, '3600') is None
+    assert limiter._paused_until - started <= 30.5
@@ -0,0 +1,22 @@
+from tools.reservation_store import ReservationStore
+
+
+def booking(reservation_id, date, status='confirmed'):
+    return {'id': reservation_id, 'restaurant_id': 'r001', 'date': date, 'time': '19:00', 'party_size': 2,
+            'customer_name': 'Ana', 'phone': '555-0100', 'status': status, 'created_at': '2026-01-01T00:00:00'}
+
+
+def test_iter_confirmed_skips_past_and_cancelled_bookings(tmp_path):
+    store = ReservationStore(str(tmp_path / 'reservations.db'))
+    try:
+        store.add_many([booking('a', '2026-01-05'), booking('b', '2026-02-01'),
+                        booking('c', '2026-03-01', status='cancelled')])
+        assert list(store.iter_confirmed()) == [('r001', '2026-01-05', '19:00', 2), ('r001', '2026-02-01', '19:00', 2)]
+        assert list(store.iter_confirmed(since='2026-02-01')) == [('r001', '2026-02-01', '19:00', 2)]
+        with store._reader() as connection:
+            plan = connection.execute(
+                "EXPLAIN QUERY PLAN SELECT restaurant_id, date, time, party_size FROM reservations "
+                "WHERE status = 'confirmed' AND date >= ?", ('2026-02-01',)).fetchall()
+        assert 'idx_reservations_status_date' in ' '.join(row[-1] for row in plan)
+    finally:
+        store.close()
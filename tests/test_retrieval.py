@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from tools.catalog import CatalogSnapshot
+from tools.index import RestaurantIndex
+from tools.retrieval import CHARS_PER_TOKEN, RestaurantRetriever
+
+
+@pytest.fixture
+def retriever(data_file):
+    with open(data_file) as f:
+        restaurants = json.load(f)['restaurants']
+    return RestaurantRetriever(RestaurantIndex(CatalogSnapshot(restaurants, 1)))
+
+
+def names(results):
+    return [chunk.split(' (')[0] for _, chunk in results]
+
+
+def test_named_restaurant_ranks_first(retriever):
+    assert names(retriever.retrieve("Is Sakura Garden romantic?"))[0] == 'Sakura Garden'
+
+
+def test_rare_words_outweigh_common_ones(retriever):
+    # "karaoke" is in one restaurant, "bbq" in three: the karaoke place wins
+    results = retriever.retrieve("bbq with karaoke")
+    assert names(results)[0] == 'Seoul Kitchen'
+    scores = [score for score, _ in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_typos_and_synonyms_still_retrieve(retriever):
+    assert names(retriever.retrieve("any place with a harbr view?"))[0] == 'Coastal Breeze'
+    assert 'Dragon Palace' in names(retriever.retrieve("where can I get dumplings"))
+
+
+def test_attribute_questions_alone_retrieve_nothing(retriever):
+    assert retriever.retrieve("what are your opening hours?") == []
+    context = retriever.context("what are your opening hours?")
+    assert context.startswith("FoodieSpot has 30 locations")
+    assert "Restaurants relevant" not in context
+
+
+@pytest.mark.parametrize('max_tokens', [5, 40, 80, 400])
+def test_context_stays_within_the_token_cap(retriever, max_tokens):
+    context = retriever.context("indian vegetarian seafood bbq", top_k=10, max_tokens=max_tokens)
+    assert len(context) <= max_tokens * CHARS_PER_TOKEN
+
+
+def test_context_lists_whole_chunks_only(retriever):
+    context = retriever.context("Is Sakura Garden romantic?", max_tokens=200)
+    lines = context.split("\n")
+    assert lines[1] == "Restaurants relevant to the question:"
+    assert lines[2].startswith("- Sakura Garden (Midtown); Japanese, Sushi; romantic ambience")
+    assert all(line.startswith("- ") for line in lines[2:])
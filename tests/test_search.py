@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from tools.catalog import CatalogSnapshot
+from tools.index import RestaurantIndex
+from tools.search import RestaurantSearch, edit_distance, normalize_words
+
+
+@pytest.fixture
+def search(data_file):
+    with open(data_file) as f:
+        restaurants = json.load(f)['restaurants']
+    return RestaurantSearch(RestaurantIndex(CatalogSnapshot(restaurants, 1)))
+
+
+def ids(restaurants):
+    return [r['id'] for r in restaurants]
+
+
+def test_typos_resolve_to_catalog_values(search):
+    query = search.parse("japaneese sushi place in midtwn").as_dict()
+    assert (query['cuisine'], query['location']) in {('japanese', 'midtown'), ('sushi', 'midtown')}
+    assert search.resolve('cuisine', "thia") == 'thai'
+    assert search.resolve('cuisine', "Italian cuisine.") == 'italian'
+    assert edit_distance('thia', 'thai') == 1
+
+
+def test_synonyms_and_filler_words(search):
+    assert normalize_words("Show me a ramen place with a patio") == ['japanese', 'outdoor', 'seating']
+    query = search.parse("veggie food with a patio").as_dict()
+    assert query['cuisine'] == 'vegetarian'
+    assert query['features'] == ['outdoor seating']
+    assert ids(search.search("dim sum")) == ['r019']
+
+
+def test_unrecognized_text_matches_nothing(search):
+    assert search.search("xyzzy plugh") == []
+    assert not search.parse("show me some places")
+
+
+def test_weakest_filter_is_relaxed_when_too_few_match(search):
+    # No Italian restaurant is in Midtown: location weighs less than cuisine, so it goes first
+    assert ids(search.search("italian in midtown", max_results=2)) == ['r003', 'r018']
+    # Full matches come first, then the relaxed ones
+    results = ids(search.search("indian downtown", max_results=4))
+    assert results[:2] == ['r001', 'r013']
+    assert set(results[2:]) <= {'r015', 'r023'}
+
+
+def test_overrides_replace_what_the_text_says(search):
+    assert ids(search.search("something nice", max_results=1, cuisine="Korean")) == ['r017']
+
+
+def test_name_search_tolerates_typos(search):
+    assert search.search_names("sakra garden")[0][1]['id'] == 'r002'
+    assert search.search_names("spice")[0][1]['id'] in {'r001', 'r029'}
+    assert search.search_names("") == []
@@ -0,0 +1,44 @@
+import threading
+
+import pytest
+import requests
+
+from backend.server import MAX_LIMIT, AgentServer
+
+
+@pytest.fixture
+def api(agent_with):
+    agent, _ = agent_with()
+    server = AgentServer(('127.0.0.1', 0), agent, workers=2, queue_size=2, admin_token='secret')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", server
+    server.shutdown()
+    server.server_close()
+
+
+def test_limit_is_capped(api, monkeypatch):
+    url, server = api
+    seen = []
+    tool = server.agent.recommendation_tool
+    recommend = tool.recommend
+    monkeypatch.setattr(tool, 'recommend', lambda **kwargs: seen.append(kwargs['max_results']) or recommend(**kwargs))
+    assert requests.get(f"{url}/recommend", params={'limit': 100000}).status_code == 200
+    assert requests.get(f"{url}/recommend", params={'limit': 3}).status_code == 200
+    assert seen == [MAX_LIMIT, 3]
+    assert requests.get(f"{url}/recommend", params={'limit': 0}).status_code == 400
+
+
+def test_conversations_keep_no_message_copy(api):
+    url, server = api
+    reply = requests.post(f"{url}/chat", json={'message': "hello"}).json()
+    conversation = server.conversations.get(reply['conversation_id'])
+    assert set(conversation) == {'id', 'lock', 'updated'}
+
+
+def test_chat_rejects_non_string_fields(api):
+    url, _ = api
+    for body in ({'message': 42}, {'message': ['hi']}, {'message': "hi", 'conversation_id': ['x']}):
+        response = requests.post(f"{url}/chat", json=body)
+        assert response.status_code == 400
+        assert 'must be a string' in response.json()['error']
@@ -0,0 +1,55 @@
+import shutil
+
+import pytest
+
+from tools.reservation import ReservationTool
+
+DATE = '2025-05-27'  # r001 has 4 tables at 18:00, 3 at 19:00 and 2 at 20:00 in the sample catalog
+
+
+@pytest.fixture
+def workers(data_file, tmp_path):
+    """Two tools with their own availability engines over one database, like two server processes"""
+    other = tmp_path / 'other'
+    other.mkdir()
+    other_file = str(other / 'restaurant_data.json')
+    shutil.copy(data_file, other_file)
+    db_path = str(tmp_path / 'reservations.db')
+    return ReservationTool(data_file, db_path=db_path), ReservationTool(other_file, db_path=db_path)
+
+
+def book(tool, time, party_size=2):
+    return tool.make_reservation('r001', DATE, time, party_size, 'Ana', '555-0100')
+
+
+def test_second_worker_cannot_oversell_a_slot(workers):
+    first, second = workers
+    assert book(first, '20:00') and book(first, '20:00')
+    assert second.availability.remaining_tables('r001', DATE, '20:00') == 2  # it has not seen them
+    assert book(second, '20:00') is None
+    assert second.availability.remaining_tables('r001', DATE, '20:00') == 2
+    assert len(second.find_reservations(restaurant_id='r001', date=DATE)) == 2
+
+
+def test_group_booking_reports_the_slot_another_worker_filled(workers):
+    first, second = workers
+    assert book(first, '20:00', party_size=8)
+    reservations, unavailable = second.make_reservations([
+        {'restaurant_id': 'r001', 'date': DATE, 'time': '18:00', 'party_size': 2,
+         'customer_name': 'Bo', 'phone': '555-0101'},
+        {'restaurant_id': 'r001', 'date': DATE, 'time': '20:00', 'party_size': 2,
+         'customer_name': 'Bo', 'phone': '555-0101'}])
+    assert (reservations, unavailable) == (None, [1])
+    assert second.find_reservations(phone='555-0101') == []
+    assert second.availability.remaining_tables('r001', DATE, '18:00') == 4
+
+
+def test_move_into_a_slot_another_worker_filled_is_refused(workers):
+    first, second = workers
+    reservation = book(second, '18:00')
+    assert book(first, '20:00', party_size=8)
+    assert second.modify_reservation(reservation['id'], time='20:00') is None
+    assert second.get_reservation(reservation['id'])['time'] == '18:00'
+    assert second.availability.remaining_tables('r001', DATE, '18:00') == 3
+    # Moving within its own slot's room still works
+    assert second.modify_reservation(reservation['id'], party_size=4)['party_size'] == 4
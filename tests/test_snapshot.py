@@ -0,0 +1,47 @@
+import json
+import os
+
+from tools.catalog import RestaurantCatalog
+from tools.snapshot import compile_snapshot, load_snapshot, open_snapshot, snapshot_path_for
+
+
+def source(data_file):
+    with open(data_file) as f:
+        return json.load(f)['restaurants']
+
+
+def test_snapshot_round_trip(data_file):
+    path = compile_snapshot(data_file)
+    assert path == snapshot_path_for(data_file)
+    catalog = open_snapshot(path)
+    assert list(catalog) == source(data_file)
+    assert catalog.by_id['r017']['name'] == 'Seoul Kitchen'
+    assert [r['id'] for r in catalog.query(cuisine='bbq', max_results=3)] == ['r017', 'r015', 'r025']
+
+
+def test_catalog_opens_an_up_to_date_snapshot(data_file):
+    compile_snapshot(data_file)
+    snapshot = RestaurantCatalog(data_file).snapshot()
+    assert snapshot.compact
+    assert len(snapshot.restaurants) == 30
+
+
+def test_stale_snapshot_falls_back_to_the_json(data_file):
+    compile_snapshot(data_file)
+    restaurants = source(data_file)
+    restaurants[0]['name'] = 'The Spice Palace'
+    with open(data_file, 'w') as f:
+        json.dump({'restaurants': restaurants}, f)
+    assert load_snapshot(data_file) is None
+    snapshot = RestaurantCatalog(data_file).snapshot()
+    assert not snapshot.compact
+    assert snapshot.by_id['r001']['name'] == 'The Spice Palace'
+
+
+def test_unreadable_snapshot_falls_back_to_the_json(data_file):
+    path = snapshot_path_for(data_file)
+    with open(path, 'wb') as f:
+        f.write(b'not a snapshot at all')
+    assert load_snapshot(data_file) is None
+    assert RestaurantCatalog(data_file).snapshot().by_id['r001']['name'] == 'The Spice House'
+    assert os.path.exists(path)
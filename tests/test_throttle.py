@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm.throttle import (PRIORITY_BOOKING, PRIORITY_CHAT, AsyncSingleFlight, RateLimiter, SingleFlight,
+                          ThrottledError, TokenBucket)
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return 'reply'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', slow))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['reply'] * 8
+
+
+def test_single_flight_shares_errors_and_forgets_them():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("upstream")
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_async_single_flight_survives_one_cancelled_caller():
+    async def run():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'reply'
+
+        first = asyncio.ensure_future(flight.do('key', slow))
+        second = asyncio.ensure_future(flight.do('key', slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        return calls, await second
+
+    assert asyncio.run(run()) == ([1], 'reply')
+
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(10, 10)
+    bucket.level = 0
+    bucket.refill(bucket.updated + 0.5)
+    assert bucket.level == pytest.approx(5)
+    assert bucket.wait_for(8) == pytest.approx(0.3)
+
+
+def test_rate_limiter_holds_requests_to_the_budget():
+    limiter = RateLimiter(requests_per_minute=120, tokens_per_minute=None, max_wait=5)
+    started = time.monotonic()
+    for _ in range(121):
+        limiter.acquire()
+    # The 121st request waits for a refill at 2 per second
+    assert time.monotonic() - started >= 0.4
+
+
+def test_rate_limiter_gives_up_when_the_wait_exceeds_max_wait():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=None, max_wait=0.1)
+    limiter.acquire()
+    limiter.requests.level = 0
+    with pytest.raises(ThrottledError):
+        limiter.acquire()
+    assert limiter.throttled == 1
+    assert limiter.queued() == 0
+
+
+def test_rate_limiter_rejects_when_the_queue_is_full():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=None, max_queue=0)
+    with pytest.raises(ThrottledError):
+        limiter.acquire()
+
+
+def test_booking_calls_go_ahead_of_chat():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=None, max_wait=5)
+    limiter.requests.level = 0
+    order = []
+
+    def call(priority, name):
+        limiter.acquire(priority=priority)
+        order.append(name)
+
+    chat = threading.Thread(target=call, args=(PRIORITY_CHAT, 'chat'))
+    chat.start()
+    time.sleep(0.02)
+    booking = threading.Thread(target=call, args=(PRIORITY_BOOKING, 'booking'))
+    booking.start()
+    chat.join()
+    booking.join()
+    assert order == ['booking', 'chat']
+
+
+def test_throttle_metrics_are_registered(metrics):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=None, max_queue=0)
+    with pytest.raises(ThrottledError):
+        limiter.acquire()
+    text = metrics.render()
+    assert '# TYPE foodiespot_llm_throttled_total counter' in text
+    assert 'foodiespot_llm_throttled_total{reason="queue_full"} 1' in text
+
+
+def test_limiter_settings_are_read_when_it_is_built(monkeypatch):
+    monkeypatch.setenv('FOODIESPOT_LLM_RPM', '30')
+    monkeypatch.setenv('FOODIESPOT_LLM_QUEUE', '7')
+    limiter = RateLimiter.from_env()
+    assert (limiter.requests.capacity, limiter.max_queue) == (30.0, 7)
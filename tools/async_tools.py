@@ -0,0 +1,47 @@
+import asyncio
+from tools.reservation import ReservationTool
+
+
+class AsyncReservationTool:
+    """Awaitable interface to ReservationTool; store and availability calls run in the thread pool"""
+
+    def __init__(self, tool=None):
+        self.tool = tool or ReservationTool()
+
+    async def prefetch_availability(self):
+        return await asyncio.to_thread(self.tool.prefetch_availability)
+
+    async def check_availability(self, restaurant_id, date, time, party_size):
+        return await asyncio.to_thread(self.tool.check_availability, restaurant_id, date, time, party_size)
+
+    async def check_availability_many(self, requests):
+        return await asyncio.to_thread(self.tool.check_availability_many, requests)
+
+    async def find_available_slots(self, date, time, party_size, max_results=5, restaurant_ids=None):
+        return await asyncio.to_thread(self.tool.find_available_slots, date, time, party_size,
+                                       max_results, restaurant_ids)
+
+    async def make_reservation(self, restaurant_id, date, time, party_size, customer_name, phone,
+                               special_requests=''):
+        return await asyncio.to_thread(self.tool.make_reservation, restaurant_id, date, time, party_size,
+                                       customer_name, phone, special_requests)
+
+    async def make_reservations(self, bookings):
+        return await asyncio.to_thread(self.tool.make_reservations, bookings)
+
+    async def get_reservation(self, reservation_id):
+        return await asyncio.to_thread(self.tool.get_reservation, reservation_id)
+
+    async def find_reservations(self, phone=None, customer_name=None, restaurant_id=None, date=None):
+        return await asyncio.to_thread(self.tool.find_reservations, phone, customer_name, restaurant_id, date)
+
+    async def cancel_reservation(self, reservation_id):
+        return await asyncio.to_thread(self.tool.cancel_reservation, reservation_id)
+
+    async def modify_reservation(self, reservation_id, date=None, time=None, party_size=None,
+                                 special_requests=None):
+        return await asyncio.to_thread(self.tool.modify_reservation, reservation_id, date, time,
+                                       party_size, special_requests)
+
+    async def get_restaurant_info(self, restaurant_id):
+        return await asyncio.to_thread(self.tool.get_restaurant_info, restaurant_id)
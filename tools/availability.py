@@ -0,0 +1,547 @@
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from functools import lru_cache
+from tools.catalog import get_catalog
+from utils.logger import log_message
+
+TABLE_SEATS = 4  # Seats per table when converting a party size to tables
+
+
+def tables_needed(party_size):
+    """Number of tables a party occupies"""
+    return max(1, math.ceil(party_size / TABLE_SEATS))
+
+
+@lru_cache(maxsize=4096)
+def normalize_time(time_value):
+    """Normalize '7:00 PM', '19:00' or '19:00:00' to the 'HH:MM' slot format"""
+    time_value = str(time_value).strip()
+    for fmt in ('%H:%M', '%I:%M %p', '%H:%M:%S', '%I %p'):
+        try:
+            return datetime.strptime(time_value, fmt).strftime('%H:%M')
+        except ValueError:
+            continue
+    return time_value
+
+
+def _minutes(slot_time):
+    hours, minutes = slot_time.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class RestaurantSlots:
+    """Slot arrays for one restaurant.
+
+    For each date, times is a sorted tuple of 'HH:MM' slots and published /
+    booked are parallel arrays of table counts. published comes from the
+    catalog's available_tables, booked from reservations made here, so a
+    catalog reload never forgets tables that have already been taken.
+    """
+
+    def __init__(self, restaurant_id, seating_capacity, rating):
+        self.restaurant_id = restaurant_id
+        self.seating_capacity = seating_capacity
+        self.rating = rating
+        self.dates = {}
+        self.lock = threading.Lock()
+
+    def update_published(self, available_tables, layouts):
+        """Replace published counts, carrying booked counts over.
+
+        layouts caches, per tuple of slot keys as written in the catalog, the
+        normalized sorted times and the order to read counts in; it is shared
+        by every restaurant so identical schedules share one times tuple.
+        Returns True if the dates or times offered changed, not just counts.
+        """
+        with self.lock:
+            dates = {}
+            reshaped = False
+            for date, slots in (available_tables or {}).items():
+                raw = tuple(slots)
+                layout = layouts.get(raw)
+                if layout is None:
+                    normalized = [normalize_time(t) for t in raw]
+                    order = sorted(range(len(raw)), key=normalized.__getitem__)
+                    if len(set(normalized)) == len(normalized):
+                        times = tuple(normalized[i] for i in order)
+                        layout = layouts.setdefault(raw, (times, order))
+                if layout is not None:
+                    times, order = layout
+                    values = list(slots.values())
+                    try:
+                        published = array('H', [values[i] for i in order])
+                    except (TypeError, OverflowError):
+                        published = array('H', [max(0, min(int(values[i]), 65535)) for i in order])
+                else:
+                    # Two keys normalize to the same time; the last one wins
+                    counts = {normalize_time(t): c for t, c in slots.items()}
+                    times = tuple(sorted(counts))
+                    published = array('H', (max(0, min(int(counts[t]), 65535)) for t in times))
+                booked = array('H', [0]) * len(times)
+
+                previous = self.dates.get(date)
+                if previous is None or previous[0] != times:
+                    reshaped = True
+                if previous:
+                    old_times, _, old_booked = previous
+                    for i, slot_time in enumerate(old_times):
+                        j = bisect_left(times, slot_time)
+                        if j < len(times) and times[j] == slot_time:
+                            booked[j] = old_booked[i]
+                dates[date] = (times, published, booked)
+            reshaped = reshaped or len(dates) != len(self.dates)
+            self.dates = dates
+            return reshaped
+
+    def _position(self, date, slot_time):
+        entry = self.dates.get(date)
+        if entry is None:
+            return None, -1
+        times = entry[0]
+        i = bisect_left(times, slot_time)
+        if i < len(times) and times[i] == slot_time:
+            return entry, i
+        return entry, -1
+
+    def remaining(self, date, slot_time):
+        entry, i = self._position(date, slot_time)
+        if i < 0:
+            return 0
+        return max(0, entry[1][i] - entry[2][i])
+
+    def reserve(self, date, slot_time, tables):
+        with self.lock:
+            entry, i = self._position(date, slot_time)
+            if i < 0 or entry[1][i] - entry[2][i] < tables:
+                return False
+            entry[2][i] += tables
+            return True
+
+    def release(self, date, slot_time, tables):
+        with self.lock:
+            entry, i = self._position(date, slot_time)
+            if i < 0:
+                return False
+            entry[2][i] = max(0, entry[2][i] - tables)
+            return True
+
+    def move(self, old_date, old_time, old_tables, new_date, new_time, new_tables):
+        """Swap a booking to another slot, leaving it untouched if the new slot is full"""
+        with self.lock:
+            old_entry, i = self._position(old_date, old_time)
+            new_entry, j = self._position(new_date, new_time)
+            if j < 0:
+                return False
+            freed = old_tables if i >= 0 and old_entry is new_entry and i == j else 0
+            if new_entry[1][j] - new_entry[2][j] + freed < new_tables:
+                return False
+            if i >= 0:
+                old_entry[2][i] = max(0, old_entry[2][i] - old_tables)
+            new_entry[2][j] += new_tables
+            return True
+
+
+class AvailabilityEngine:
+    """Table availability for every restaurant, built from available_tables.
+
+    For a columnar (compact or snapshot) catalog, slots are built lazily the
+    first time a restaurant is touched, so startup does not depend on the
+    catalog size; nearest-slot searches build the rest on first use.
+
+    Table counts from the catalog's change log are applied as they arrive
+    (through its change feed) to the restaurants named only, and a snapshot
+    made by upserts or closures re-seeds just those restaurants.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._restaurants = {}
+        self._layouts = {}
+        self._columnar = None
+        self._version = None
+        self._slot_index = None
+        self._booking_sources = set()
+        self._stale = set()  # ids with new table counts announced before their snapshot was synced
+        self._lock = threading.Lock()
+        catalog.subscribe(self._on_change)
+
+    def _sync(self):
+        snapshot = self.catalog.snapshot()
+        if snapshot.version == self._version:
+            return
+        with self._lock:
+            if snapshot.version == self._version:
+                return
+            if snapshot.changes and snapshot.changes[0] == self._version:
+                self._sync_changes(snapshot)
+                return
+            if snapshot.compact:
+                # Refresh only the restaurants already built (they may hold bookings)
+                columnar = snapshot.restaurants
+                rows = (columnar.availability_entry(row) for row in
+                        (columnar.by_id.row(restaurant_id) for restaurant_id in self._restaurants)
+                        if row is not None)
+            else:
+                columnar = None
+                rows = ((r.get('id'), r.get('seating_capacity', 0), r.get('rating') or 0, r.get('available_tables'))
+                        for r in snapshot.restaurants)
+            restaurants = {}
+            for entry in rows:
+                slots = self._seed(entry)
+                if slots is not None:
+                    restaurants[slots.restaurant_id] = slots
+            self._restaurants = restaurants
+            self._columnar = columnar
+            self._slot_index = None
+            self._stale = set()
+            self._version = snapshot.version
+            log_message("Availability engine synced: %d restaurants%s", len(restaurants),
+                        " (others on demand)" if columnar is not None else "")
+
+    def _sync_changes(self, snapshot):
+        """Re-seed only the restaurants a change snapshot upserted, closed or gave new table counts; call under _lock"""
+        _, changed, slot_ids = snapshot.changes
+        restaurants = dict(self._restaurants)
+        for restaurant_id in changed:
+            entry = self._entry(snapshot, restaurant_id)
+            if entry is None:
+                restaurants.pop(restaurant_id, None)
+            else:
+                restaurants[restaurant_id] = self._seed(entry)
+        self._restaurants = restaurants
+        # Restaurants not built yet get their table counts when first built
+        for restaurant_id in (slot_ids | self._stale) - changed:
+            if restaurant_id in restaurants:
+                entry = self._entry(snapshot, restaurant_id)
+                if entry is not None:
+                    self._seed(entry)
+        self._stale = set()
+        self._columnar = snapshot.restaurants if snapshot.compact else None
+        self._slot_index = None
+        self._version = snapshot.version
+        log_message("Availability engine updated: %d restaurants changed", len(changed | slot_ids))
+
+    def _on_change(self, event):
+        """Catalog change feed: apply new table counts to the restaurants already built"""
+        if event['kind'] != 'slots':
+            return  # snapshots with other changes are picked up by _sync
+        snapshot = self.catalog.snapshot()
+        with self._lock:
+            if snapshot.version != self._version:
+                # Applied when that snapshot is synced
+                self._stale.update(event['ids'])
+                return
+            for restaurant_id in event['ids']:
+                if restaurant_id in self._restaurants:
+                    entry = self._entry(snapshot, restaurant_id)
+                    if entry is not None:
+                        self._seed(entry)
+
+    @staticmethod
+    def _entry(snapshot, restaurant_id):
+        """(id, seating, rating, available_tables) of a restaurant in a snapshot, or None"""
+        if snapshot.compact:
+            row = snapshot.restaurants.by_id.row(restaurant_id)
+            return snapshot.restaurants.availability_entry(row) if row is not None else None
+        r = snapshot.by_id.get(restaurant_id)
+        if r is None:
+            return None
+        return r.get('id'), r.get('seating_capacity', 0), r.get('rating') or 0, r.get('available_tables')
+
+    def _seed(self, entry):
+        """Create or refresh the slots for one (id, seating, rating, available_tables) entry"""
+        restaurant_id, seating_capacity, rating, available_tables = entry
+        if restaurant_id is None:
+            return None
+        slots = self._restaurants.get(restaurant_id)
+        if slots is None:
+            slots = RestaurantSlots(restaurant_id, 0, 0)
+        slots.seating_capacity = seating_capacity
+        slots.rating = rating
+        if slots.update_published(self.catalog.published_tables(restaurant_id, available_tables), self._layouts):
+            self._slot_index = None
+        return slots
+
+    def _lookup(self, restaurant_id):
+        """Slots for a restaurant, building them from a columnar catalog if needed; call under _lock"""
+        slots = self._restaurants.get(restaurant_id)
+        if slots is None and self._columnar is not None:
+            row = self._columnar.by_id.row(restaurant_id)
+            if row is not None:
+                slots = self._seed(self._columnar.availability_entry(row))
+                self._restaurants[restaurant_id] = slots
+        return slots
+
+    def _build_all(self):
+        """Build every restaurant's slots from a columnar catalog; call under _lock"""
+        if self._columnar is None:
+            return
+        ids = self._columnar.ids
+        for row in range(len(self._columnar)):
+            if ids[row] not in self._restaurants:
+                slots = self._seed(self._columnar.availability_entry(row))
+                if slots is not None:
+                    self._restaurants[slots.restaurant_id] = slots
+
+    def load_bookings(self, source_key, bookings):
+        """Count existing bookings as taken, once per source.
+
+        bookings yields (restaurant_id, date, time, party_size) tuples, e.g.
+        the confirmed reservations of a persistent store on startup.
+        """
+        self._sync()
+        with self._lock:
+            if source_key in self._booking_sources:
+                return
+            self._booking_sources.add(source_key)
+            count = 0
+            for restaurant_id, date, time, party_size in bookings:
+                slots = self._lookup(restaurant_id)
+                if slots is not None:
+                    with slots.lock:
+                        entry, i = slots._position(date, normalize_time(time))
+                        if i >= 0:
+                            entry[2][i] += tables_needed(party_size)
+                            count += 1
+            log_message("Availability engine loaded %d existing bookings", count)
+
+    def get_slots(self, restaurant_id):
+        self._sync()
+        slots = self._restaurants.get(restaurant_id)
+        if slots is None and self._columnar is not None:
+            with self._lock:
+                slots = self._lookup(restaurant_id)
+        return slots
+
+    def remaining_tables(self, restaurant_id, date, time):
+        """Tables still free at a slot"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None:
+            return 0
+        return slots.remaining(date, normalize_time(time))
+
+    def capacity(self, restaurant_id, date, time):
+        """Tables the catalog offers at a slot, booked or not"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None:
+            return 0
+        entry, i = slots._position(date, normalize_time(time))
+        return entry[1][i] if i >= 0 else 0
+
+    def is_available(self, restaurant_id, date, time, party_size):
+        """Check whether a party fits at a slot"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None or party_size > slots.seating_capacity:
+            return False
+        return slots.remaining(date, normalize_time(time)) >= tables_needed(party_size)
+
+    def reserve(self, restaurant_id, date, time, party_size):
+        """Atomically take the tables for a party; returns False if they are gone"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None or party_size > slots.seating_capacity:
+            return False
+        return slots.reserve(date, normalize_time(time), tables_needed(party_size))
+
+    def release(self, restaurant_id, date, time, party_size):
+        """Give a party's tables back"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None:
+            return False
+        return slots.release(date, normalize_time(time), tables_needed(party_size))
+
+    def move(self, restaurant_id, old_date, old_time, old_party_size, new_date, new_time, new_party_size):
+        """Atomically move a party to another slot of the same restaurant"""
+        slots = self.get_slots(restaurant_id)
+        if slots is None or new_party_size > slots.seating_capacity:
+            return False
+        return slots.move(old_date, normalize_time(old_time), tables_needed(old_party_size),
+                          new_date, normalize_time(new_time), tables_needed(new_party_size))
+
+    # Batches: one catalog sync and slot lookup per restaurant for the whole batch
+
+    def _slots_many(self, restaurant_ids):
+        """restaurant_id -> slots (None if unknown) for several restaurants"""
+        self._sync()
+        found = {restaurant_id: self._restaurants.get(restaurant_id) for restaurant_id in restaurant_ids}
+        missing = [restaurant_id for restaurant_id, slots in found.items() if slots is None]
+        if missing and self._columnar is not None:
+            with self._lock:
+                for restaurant_id in missing:
+                    found[restaurant_id] = self._lookup(restaurant_id)
+        return found
+
+    def check_many(self, requests):
+        """(available, remaining_tables) for each (restaurant_id, date, time, party_size).
+
+        Each request is checked on its own; use reserve_many to know whether
+        they all fit together.
+        """
+        slots_by_id = self._slots_many({request[0] for request in requests})
+        results = []
+        for restaurant_id, date, time, party_size in requests:
+            slots = slots_by_id[restaurant_id]
+            if slots is None:
+                results.append((False, 0))
+                continue
+            remaining = slots.remaining(date, normalize_time(time))
+            fits = party_size <= slots.seating_capacity and remaining >= tables_needed(party_size)
+            results.append((fits, remaining))
+        return results
+
+    def reserve_many(self, requests):
+        """Take the tables for every (restaurant_id, date, time, party_size), or for none.
+
+        Returns the indexes of the requests that do not fit (an empty list
+        once everything is reserved). Requests for the same slot count
+        together. Restaurant locks are taken in id order, so concurrent
+        batches cannot deadlock.
+        """
+        slots_by_id = self._slots_many({request[0] for request in requests})
+        keys, wanted, failed = [], {}, []
+        for index, (restaurant_id, date, time, party_size) in enumerate(requests):
+            slots = slots_by_id[restaurant_id]
+            if slots is None or party_size > slots.seating_capacity:
+                failed.append(index)
+                keys.append(None)
+                continue
+            key = (restaurant_id, date, normalize_time(time))
+            keys.append(key)
+            wanted[key] = wanted.get(key, 0) + tables_needed(party_size)
+        if failed:
+            return failed
+
+        locks = [slots_by_id[restaurant_id].lock for restaurant_id in sorted(slots_by_id)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            positions = {}
+            for key, tables in wanted.items():
+                entry, i = slots_by_id[key[0]]._position(key[1], key[2])
+                if i < 0 or entry[1][i] - entry[2][i] < tables:
+                    failed.extend(index for index, k in enumerate(keys) if k == key)
+                positions[key] = (entry, i)
+            if failed:
+                return sorted(failed)
+            for key, tables in wanted.items():
+                entry, i = positions[key]
+                entry[2][i] += tables
+            return []
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def release_many(self, requests):
+        """Give back the tables of several (restaurant_id, date, time, party_size) bookings"""
+        slots_by_id = self._slots_many({request[0] for request in requests})
+        for restaurant_id, date, time, party_size in requests:
+            slots = slots_by_id[restaurant_id]
+            if slots is not None:
+                slots.release(date, normalize_time(time), tables_needed(party_size))
+
+    def _build_slot_index(self, restaurants):
+        """date -> time -> restaurants offering that slot, best rated first"""
+        index = {}
+        ranked = sorted(restaurants.values(), key=lambda slots: (-slots.rating, slots.restaurant_id))
+        for slots in ranked:
+            for date, (times, _, _) in slots.dates.items():
+                by_time = index.get(date)
+                if by_time is None:
+                    by_time = index[date] = {}
+                for slot_time in times:
+                    candidates = by_time.get(slot_time)
+                    if candidates is None:
+                        by_time[slot_time] = [slots]
+                    else:
+                        candidates.append(slots)
+        return index
+
+    def _get_slot_index(self):
+        self._sync()
+        slot_index = self._slot_index
+        if slot_index is None:
+            with self._lock:
+                if self._slot_index is None:
+                    self._build_all()
+                    self._slot_index = self._build_slot_index(self._restaurants)
+                slot_index = self._slot_index
+        return slot_index
+
+    def _slot_index_for(self, date):
+        return self._get_slot_index().get(date, {})
+
+    def prefetch(self):
+        """Build every restaurant's slots and the slot index ahead of a nearest-slot search"""
+        self._get_slot_index()
+
+    def find_nearest_slots(self, date, time, party_size, max_results=5, restaurant_ids=None):
+        """Free slots closest to the requested time across restaurants.
+
+        Slot times are visited outward from the requested time and each
+        time's candidates in rating order, so the search stops as soon as
+        max_results slots are found instead of scanning every restaurant.
+        """
+        target = _minutes(normalize_time(time))
+        tables = tables_needed(party_size)
+        if restaurant_ids is not None:
+            self._sync()
+            by_time = {}
+            for restaurant_id in restaurant_ids:
+                slots = self.get_slots(restaurant_id)
+                if slots is not None and date in slots.dates:
+                    for slot_time in slots.dates[date][0]:
+                        by_time.setdefault(slot_time, []).append(slots)
+            for candidates in by_time.values():
+                candidates.sort(key=lambda slots: (-slots.rating, slots.restaurant_id))
+        else:
+            by_time = self._slot_index_for(date)
+
+        groups = {}
+        for slot_time in by_time:
+            groups.setdefault(abs(_minutes(slot_time) - target), []).append(slot_time)
+
+        results = []
+        for distance in sorted(groups):
+            need = max_results - len(results)
+            if need <= 0:
+                break
+            found = []
+            for slot_time in groups[distance]:
+                taken = 0
+                for slots in by_time[slot_time]:
+                    if party_size > slots.seating_capacity:
+                        continue
+                    remaining = slots.remaining(date, slot_time)
+                    if remaining >= tables:
+                        found.append((-slots.rating, slots.restaurant_id, slot_time, remaining))
+                        taken += 1
+                        if taken >= need:
+                            break
+            found.sort()
+            results.extend(found[:need])
+
+        return [
+            {'restaurant_id': restaurant_id, 'date': date, 'time': slot_time,
+             'available_tables': remaining}
+            for _, restaurant_id, slot_time, remaining in results
+        ]
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_availability_engine(data_file="data/restaurant_data.json"):
+    """Get the shared availability engine for a data file"""
+    key = os.path.abspath(data_file)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = AvailabilityEngine(get_catalog(data_file))
+                _engines[key] = engine
+    return engine
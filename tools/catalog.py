@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+import time
+from tools.columnar import ColumnarCatalog, load_columnar
+from tools.ingest import (MAX_LOG_ENTRIES, ChangeError, ChangeLog, apply_restaurant_changes, changelog_path_for,
+                          fold_slot_changes, merge_tables, normalize_change)
+from tools.snapshot import compile_snapshot, load_snapshot, snapshot_path_for
+from utils import tracing
+from utils.logger import log_message, log_error
+
+
+class CatalogSnapshot:
+    """Immutable view of the restaurant catalog at one point in time"""
+
+    def __init__(self, restaurants, version, signature=None, changes=None):
+        self.restaurants = restaurants
+        self.version = version
+        self.signature = signature
+        # (previous version, ids of restaurants upserted or closed, ids with new table counts)
+        # for a snapshot made by a change
+        self.changes = changes
+        self.compact = isinstance(restaurants, ColumnarCatalog)
+        if self.compact:
+            self.by_id = restaurants.by_id
+        else:
+            self.by_id = {r['id']: r for r in restaurants if 'id' in r}
+        self._derived = {}
+        self._derived_lock = threading.RLock()  # builders may use other derived structures
+
+    def derived(self, key, builder):
+        """Get a structure computed from this snapshot, building it once on first use"""
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = builder(self)
+                    self._derived[key] = value
+        return value
+
+
+class RestaurantCatalog:
+    """Process-wide restaurant catalog shared by all tools.
+
+    The JSON file is parsed once and re-parsed only when its mtime or size
+    changes (or when refresh() is called). Each load builds a brand new
+    CatalogSnapshot and swaps it in with a single assignment, so readers
+    holding an older snapshot never see a half-loaded list. Snapshots must
+    be treated as read-only.
+
+    With compact=True the restaurants are held in a ColumnarCatalog, which
+    reads like the list of dicts but takes a fraction of the memory. When a
+    compiled snapshot of the data file exists (see tools.snapshot) and is
+    up to date, it is mmapped instead of parsing the JSON.
+
+    Changes from the change log (see tools.ingest) are applied on top:
+    table counts as per-restaurant overrides (published_tables), upserts
+    and closures as a new snapshot. subscribe() registers a callback for
+    the change feed, called with {'kind', 'ids', 'version'}: kind 'slots'
+    or 'restaurants' with the ids of the restaurants changed, or 'reload'
+    (ids None) when the whole catalog was reloaded.
+    """
+
+    def __init__(self, data_file, check_interval=1.0, compact=False, snapshot_file=None, changelog_file=None):
+        self.data_file = data_file
+        self.check_interval = check_interval
+        self.compact = compact
+        self.snapshot_file = snapshot_file or snapshot_path_for(data_file)
+        self.changelog = ChangeLog(changelog_file or changelog_path_for(data_file))
+        self._snapshot = CatalogSnapshot([], 0)
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._slot_updates = {}  # restaurant id -> {date: {time: tables}} from the change log
+        self._log_offset = 0
+        self._log_entries = 0
+        self._subscribers = []
+        self._events = []
+        self._compacting = False
+
+    def _file_signature(self):
+        signature = []
+        for path in (self.data_file, self.snapshot_file):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        if signature == [None, None]:
+            raise FileNotFoundError(self.data_file)
+        return tuple(signature)
+
+    def _load(self, signature):
+        with tracing.span('catalog_load', compact=self.compact) as span:
+            restaurants = load_snapshot(self.data_file, self.snapshot_file) if signature[1] else None
+            span.set(snapshot=restaurants is not None)
+            if restaurants is None and self.compact:
+                restaurants = load_columnar(self.data_file)
+            elif restaurants is None:
+                with open(self.data_file, 'r') as f:
+                    restaurants = json.load(f).get('restaurants', [])
+            # Replay the whole change log over the file
+            entries, self._log_offset = self.changelog.read(0)
+            self._log_entries = len(entries)
+            slot_updates = {}
+            changed = self._fold(entries, slot_updates)
+            if changed:
+                restaurants = self._with_changes(restaurants, changed)
+            span.set(changes=len(entries))
+        self._slot_updates = slot_updates
+        self._snapshot = CatalogSnapshot(restaurants, self._snapshot.version + 1, signature)
+        self._events.append({'kind': 'reload', 'ids': None, 'version': self._snapshot.version})
+        log_message("Catalog loaded: %d restaurants (v%d, %d logged changes)", len(restaurants),
+                    self._snapshot.version, len(entries))
+
+    def _fold(self, entries, slot_updates):
+        """Record slot changes as overrides in slot_updates; return the upsert and close entries, in order"""
+        changed = []
+        for entry in entries:
+            try:
+                entry = normalize_change(entry)
+            except ChangeError as e:
+                log_error("Skipping malformed catalog change: %s", e)
+                continue
+            if entry['op'] == 'slots':
+                fold_slot_changes(slot_updates, entry)
+            else:
+                # A whole new record (or none) replaces any table counts set before it
+                slot_updates.pop(entry['id'], None)
+                changed.append(entry)
+        return changed
+
+    @staticmethod
+    def _with_changes(restaurants, entries):
+        updated = apply_restaurant_changes(restaurants, entries)
+        if isinstance(restaurants, ColumnarCatalog):
+            return ColumnarCatalog.from_restaurants(updated)
+        return updated
+
+    def _tail(self):
+        """Apply changes appended to the log since it was last read; call under _lock"""
+        entries, offset = self.changelog.read(self._log_offset)
+        if not entries:
+            return 0
+        self._log_offset = offset
+        self._log_entries += len(entries)
+        slot_ids = {entry.get('id') for entry in entries if isinstance(entry, dict) and entry.get('op') == 'slots'}
+        changed = self._fold(entries, self._slot_updates)
+        if changed:
+            previous = self._snapshot
+            restaurants = self._with_changes(previous.restaurants, changed)
+            ids = frozenset(entry['id'] for entry in changed)
+            slot_ids -= ids
+            self._snapshot = CatalogSnapshot(restaurants, previous.version + 1, previous.signature,
+                                             changes=(previous.version, ids, frozenset(slot_ids)))
+            self._events.append({'kind': 'restaurants', 'ids': ids, 'version': self._snapshot.version})
+        if slot_ids:
+            self._events.append({'kind': 'slots', 'ids': frozenset(slot_ids), 'version': self._snapshot.version})
+        return len(entries)
+
+    def _check(self):
+        """Reload if the data file changed, else pick up new log entries; call under _lock"""
+        signature = self._file_signature()
+        log = self.changelog.signature()
+        if signature != self._snapshot.signature or (log is None and self._log_offset) or (
+                log is not None and log[1] < self._log_offset):
+            # New data file, or the log was compacted into it
+            self._load(signature)
+        elif log is not None and log[1] > self._log_offset:
+            self._tail()
+
+    def _dispatch(self):
+        """Send queued change events to subscribers (outside _lock)"""
+        if not self._events:
+            return
+        with self._lock:
+            events, self._events = self._events, []
+        for event in events:
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception as e:
+                    log_error("Catalog change subscriber failed: %s", e)
+
+    def subscribe(self, callback):
+        """Call callback(event) for every change to the catalog"""
+        self._subscribers.append(callback)
+
+    def snapshot(self):
+        """Return the current snapshot, reloading first if the file changed"""
+        now = time.monotonic()
+        if self._snapshot.version and now - self._last_check < self.check_interval:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot.version and now - self._last_check < self.check_interval:
+                return self._snapshot
+            try:
+                self._check()
+            except Exception as e:
+                log_error("Failed to load restaurants: %s", e)
+            self._last_check = now
+        self._dispatch()
+        return self._snapshot
+
+    def refresh(self):
+        """Force a reload of the data file"""
+        with self._lock:
+            try:
+                self._load(self._file_signature())
+            except Exception as e:
+                log_error("Failed to load restaurants: %s", e)
+            self._last_check = time.monotonic()
+        self._dispatch()
+        return self._snapshot
+
+    def apply_changes(self, changes):
+        """Log changes (see tools.ingest) and apply them; returns how many were applied.
+
+        Raises ChangeError, before anything is logged, if any change is malformed.
+        """
+        entries = []
+        for i, change in enumerate(changes):
+            try:
+                entries.append(normalize_change(change))
+            except ChangeError as e:
+                raise ChangeError(f"changes[{i}]: {str(e)}")
+        if not entries:
+            return 0
+        self.snapshot()
+        with self._lock:
+            self.changelog.append(entries)
+            with tracing.span('catalog_changes', changes=len(entries)):
+                self._tail()
+            compact = self._log_entries >= MAX_LOG_ENTRIES and not self._compacting
+            if compact:
+                self._compacting = True
+        self._dispatch()
+        if compact:
+            threading.Thread(target=self.compact_changes, name="catalog-compaction", daemon=True).start()
+        return len(entries)
+
+    def compact_changes(self):
+        """Fold the change log into the data file (and its binary snapshot), then empty the log"""
+        try:
+            with self._lock:
+                self._check()
+                snapshot = self._snapshot
+                slot_updates = dict(self._slot_updates)
+                offset, folded = self._log_offset, self._log_entries
+            # Serialize outside the lock; changes logged meanwhile stay in the log
+            restaurants = [self._with_tables(r, slot_updates) for r in snapshot.restaurants]
+            temp_path = f"{self.data_file}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({'restaurants': restaurants}, f, indent=2)
+            with self._lock:
+                if self._snapshot.signature != snapshot.signature or self._log_offset < offset:
+                    # The data file was replaced or the log compacted while we wrote
+                    os.remove(temp_path)
+                    log_message("Catalog change log compaction skipped: catalog reloaded meanwhile")
+                    return
+                os.replace(temp_path, self.data_file)
+                if os.path.exists(self.snapshot_file):
+                    compile_snapshot(self.data_file, self.snapshot_file)
+                self.changelog.truncate(offset)
+                self._load(self._file_signature())
+                self._last_check = time.monotonic()
+            log_message("Catalog change log compacted: %d changes folded into %s", folded, self.data_file)
+        except Exception as e:
+            log_error("Catalog change log compaction failed: %s", e)
+        finally:
+            self._compacting = False
+            self._dispatch()
+
+    def published_tables(self, restaurant_id, available_tables):
+        """A restaurant's available_tables with the table counts from the change log applied"""
+        return merge_tables(available_tables, self._slot_updates.get(restaurant_id))
+
+    def _with_tables(self, restaurant, slot_updates=None):
+        if slot_updates is None:
+            slot_updates = self._slot_updates
+        updates = slot_updates.get(restaurant.get('id'))
+        if not updates:
+            return restaurant
+        return dict(restaurant, available_tables=merge_tables(restaurant.get('available_tables'), updates))
+
+    def get_restaurants(self):
+        """Get all restaurants from the current snapshot"""
+        return self.snapshot().restaurants
+
+    def get_restaurant(self, restaurant_id):
+        """Get a single restaurant by id, with current table counts"""
+        restaurant = self.snapshot().by_id.get(restaurant_id)
+        return self._with_tables(restaurant) if restaurant is not None else None
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(data_file="data/restaurant_data.json", compact=None):
+    """Get the shared catalog for a data file.
+
+    compact defaults to the FOODIESPOT_COMPACT_CATALOG environment variable;
+    the first caller for a file decides its representation.
+    """
+    key = os.path.abspath(data_file)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                if compact is None:
+                    compact = os.getenv('FOODIESPOT_COMPACT_CATALOG', '').lower() in ('1', 'true', 'yes')
+                catalog = RestaurantCatalog(data_file, compact=compact)
+                _catalogs[key] = catalog
+    return catalog
@@ -0,0 +1,583 @@
+"""Compact, column-oriented restaurant catalog.
+
+A list of nested restaurant dicts costs several kilobytes per restaurant,
+mostly in the per-date available_tables dicts. ColumnarCatalog keeps the
+same data in flat arrays instead:
+
+- ids, names, phones and emails packed into one UTF-8 blob per column
+- location, ambience, cuisine and features as interned integer codes
+  (cuisine and features as offset/code arrays, since they are lists)
+- seating_capacity, rating and coordinates as typed arrays
+- available_tables as one dense int16 array of rows x dates x times,
+  with -1 for slots the restaurant does not publish
+
+Restaurants are materialized as ordinary dicts only when read, so the
+catalog still behaves as a read-only sequence of restaurant dicts. It also
+answers the RestaurantIndex queries (lookup, query, values_in_text,
+top_rated, by_name), vectorized with NumPy when it is installed and with a
+rating-ordered scan otherwise.
+"""
+import json
+import math
+import re
+import threading
+from array import array
+from tools.geo import coordinates_of
+from tools.index import INDEXED_FIELDS
+
+_numpy_module = False
+
+
+def _numpy():
+    """NumPy if installed, else None; imported on first query, not at startup"""
+    global _numpy_module
+    if _numpy_module is False:
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:  # optional; queries fall back to a pure-Python scan
+            _numpy_module = None
+    return _numpy_module
+
+COLUMN_KEYS = ('id', 'name', 'location', 'coordinates', 'cuisine', 'seating_capacity', 'available_tables',
+               'ambience', 'rating', 'features', 'contact')
+MULTI_VALUED = ('cuisine', 'features')
+STRING_COLUMNS = ('ids', 'names', 'phones', 'emails')
+ARRAY_COLUMNS = ('location', 'ambience', 'cuisine_ends', 'cuisine_codes', 'features_ends', 'features_codes',
+                 'seating', 'rating', 'lat', 'lng', 'tables', 'order', 'id_order', 'name_order')
+NO_TABLES = -1
+MAX_TABLES = 32767  # table counts are stored as signed 16-bit ints
+
+
+class PackedStrings:
+    """Read-only sequence of strings stored as one UTF-8 blob plus end offsets"""
+
+    def __init__(self, blob, ends):
+        self.blob = blob
+        self.ends = ends
+
+    @classmethod
+    def build(cls, strings):
+        blob = bytearray()
+        ends = array('Q')
+        for s in strings:
+            blob += s.encode('utf-8')
+            ends.append(len(blob))
+        return cls(bytes(blob), ends)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __getitem__(self, i):
+        start = self.ends[i - 1] if i else 0
+        return str(self.blob[start:self.ends[i]], 'utf-8')
+
+
+class SortedLookup:
+    """Mapping-like lookup of rows through a permutation sorted by key"""
+
+    def __init__(self, catalog, keys, order, normalize=None):
+        self.catalog = catalog
+        self.keys = keys
+        self.order = order
+        self.normalize = normalize
+
+    def row(self, key):
+        if self.normalize:
+            key = self.normalize(key)
+        lo, hi = 0, len(self.order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self.keys[self.order[mid]]
+            if self.normalize:
+                value = self.normalize(value)
+            if value < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.order):
+            row = self.order[lo]
+            value = self.keys[row]
+            if (self.normalize(value) if self.normalize else value) == key:
+                return row
+        return None
+
+    def get(self, key, default=None):
+        row = self.row(key)
+        return default if row is None else self.catalog[row]
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def __getitem__(self, key):
+        row = self.row(key)
+        if row is None:
+            raise KeyError(key)
+        return self.catalog[row]
+
+
+def _normalize_name(name):
+    return name.strip().lower()
+
+
+class ColumnarBuilder:
+    """Accumulates restaurant dicts into columns; build() returns a ColumnarCatalog"""
+
+    def __init__(self):
+        self.ids, self.names, self.phones, self.emails = [], [], [], []
+        self.values = [None]
+        self._codes = {}
+        self.location = array('I')
+        self.ambience = array('I')
+        self.multi = {field: (array('Q', [0]), array('I')) for field in MULTI_VALUED}
+        self.seating = array('i')
+        self.rating = array('d')
+        self.lat = array('d')
+        self.lng = array('d')
+        self.extras = {}
+        # Published tables as sparse (row, date, time, tables) until the full date/time range is known
+        self._dates, self._times = {}, {}
+        self._slot_rows, self._slot_dates, self._slot_times = array('I'), array('I'), array('I')
+        self._slot_tables = array('h')
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def add(self, restaurant):
+        row = len(self.ids)
+        extras = {key: value for key, value in restaurant.items() if key not in COLUMN_KEYS}
+
+        self.ids.append(str(restaurant.get('id', '')))
+        self.names.append(str(restaurant.get('name', '')))
+        for field in ('location', 'ambience'):
+            value = restaurant.get(field)
+            if value is None or isinstance(value, str):
+                getattr(self, field).append(self._code(value) if value is not None else 0)
+            else:
+                getattr(self, field).append(0)
+                extras[field] = value
+        for field in MULTI_VALUED:
+            ends, codes = self.multi[field]
+            value = restaurant.get(field)
+            if isinstance(value, list) and all(isinstance(v, str) for v in value):
+                codes.extend(self._code(v) for v in value)
+            elif value is not None:
+                extras[field] = value
+            ends.append(len(codes))
+
+        seating = restaurant.get('seating_capacity')
+        self.seating.append(seating if isinstance(seating, int) and seating >= 0 else -1)
+        if seating is not None and self.seating[-1] < 0:
+            extras['seating_capacity'] = seating
+        rating = restaurant.get('rating')
+        self.rating.append(float(rating) if isinstance(rating, (int, float)) else math.nan)
+        if rating is not None and not isinstance(rating, float):
+            # Keep ints (and anything odd) exactly as written
+            extras['rating'] = rating
+
+        coordinates = restaurant.get('coordinates')
+        if isinstance(coordinates, dict) and set(coordinates) == {'lat', 'lng'} \
+                and all(isinstance(v, float) for v in coordinates.values()):
+            self.lat.append(coordinates['lat'])
+            self.lng.append(coordinates['lng'])
+        else:
+            self.lat.append(math.nan)
+            self.lng.append(math.nan)
+            if coordinates is not None:
+                extras['coordinates'] = coordinates
+
+        contact = restaurant.get('contact')
+        if isinstance(contact, dict) and set(contact) <= {'phone', 'email'} \
+                and all(isinstance(v, str) for v in contact.values()):
+            self.phones.append(contact.get('phone', ''))
+            self.emails.append(contact.get('email', ''))
+        else:
+            self.phones.append('')
+            self.emails.append('')
+            if contact is not None:
+                extras['contact'] = contact
+
+        time_codes = self._times
+        for date, times in (restaurant.get('available_tables') or {}).items():
+            count = len(times)
+            date_code = self._dates.setdefault(date, len(self._dates))
+            self._slot_rows.extend(array('I', [row]) * count)
+            self._slot_dates.extend(array('I', [date_code]) * count)
+            self._slot_times.extend([time_codes[t] if t in time_codes else time_codes.setdefault(t, len(time_codes))
+                                     for t in times])
+            mark = len(self._slot_tables)
+            try:
+                self._slot_tables.extend(times.values())
+            except (TypeError, OverflowError):
+                del self._slot_tables[mark:]
+                self._slot_tables.extend(max(0, min(int(t), MAX_TABLES)) for t in times.values())
+
+        if extras:
+            self.extras[row] = extras
+
+    def build(self):
+        n = len(self.ids)
+        dates = sorted(self._dates)
+        times = sorted(self._times)
+        date_pos = {code: dates.index(date) for date, code in self._dates.items()}
+        time_pos = {code: times.index(time) for time, code in self._times.items()}
+        width = len(dates) * len(times)
+        tables = array('h', [NO_TABLES]) * (n * width)
+        for row, d, t, count in zip(self._slot_rows, self._slot_dates, self._slot_times, self._slot_tables):
+            tables[row * width + date_pos[d] * len(times) + time_pos[t]] = count
+
+        ratings = self.rating
+        order = array('I', sorted(range(n), key=lambda row: (-(0 if math.isnan(ratings[row]) else ratings[row]), row)))
+        id_order = array('I', sorted(range(n), key=self.ids.__getitem__))
+        name_order = array('I', sorted(range(n), key=lambda row: _normalize_name(self.names[row])))
+
+        columns = {
+            'ids': PackedStrings.build(self.ids),
+            'names': PackedStrings.build(self.names),
+            'phones': PackedStrings.build(self.phones),
+            'emails': PackedStrings.build(self.emails),
+            'location': self.location,
+            'ambience': self.ambience,
+            'cuisine_ends': self.multi['cuisine'][0],
+            'cuisine_codes': self.multi['cuisine'][1],
+            'features_ends': self.multi['features'][0],
+            'features_codes': self.multi['features'][1],
+            'seating': self.seating,
+            'rating': ratings,
+            'lat': self.lat,
+            'lng': self.lng,
+            'tables': tables,
+            'order': order,
+            'id_order': id_order,
+            'name_order': name_order,
+        }
+        return ColumnarCatalog(columns, self.values, dates, times, self.extras)
+
+
+class ColumnarCatalog:
+    """Read-only restaurant catalog stored as columns (see module docstring)"""
+
+    def __init__(self, columns, values, dates, times, extras=None, vocab=None, max_cached_terms=1024):
+        self.columns = columns
+        for name, column in columns.items():
+            setattr(self, name, column)
+        self.values = values
+        self.dates = dates
+        self.times = times
+        self.extras = extras or {}
+        self.size = len(self.ids)
+        self.by_id = SortedLookup(self, self.ids, self.id_order)
+        self.by_name = SortedLookup(self, self.names, self.name_order, _normalize_name)
+        self.vocab = vocab or {field: self._field_vocab(field) for field in INDEXED_FIELDS}
+        self.max_cached_terms = max_cached_terms
+        self._resolved = {}
+        self._views = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_restaurants(cls, restaurants):
+        builder = ColumnarBuilder()
+        for restaurant in restaurants:
+            builder.add(restaurant)
+        return builder.build()
+
+    def _field_codes(self, field):
+        return getattr(self, f'{field}_codes' if field in MULTI_VALUED else field)
+
+    def _field_vocab(self, field):
+        """code -> lowercased value for every value used in a field"""
+        return {code: self.values[code].strip().lower() for code in set(self._field_codes(field)) if code}
+
+    # Sequence of restaurant dicts
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for row in range(self.size):
+            yield self.record(row)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.record(row) for row in range(*index.indices(self.size))]
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("restaurant index out of range")
+        return self.record(index)
+
+    def _multi(self, field, row):
+        ends = getattr(self, f'{field}_ends')
+        codes = getattr(self, f'{field}_codes')
+        return codes[ends[row]:ends[row + 1]]
+
+    def available_tables(self, row):
+        """Published tables for a row as {date: {time: tables}}"""
+        result = {}
+        n_times = len(self.times)
+        base = row * len(self.dates) * n_times
+        for d, date in enumerate(self.dates):
+            offset = base + d * n_times
+            slots = {self.times[t]: count for t, count in enumerate(self.tables[offset:offset + n_times])
+                     if count != NO_TABLES}
+            if slots:
+                result[date] = slots
+        return result
+
+    def availability_entry(self, row):
+        """(id, seating_capacity, rating, available_tables) of a row without building the full record"""
+        if row in self.extras:
+            restaurant = self.record(row)
+            return (restaurant.get('id'), restaurant.get('seating_capacity', 0), restaurant.get('rating') or 0,
+                    restaurant.get('available_tables'))
+        rating = self.rating[row]
+        return (self.ids[row] or None, max(0, self.seating[row]), 0 if math.isnan(rating) else rating,
+                self.available_tables(row))
+
+    def iter_availability(self):
+        for row in range(self.size):
+            yield self.availability_entry(row)
+
+    def record(self, row):
+        """Materialize one restaurant as a dict in the JSON schema"""
+        restaurant = {}
+        if self.ids[row]:
+            restaurant['id'] = self.ids[row]
+        if self.names[row]:
+            restaurant['name'] = self.names[row]
+        if self.location[row]:
+            restaurant['location'] = self.values[self.location[row]]
+        if not math.isnan(self.lat[row]):
+            restaurant['coordinates'] = {'lat': self.lat[row], 'lng': self.lng[row]}
+        if self.cuisine_ends[row] != self.cuisine_ends[row + 1]:
+            restaurant['cuisine'] = [self.values[c] for c in self._multi('cuisine', row)]
+        if self.seating[row] >= 0:
+            restaurant['seating_capacity'] = self.seating[row]
+        restaurant['available_tables'] = self.available_tables(row)
+        if self.ambience[row]:
+            restaurant['ambience'] = self.values[self.ambience[row]]
+        if not math.isnan(self.rating[row]):
+            restaurant['rating'] = self.rating[row]
+        if self.features_ends[row] != self.features_ends[row + 1]:
+            restaurant['features'] = [self.values[c] for c in self._multi('features', row)]
+        if self.phones[row] or self.emails[row]:
+            restaurant['contact'] = {'phone': self.phones[row], 'email': self.emails[row]}
+        extras = self.extras.get(row)
+        if extras:
+            restaurant.update(extras)
+        return restaurant
+
+    # RestaurantIndex-compatible queries
+
+    def resolve(self, field, term):
+        """Codes of every value of a field containing term"""
+        term = term.strip().lower()
+        key = (field, term)
+        codes = self._resolved.get(key)
+        if codes is None:
+            codes = frozenset(code for code, value in self.vocab[field].items() if term in value)
+            with self._lock:
+                if len(self._resolved) >= self.max_cached_terms:
+                    self._resolved.clear()
+                self._resolved[key] = codes
+        return codes
+
+    def values_in_text(self, field, text):
+        """Values of a field mentioned as whole words in text, longest first"""
+        text = f" {' '.join(re.findall(r'[a-z0-9-]+', text.lower()))} "
+        found = {value for value in self.vocab[field].values() if f" {value} " in text}
+        return sorted(found, key=len, reverse=True)
+
+    def lookup(self, field, term, max_results=5):
+        """Top-rated restaurants whose field matches term"""
+        return self._query([(field, self.resolve(field, term))], None, max_results)
+
+    def query(self, cuisine=None, location=None, ambience=None, features=None,
+              min_rating=None, max_results=5):
+        """Top-rated restaurants matching every given filter"""
+        filters = []
+        for field, term in (('cuisine', cuisine), ('location', location), ('ambience', ambience)):
+            if term:
+                filters.append((field, self.resolve(field, term)))
+        if isinstance(features, str):
+            features = [features]
+        for feature in features or []:
+            filters.append(('features', self.resolve('features', feature)))
+        return self._query(filters, min_rating, max_results)
+
+    def top_rated(self, max_results=5):
+        """Top-rated restaurants overall"""
+        return [self.record(row) for row in self.order[:max_results]]
+
+    def _query(self, filters, min_rating, max_results):
+        if any(not codes for _, codes in filters):
+            return []
+        if not filters and min_rating is None:
+            return self.top_rated(max_results)
+        if (len(filters) > 1 or min_rating is not None) and _numpy() is not None:
+            rows = self._query_numpy(filters, min_rating, max_results)
+        else:
+            rows = self._query_scan(filters, min_rating, max_results)
+        return [self.record(row) for row in rows]
+
+    def _check(self, field, codes):
+        """Predicate telling whether a row has one of codes in field"""
+        if field in MULTI_VALUED:
+            ends, field_codes = getattr(self, f'{field}_ends'), getattr(self, f'{field}_codes')
+            return lambda row: any(code in codes for code in field_codes[ends[row]:ends[row + 1]])
+        column = self._field_codes(field)
+        return lambda row: column[row] in codes
+
+    def _query_scan(self, filters, min_rating, max_results):
+        """Walk rows in rating order, stopping at max_results matches (fast for a single loose filter)"""
+        checks = [self._check(field, codes) for field, codes in filters]
+
+        rows = []
+        for row in self.order:
+            if min_rating is not None and not self.rating[row] >= min_rating:
+                break
+            if all(check(row) for check in checks):
+                rows.append(row)
+                if len(rows) >= max_results:
+                    break
+        return rows
+
+    # Positions (rows) for tools.geo, tools.search and tools.retrieval
+
+    def iter_coordinates(self):
+        """(row, lat, lng) for every restaurant with valid coordinates"""
+        for row in range(self.size):
+            lat = self.lat[row]
+            if not math.isnan(lat):
+                yield row, lat, self.lng[row]
+            elif row in self.extras:
+                point = coordinates_of(self.extras[row].get('coordinates'))
+                if point is not None:
+                    yield row, point[0], point[1]
+
+    def iter_names(self):
+        """(row, name) for every restaurant"""
+        for row in range(self.size):
+            yield row, self.names[row]
+
+    def iter_restaurants(self):
+        """(row, restaurant) for every restaurant, materialized one at a time"""
+        for row in range(self.size):
+            yield row, self.record(row)
+
+    def field_values(self, field):
+        """Every (lowercased) value of a field"""
+        return set(self.vocab[field].values())
+
+    def matcher(self, field, term):
+        """Predicate telling whether a row matches term in field"""
+        return self._check(field, self.resolve(field, term))
+
+    def rating_at(self, row):
+        rating = self.rating[row]
+        return 0 if math.isnan(rating) else rating
+
+    def id_at(self, row):
+        return self.ids[row] or None
+
+    def restaurant_at(self, row):
+        return self.record(row)
+
+    def _np(self, name):
+        """Cached zero-copy NumPy view of a column (plus derived helper arrays)"""
+        view = self._views.get(name)
+        if view is None:
+            np = _numpy()
+            if name.endswith('_entry_rows'):
+                ends = self._np(name[:-len('_entry_rows')] + '_ends')
+                view = np.repeat(np.arange(self.size, dtype=np.uint32), np.diff(ends).astype(np.int64))
+            elif name == 'rank':
+                view = np.empty(self.size, dtype=np.uint32)
+                view[self._np('order')] = np.arange(self.size, dtype=np.uint32)
+            else:
+                column = getattr(self, name)
+                # array.array or (for mmapped snapshots) a cast memoryview
+                view = np.frombuffer(column, dtype=getattr(column, 'typecode', None) or column.format)
+            self._views[name] = view
+        return view
+
+    def _query_numpy(self, filters, min_rating, max_results):
+        """Boolean masks per filter, then a partial sort by rating rank"""
+        np = _numpy()
+        mask = None
+        for field, codes in filters:
+            wanted = np.fromiter(codes, dtype=np.uint32, count=len(codes))
+            if field in MULTI_VALUED:
+                hits = np.isin(self._np(f'{field}_codes'), wanted)
+                match = np.zeros(self.size, dtype=bool)
+                match[self._np(f'{field}_entry_rows')[hits]] = True
+            else:
+                match = np.isin(self._np(field), wanted)
+            mask = match if mask is None else mask & match
+        if min_rating is not None:
+            match = self._np('rating') >= min_rating
+            mask = match if mask is None else mask & match
+
+        ranks = self._np('rank')[np.flatnonzero(mask)]
+        if len(ranks) > max_results:
+            ranks = ranks[np.argpartition(ranks, max_results - 1)[:max_results]]
+        ranks.sort()
+        order = self._np('order')
+        return [int(order[rank]) for rank in ranks]
+
+
+def iter_restaurants(path, chunk_size=1 << 20):
+    """Yield the restaurants of a {"restaurants": [...]} JSON file one at a time.
+
+    The file is decoded incrementally, so only one chunk of text and one
+    restaurant dict are held at a time. Falls back to json.load when the
+    restaurants list is not the first key.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        start = re.match(r'\s*\{\s*"restaurants"\s*:\s*\[', buffer)
+        if not start:
+            f.seek(0)
+            yield from json.load(f).get('restaurants', [])
+            return
+        pos = start.end()
+        eof = False
+        while True:
+            pos = _skip(buffer, pos)
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                restaurant, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+            yield restaurant
+            pos = _skip(buffer, end)
+            if pos < len(buffer) and buffer[pos] == ',':
+                pos += 1
+            if pos >= len(buffer) - 1 and not eof:
+                more = f.read(chunk_size)
+                eof = not more
+                buffer = buffer[pos:] + more
+                pos = 0
+
+
+def _skip(buffer, pos):
+    while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+
+def load_columnar(path):
+    """Build a ColumnarCatalog from a restaurant_data.json file"""
+    return ColumnarCatalog.from_restaurants(iter_restaurants(path))
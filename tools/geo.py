@@ -0,0 +1,163 @@
+"""Spatial index for "near me" queries.
+
+Restaurants carry "coordinates": {"lat": ..., "lng": ...}. GeoIndex buckets
+them into a uniform grid of roughly cell_km x cell_km cells; a nearest
+query visits rings of cells outward from the query point, starting at the
+first ring that reaches an occupied cell, and stops once the next ring
+cannot hold anything closer than the k-th match found (or is beyond the
+radius), so it only reads the restaurants near the point instead of the
+whole catalog.
+
+The index is built over a query index (RestaurantIndex or ColumnarCatalog)
+and stores their positions (rating rank or row), so filters run against
+those indexes' own postings and columns.
+"""
+import heapq
+import math
+from array import array
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def coordinates_of(value):
+    """(lat, lng) from a restaurant's coordinates field, or None if missing or invalid"""
+    if not isinstance(value, dict):
+        return None
+    try:
+        lat, lng = float(value['lat']), float(value['lng'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+class GeoIndex:
+    """Uniform lat/lng grid over the restaurants of a query index"""
+
+    def __init__(self, query_index, cell_km=1.0):
+        self.query_index = query_index
+        self.cell_km = cell_km
+        positions, lats, lngs = array('I'), array('d'), array('d')
+        for position, lat, lng in query_index.iter_coordinates():
+            positions.append(position)
+            lats.append(lat)
+            lngs.append(lng)
+        self.lats, self.lngs = lats, lngs
+        self.size = len(positions)
+
+        # Longitude cells are sized for the catalog's mean latitude (a city, in practice)
+        mean_lat = sum(lats) / len(lats) if lats else 0.0
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lng_step = self.lat_step / max(0.01, math.cos(math.radians(mean_lat)))
+
+        cells = {}
+        for i in range(self.size):
+            cells.setdefault(self._cell(lats[i], lngs[i]), []).append(i)
+        # Entry indexes per cell, in position order (best rated first)
+        self.cells = {key: array('I', sorted(entries, key=positions.__getitem__)) for key, entries in cells.items()}
+        self.positions = positions
+        if cells:
+            rows, cols = zip(*cells)
+            self.bounds = (min(rows), max(rows), min(cols), max(cols))
+        else:
+            self.bounds = None
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.lat_step), math.floor(lng / self.lng_step)
+
+    def _ring(self, row, col, r):
+        """Grid cells at Chebyshev distance r from (row, col) that hold restaurants"""
+        if r == 0:
+            keys = [(row, col)]
+        else:
+            keys = [(row - r, c) for c in range(col - r, col + r + 1)]
+            keys += [(row + r, c) for c in range(col - r, col + r + 1)]
+            keys += [(rw, col - r) for rw in range(row - r + 1, row + r)]
+            keys += [(rw, col + r) for rw in range(row - r + 1, row + r)]
+        return [self.cells[key] for key in keys if key in self.cells]
+
+    def _max_ring(self, row, col):
+        lo_row, hi_row, lo_col, hi_col = self.bounds
+        return max(abs(row - lo_row), abs(row - hi_row), abs(col - lo_col), abs(col - hi_col))
+
+    def _min_ring(self, row, col):
+        """Chebyshev distance from (row, col) to the box of occupied cells (0 inside it)"""
+        lo_row, hi_row, lo_col, hi_col = self.bounds
+        return max(lo_row - row, row - hi_row, lo_col - col, col - hi_col, 0)
+
+    def _rings(self, row, col, first, last):
+        """(r, cells) for rings first..last that hold restaurants, nearest first.
+
+        Rings are walked cell by cell while they are small. Once a ring has
+        more cells than the grid has occupied cells, every occupied cell
+        left is returned as one last group, so a point far from the catalog
+        costs one pass over the occupied cells rather than every empty ring.
+        Grid distance is a poor bound that far out (longitude wraps), so
+        that group is scored in full.
+        """
+        r = first
+        while r <= last and 8 * r <= len(self.cells):
+            cells = self._ring(row, col, r)
+            if cells:
+                yield r, cells
+            r += 1
+        if r > last:
+            return
+        rest = []
+        for (cell_row, cell_col), cell in self.cells.items():
+            distance = max(abs(cell_row - row), abs(cell_col - col))
+            if r <= distance <= last:
+                rest.append((distance, cell))
+        rest.sort(key=lambda item: item[0])
+        if rest:
+            yield r, [cell for _, cell in rest]
+
+    def nearest(self, lat, lng, max_results=5, radius_km=None, accept=None):
+        """(distance_km, position) of the closest restaurants, nearest first.
+
+        accept(position) filters candidates (cuisine, rating, live
+        availability ...); it is only called for restaurants inside the
+        rings actually visited, closest cells first.
+        """
+        if not self.size or max_results <= 0:
+            return []
+        row, col = self._cell(lat, lng)
+        # Anything in ring r or beyond is at least (r - 1) * ring_km from the query point
+        lng_cell_km = self.lng_step * KM_PER_DEGREE * max(0.0, math.cos(math.radians(lat)))
+        ring_km = min(self.cell_km, lng_cell_km) if lng_cell_km > 0 else 0.0
+        last_ring = self._max_ring(row, col)
+        if radius_km is not None and ring_km > 0:
+            last_ring = min(last_ring, int(radius_km / ring_km) + 1)
+
+        best = []  # max-heap of (-distance, -position)
+        positions = self.positions
+        for r, cells in self._rings(row, col, self._min_ring(row, col), last_ring):
+            if len(best) >= max_results and -best[0][0] <= (r - 1) * ring_km:
+                break
+            for cell in cells:
+                for i in cell:
+                    distance = haversine_km(lat, lng, self.lats[i], self.lngs[i])
+                    if radius_km is not None and distance > radius_km:
+                        continue
+                    if len(best) >= max_results and (distance, positions[i]) >= (-best[0][0], -best[0][1]):
+                        continue
+                    if accept is not None and not accept(positions[i]):
+                        continue
+                    item = (-distance, -positions[i])
+                    if len(best) < max_results:
+                        heapq.heappush(best, item)
+                    else:
+                        heapq.heapreplace(best, item)
+        return sorted((-d, -p) for d, p in best)
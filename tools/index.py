@@ -0,0 +1,162 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from tools.geo import coordinates_of
+
+
+INDEXED_FIELDS = ('cuisine', 'location', 'ambience', 'features')
+
+
+def _values(restaurant, field):
+    """Get the lowercased values of a field, whether it is a list or a string"""
+    value = restaurant.get(field)
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [str(v).strip().lower() for v in value if v]
+
+
+def _unique_merge(postings):
+    """Merge rank-sorted posting lists into one, dropping duplicates"""
+    if len(postings) == 1:
+        return postings[0]
+    merged = []
+    last = -1
+    for rank in heapq.merge(*postings):
+        if rank != last:
+            merged.append(rank)
+            last = rank
+    return merged
+
+
+def _contains(posting, rank):
+    i = bisect_left(posting, rank)
+    return i < len(posting) and posting[i] == rank
+
+
+class RestaurantIndex:
+    """Inverted indexes over a catalog snapshot.
+
+    Restaurants are ranked once by rating (highest first), and every posting
+    list holds those ranks in ascending order, so the first k entries of any
+    posting list are already the top-k by rating.
+    """
+
+    def __init__(self, snapshot, max_cached_terms=1024):
+        ranked = sorted(enumerate(snapshot.restaurants),
+                        key=lambda item: (-(item[1].get('rating') or 0), item[0]))
+        self.restaurants = [r for _, r in ranked]
+        self.ratings = [r.get('rating') or 0 for r in self.restaurants]
+        self.postings = {field: {} for field in INDEXED_FIELDS}
+        self.by_name = {r.get('name', '').strip().lower(): r for r in self.restaurants}
+
+        for rank, restaurant in enumerate(self.restaurants):
+            for field in INDEXED_FIELDS:
+                field_postings = self.postings[field]
+                for value in set(_values(restaurant, field)):
+                    field_postings.setdefault(value, []).append(rank)
+
+        self.max_cached_terms = max_cached_terms
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, field, term):
+        """Get the posting list for every indexed value of a field containing term"""
+        term = term.strip().lower()
+        key = (field, term)
+        posting = self._resolved.get(key)
+        if posting is not None:
+            return posting
+
+        field_postings = self.postings[field]
+        matches = [p for value, p in field_postings.items() if term in value]
+        posting = _unique_merge(matches) if matches else []
+
+        with self._lock:
+            if len(self._resolved) >= self.max_cached_terms:
+                self._resolved.clear()
+            self._resolved[key] = posting
+        return posting
+
+    def values_in_text(self, field, text):
+        """Indexed values of a field mentioned as whole words in text, longest first"""
+        text = f" {' '.join(re.findall(r'[a-z0-9-]+', text.lower()))} "
+        found = [value for value in self.postings[field] if f" {value} " in text]
+        return sorted(found, key=len, reverse=True)
+
+    def lookup(self, field, term, max_results=5):
+        """Top-rated restaurants whose field matches term"""
+        posting = self.resolve(field, term)
+        return [self.restaurants[rank] for rank in posting[:max_results]]
+
+    def query(self, cuisine=None, location=None, ambience=None, features=None,
+              min_rating=None, max_results=5):
+        """Top-rated restaurants matching every given filter"""
+        postings = []
+        for field, term in (('cuisine', cuisine), ('location', location), ('ambience', ambience)):
+            if term:
+                postings.append(self.resolve(field, term))
+        if isinstance(features, str):
+            features = [features]
+        for feature in features or []:
+            postings.append(self.resolve('features', feature))
+
+        if any(not p for p in postings):
+            return []
+
+        # Walk the smallest list in rating order and probe the others
+        postings.sort(key=len)
+        candidates = postings[0] if postings else range(len(self.restaurants))
+        others = postings[1:]
+
+        results = []
+        for rank in candidates:
+            if min_rating is not None and self.ratings[rank] < min_rating:
+                break
+            if all(_contains(p, rank) for p in others):
+                results.append(self.restaurants[rank])
+                if len(results) >= max_results:
+                    break
+        return results
+
+    def top_rated(self, max_results=5):
+        """Top-rated restaurants overall"""
+        return self.restaurants[:max_results]
+
+    # Positions (rating ranks) for tools.geo, tools.search and tools.retrieval
+
+    def iter_coordinates(self):
+        """(rank, lat, lng) for every restaurant with valid coordinates"""
+        for rank, restaurant in enumerate(self.restaurants):
+            point = coordinates_of(restaurant.get('coordinates'))
+            if point is not None:
+                yield rank, point[0], point[1]
+
+    def iter_names(self):
+        """(rank, name) for every restaurant"""
+        for rank, restaurant in enumerate(self.restaurants):
+            yield rank, str(restaurant.get('name', ''))
+
+    def iter_restaurants(self):
+        """(rank, restaurant) for every restaurant"""
+        return enumerate(self.restaurants)
+
+    def field_values(self, field):
+        """Every indexed (lowercased) value of a field"""
+        return self.postings[field].keys()
+
+    def matcher(self, field, term):
+        """Predicate telling whether the restaurant at a rank matches term in field"""
+        posting = self.resolve(field, term)
+        return lambda rank: _contains(posting, rank)
+
+    def rating_at(self, rank):
+        return self.ratings[rank]
+
+    def id_at(self, rank):
+        return self.restaurants[rank].get('id')
+
+    def restaurant_at(self, rank):
+        return self.restaurants[rank]
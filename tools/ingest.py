@@ -0,0 +1,243 @@
+"""Incremental catalog changes: an append-only change log next to the data file.
+
+Instead of rewriting restaurant_data.json, systems such as a POS push
+changes, one JSON object per line in data/restaurant_data.changes.jsonl:
+
+    {"op": "slots", "id": "r001", "available_tables": {"2025-05-27": {"19:00": 5}}}
+    {"op": "upsert", "restaurant": {"id": "r031", "name": ..., ...}}
+    {"op": "close", "id": "r007"}
+
+"slots" sets published table counts (other slots keep theirs), "upsert"
+adds or replaces a whole restaurant and "close" removes one. Every change
+is absolute, so replaying the log over a data file that already contains
+some of it gives the same catalog.
+
+RestaurantCatalog replays the log on load and tails it afterwards (so
+changes appended by another process show up within check_interval). Slot
+changes only touch the availability of the restaurants named; upserts and
+closures produce a new snapshot. Subscribers to the catalog's change feed
+hear which restaurants changed. Once the log grows past
+FOODIESPOT_CHANGELOG_MAX_ENTRIES, or on request, it is compacted: folded
+into the data file (and its binary snapshot, if there is one) and emptied.
+
+    python -m tools.ingest apply data/restaurant_data.json changes.jsonl
+    python -m tools.ingest compact data/restaurant_data.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from tools.columnar import MAX_TABLES
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; appends there rely on O_APPEND alone
+    fcntl = None
+
+MAX_LOG_ENTRIES = int(os.getenv('FOODIESPOT_CHANGELOG_MAX_ENTRIES', '20000'))
+OPERATIONS = ('slots', 'upsert', 'close')
+
+
+class ChangeError(Exception):
+    """Raised for a change that is malformed"""
+
+
+def changelog_path_for(data_file):
+    """Default change log location for a JSON data file"""
+    return os.path.splitext(data_file)[0] + '.changes.jsonl'
+
+
+def check_tables(tables, op):
+    """Raise ChangeError unless tables is {date: {time: count}} with counts the catalog can store"""
+    if not isinstance(tables, dict) or not all(isinstance(slots, dict) for slots in tables.values()):
+        raise ChangeError(f"{op} needs available_tables as {{date: {{time: tables}}}}")
+    for slots in tables.values():
+        for count in slots.values():
+            if isinstance(count, bool) or not isinstance(count, int) or not 0 <= count <= MAX_TABLES:
+                raise ChangeError(f"table counts must be integers from 0 to {MAX_TABLES}")
+
+
+def normalize_change(change):
+    """Validate a change and return it as it is logged"""
+    if not isinstance(change, dict):
+        raise ChangeError("A change must be a JSON object")
+    op = change.get('op')
+    if op not in OPERATIONS:
+        raise ChangeError(f"op must be one of: {', '.join(OPERATIONS)}")
+    if op == 'upsert':
+        restaurant = change.get('restaurant')
+        if not isinstance(restaurant, dict) or not isinstance(restaurant.get('id'), str) or not restaurant['id']:
+            raise ChangeError("upsert needs a restaurant object with an id")
+        if restaurant.get('available_tables') is not None:
+            check_tables(restaurant['available_tables'], op)
+        entry = {'op': op, 'id': restaurant['id'], 'restaurant': restaurant}
+    else:
+        restaurant_id = change.get('id')
+        if not isinstance(restaurant_id, str) or not restaurant_id:
+            raise ChangeError(f"{op} needs a restaurant id")
+        entry = {'op': op, 'id': restaurant_id}
+        if op == 'slots':
+            check_tables(change.get('available_tables'), op)
+            entry['available_tables'] = change['available_tables']
+    entry['at'] = change.get('at') or datetime.now().isoformat()
+    return entry
+
+
+def merge_tables(available_tables, updates):
+    """available_tables with the counts in updates ({date: {time: tables}}) set on top"""
+    if not updates:
+        return available_tables
+    merged = {date: dict(slots) for date, slots in (available_tables or {}).items()}
+    for date, slots in updates.items():
+        merged.setdefault(date, {}).update(slots)
+    return merged
+
+
+def fold_slot_changes(slot_updates, entry):
+    """Record a slots entry in slot_updates (restaurant id -> {date: {time: tables}}).
+
+    The restaurant's dict is replaced, never changed in place, so readers holding
+    the previous one (without a lock) always see a consistent set of counts.
+    """
+    updates = dict(slot_updates.get(entry['id']) or {})
+    for date, slots in entry['available_tables'].items():
+        updates[date] = dict(updates.get(date) or {}, **slots)
+    slot_updates[entry['id']] = updates
+
+
+def apply_restaurant_changes(restaurants, entries):
+    """New list of restaurants with upsert and close entries applied in order"""
+    positions = {r.get('id'): i for i, r in enumerate(restaurants)}
+    restaurants = list(restaurants)
+    closed = set()
+    for entry in entries:
+        restaurant_id = entry['id']
+        if entry['op'] == 'upsert':
+            closed.discard(restaurant_id)
+            if restaurant_id in positions:
+                restaurants[positions[restaurant_id]] = entry['restaurant']
+            else:
+                positions[restaurant_id] = len(restaurants)
+                restaurants.append(entry['restaurant'])
+        elif entry['op'] == 'close' and restaurant_id in positions:
+            closed.add(restaurant_id)
+    if closed:
+        restaurants = [r for r in restaurants if r.get('id') not in closed]
+    return restaurants
+
+
+class ChangeLog:
+    """Append-only JSON-lines file of catalog changes.
+
+    Each append is a single write to a file opened in append mode (under
+    an exclusive flock where available), so concurrent writers, including
+    other processes, never interleave lines. Readers keep a byte offset
+    and read only what was added since.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def signature(self):
+        """(inode, size) of the log, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def append(self, entries):
+        """Append normalized entries; returns the log size afterwards"""
+        if not entries:
+            return (self.signature() or (0, 0))[1]
+        data = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries).encode('utf-8')
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            f = self._open_for_append()
+            with f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                return f.tell()
+
+    def _open_for_append(self):
+        """The log opened for appending and locked; reopened if compaction replaced it meanwhile"""
+        while True:
+            f = open(self.path, 'ab')
+            if not fcntl:
+                return f
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def read(self, offset=0):
+        """(entries, offset) of the complete lines from offset on; a partly written last line waits"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b'\n') + 1
+        entries = []
+        for line in data[:end].splitlines():
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries, offset + end
+
+    def truncate(self, offset):
+        """Drop the first offset bytes (already folded into the data file), keeping later appends"""
+        with self._lock, open(self.path, 'r+b') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(offset)
+            rest = f.read()
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'wb') as out:
+                out.write(rest)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, self.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply catalog changes or compact the change log")
+    commands = parser.add_subparsers(dest='command', required=True)
+    apply_parser = commands.add_parser('apply', help="append changes (JSON lines) to the change log")
+    apply_parser.add_argument('data_file')
+    apply_parser.add_argument('changes', nargs='?', default='-', help="JSON-lines file of changes (default: stdin)")
+    compact_parser = commands.add_parser('compact', help="fold the change log into the data file")
+    compact_parser.add_argument('data_file')
+    args = parser.parse_args()
+
+    # Run with -m this module is __main__, so catch the ChangeError tools.catalog uses
+    from tools import catalog as catalogs
+    catalog = catalogs.get_catalog(args.data_file)
+    if args.command == 'apply':
+        source = sys.stdin if args.changes == '-' else open(args.changes)
+        with source:
+            changes = [json.loads(line) for line in source if line.strip()]
+        try:
+            applied = catalog.apply_changes(changes)
+        except catalogs.ChangeError as e:
+            sys.exit(f"Rejected: {str(e)}")
+        print(f"Applied {applied} changes")
+    else:
+        catalog.compact_changes()
+        print(f"Compacted the change log into {args.data_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,80 +1,177 @@
-import json
-from utils.logger import log_message, log_error
+from tools.availability import get_availability_engine
+from tools.catalog import get_catalog
+from tools.geo import GeoIndex
+from tools.index import RestaurantIndex
+from tools.retrieval import RestaurantRetriever
+from tools.search import RestaurantSearch
+from utils import tracing
+
+FIND_THRESHOLD = 0.8  # find_restaurant only accepts a close fuzzy match
+
+
+def restaurant_card(restaurant):
+    """One restaurant as a markdown card for format_restaurant_list"""
+    # Handle cuisine display for both list and string
+    cuisine = restaurant.get('cuisine', 'Unknown')
+    if isinstance(cuisine, list):
+        cuisine = ', '.join(cuisine)
+    return (f"🍽️ **{restaurant['name']}**\n"
+            f"   📍 {restaurant.get('location', 'Location not specified')}\n"
+            f"   🍴 {cuisine}\n"
+            f"   ⭐ {restaurant.get('rating', 'No rating')}/5\n"
+            f"   👥 Capacity: {restaurant.get('capacity', 'Not specified')}\n\n")
+
 
 class RecommendationTool:
-    def __init__(self, data_file="data/restaurant_data.json"):
+    def __init__(self, data_file="data/restaurant_data.json", compact=None):
         self.data_file = data_file
+        self.catalog = get_catalog(data_file, compact)
     
     def load_restaurants(self):
-        """Load restaurant data"""
-        try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-                return data.get('restaurants', [])
-        except Exception as e:
-            log_error(f"Failed to load restaurants: {str(e)}")
-            return []
+        """Load restaurant data from the shared catalog"""
+        return self.catalog.get_restaurants()
+    
+    def get_index(self):
+        """Get the query index for the current catalog snapshot"""
+        return self._index_for(self.catalog.snapshot())
+    
+    def _index_for(self, snapshot):
+        if snapshot.compact:
+            # The columnar catalog answers the same queries itself
+            return snapshot.restaurants
+        return snapshot.derived('recommendation_index', RestaurantIndex)
+    
+    def get_geo_index(self):
+        """Get the spatial index for the current catalog snapshot"""
+        return self.catalog.snapshot().derived('geo_index', lambda s: GeoIndex(self._index_for(s)))
+    
+    def get_search_index(self):
+        """Get the fuzzy search index for the current catalog snapshot"""
+        return self.catalog.snapshot().derived('search_index', lambda s: RestaurantSearch(self._index_for(s)))
+    
+    def get_retriever(self):
+        """Get the retrieval index of restaurant facts for the current catalog snapshot"""
+        return self.catalog.snapshot().derived('retriever', lambda s: RestaurantRetriever(self._index_for(s)))
     
     def recommend_by_cuisine(self, cuisine_type, max_results=5):
         """Recommend restaurants by cuisine"""
-        restaurants = self.load_restaurants()
-        matches = []
-        
-        for restaurant in restaurants:
-            cuisine = restaurant.get('cuisine', '')
-            
-            # Handle both list and string cuisine types
-            if isinstance(cuisine, list):
-                # Check if cuisine_type matches any item in the list
-                if any(cuisine_type.lower() in c.lower() for c in cuisine):
-                    matches.append(restaurant)
-            elif isinstance(cuisine, str):
-                # Check if cuisine_type is in the string
-                if cuisine_type.lower() in cuisine.lower():
-                    matches.append(restaurant)
-        
-        # Sort by rating
-        matches.sort(key=lambda x: x.get('rating', 0), reverse=True)
-        return matches[:max_results]
+        return self.get_index().lookup('cuisine', cuisine_type, max_results)
     
     def recommend_by_location(self, location, max_results=5):
         """Recommend restaurants by location"""
-        restaurants = self.load_restaurants()
-        matches = []
+        return self.get_index().lookup('location', location, max_results)
+    
+    def recommend_by_ambience(self, ambience, max_results=5):
+        """Recommend restaurants by ambience"""
+        return self.get_index().lookup('ambience', ambience, max_results)
+    
+    def recommend_by_feature(self, feature, max_results=5):
+        """Recommend restaurants offering a feature"""
+        return self.get_index().lookup('features', feature, max_results)
+    
+    def recommend(self, cuisine=None, location=None, ambience=None, features=None,
+                  min_rating=None, max_results=5):
+        """Recommend restaurants matching all of the given filters"""
+        return self.get_index().query(cuisine=cuisine, location=location, ambience=ambience,
+                                      features=features, min_rating=min_rating,
+                                      max_results=max_results)
+    
+    def recommend_nearby(self, lat, lng, radius_km=None, cuisine=None, min_rating=None,
+                         date=None, time=None, party_size=2, max_results=5):
+        """Closest restaurants to a point, nearest first, each with a distance_km.
         
-        for restaurant in restaurants:
-            location_field = restaurant.get('location', '')
-            if location.lower() in location_field.lower():
-                matches.append(restaurant)
+        Optionally only those within radius_km, serving cuisine, rated at
+        least min_rating, and with a free table for party_size at date/time
+        right now (per the shared availability engine).
+        """
+        with tracing.span('catalog_lookup', nearby=True) as span:
+            geo = self.get_geo_index()
+            index = geo.query_index
+            checks = []
+            if cuisine:
+                checks.append(index.matcher('cuisine', cuisine))
+            if min_rating is not None:
+                checks.append(lambda position: index.rating_at(position) >= min_rating)
+            if date and time:
+                availability = get_availability_engine(self.data_file)
+                checks.append(lambda position: availability.is_available(
+                    index.id_at(position), date, time, party_size))
+            accept = (lambda position: all(check(position) for check in checks)) if checks else None
+            
+            results = []
+            for distance, position in geo.nearest(lat, lng, max_results, radius_km, accept):
+                restaurant = dict(index.restaurant_at(position))
+                restaurant['distance_km'] = round(distance, 2)
+                results.append(restaurant)
+            span.set(results=len(results))
+            return results
+    
+    def search(self, text, max_results=5, **filters):
+        """Restaurants for free text, tolerating typos, synonyms and filler words.
         
-        matches.sort(key=lambda x: x.get('rating', 0), reverse=True)
-        return matches[:max_results]
+        filters (cuisine=, location=, ambience=, features=) take precedence
+        over what the text says.
+        """
+        with tracing.span('catalog_lookup', search=True) as span:
+            results = self.get_search_index().search(text, max_results, **filters)
+            span.set(results=len(results))
+            return results
+    
+    def search_restaurants(self, name, max_results=10):
+        """Restaurants whose names best match a (partial or misspelled) name"""
+        return [restaurant for _, restaurant in self.get_search_index().search_names(name, max_results)]
+    
+    def general_context(self, question):
+        """Catalog overview plus the facts of the restaurants a question is about, for a prompt"""
+        with tracing.span('retrieval'):
+            return self.get_retriever().context(question)
+    
+    def parse_query(self, text):
+        """Catalog values mentioned in text: {'cuisine', 'location', 'ambience', 'features', 'unmatched'}"""
+        return self.get_search_index().parse(text).as_dict()
+    
+    def resolve_term(self, field, text):
+        """Catalog value of field that text (e.g. LLM output) most likely means, or None"""
+        return self.get_search_index().resolve(field, text)
+    
+    def find_restaurant(self, name):
+        """Find a restaurant by name: exact (case-insensitive) first, then the closest close match"""
+        restaurant = self.get_index().by_name.get(name.strip().lower())
+        if restaurant is None:
+            matches = self.get_search_index().search_names(name, 1, threshold=FIND_THRESHOLD)
+            restaurant = matches[0][1] if matches else None
+        return restaurant
+    
+    def detect_cuisine(self, text):
+        """Cuisine from the catalog mentioned in text (typos and synonyms allowed), or None"""
+        return self.get_search_index().parse(text).value('cuisine')
+    
+    def detect_location(self, text):
+        """Location from the catalog mentioned in text (typos allowed), or None"""
+        return self.get_search_index().parse(text).value('location')
     
     def get_all_restaurants(self):
         """Get all restaurants"""
         return self.load_restaurants()
     
+    def get_cards(self):
+        """Get the rendered restaurant cards (by id) for the current catalog snapshot, filled in on first use"""
+        return self.catalog.snapshot().derived('restaurant_cards', lambda s: {})
+    
     def format_restaurant_list(self, restaurants):
         """Format restaurant list for display"""
         if not restaurants:
             return "No restaurants found."
         
-        result = "Here are the restaurants:\n\n"
+        # Cards are cached per snapshot, so a catalog change re-renders them
+        cards = self.get_cards()
+        parts = ["Here are the restaurants:\n\n"]
         for restaurant in restaurants:
-            # Handle cuisine display for both list and string
-            cuisine = restaurant.get('cuisine', 'Unknown')
-            if isinstance(cuisine, list):
-                cuisine_str = ', '.join(cuisine)
-            else:
-                cuisine_str = cuisine
-                
-            result += f"🍽️ **{restaurant['name']}**\n"
-            result += f"   📍 {restaurant.get('location', 'Location not specified')}\n"
-            result += f"   🍴 {cuisine_str}\n"
-            result += f"   ⭐ {restaurant.get('rating', 'No rating')}/5\n"
-            
-            # Handle capacity safely
-            capacity = restaurant.get('capacity', 'Not specified')
-            result += f"   👥 Capacity: {capacity}\n\n"
-        
-        return result
+            restaurant_id = restaurant.get('id')
+            card = cards.get(restaurant_id) if restaurant_id else None
+            if card is None:
+                card = restaurant_card(restaurant)
+                if restaurant_id:
+                    cards[restaurant_id] = card
+            parts.append(card)
+        return ''.join(parts)
@@ -1,60 +1,222 @@
-import json
 import uuid
-from datetime import datetime
+from datetime import date as calendar_date, datetime
+from tools.availability import get_availability_engine, normalize_time
+from tools.catalog import get_catalog
+from tools.reservation_store import SlotFullError, get_reservation_store
+from utils import tracing
 from utils.logger import log_message, log_error
 
+def _slot(request):
+    """(restaurant_id, date, time, party_size) of a booking or availability request dict"""
+    return request['restaurant_id'], request['date'], request['time'], request['party_size']
+
+
+def _new_reservation(restaurant_id, date, time, party_size, customer_name, phone, special_requests):
+    return {
+        'id': str(uuid.uuid4()),
+        'restaurant_id': restaurant_id,
+        'date': date,
+        'time': normalize_time(time),
+        'party_size': party_size,
+        'customer_name': customer_name,
+        'phone': phone,
+        'status': 'confirmed',
+        'special_requests': special_requests or '',
+        'created_at': datetime.now().isoformat()
+    }
+
+
 class ReservationTool:
-    def __init__(self, data_file="data/restaurant_data.json"):
+    """Bookings against the shared availability engine, saved to the reservation store.
+
+    The engine's counts only know this process's bookings (and those on
+    disk at startup), so every write also asks the store to check the slot
+    against the database; a slot another worker has filled meanwhile is
+    refused there and the engine's tables are handed back.
+    """
+
+    def __init__(self, data_file="data/restaurant_data.json", db_path="data/reservations.db"):
         self.data_file = data_file
-        self.reservations = []  # In-memory storage for demo
+        self.catalog = get_catalog(data_file)
+        self.availability = get_availability_engine(data_file)
+        self.store = get_reservation_store(db_path)
+        # Only bookings from today on can still take a table
+        today = calendar_date.today().isoformat()
+        self.availability.load_bookings(self.store.db_path, self.store.iter_confirmed(since=today))
         
     def load_restaurants(self):
-        """Load restaurant data"""
-        try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-                return data.get('restaurants', [])
-        except Exception as e:
-            log_error(f"Failed to load restaurants: {str(e)}")
-            return []
+        """Load restaurant data from the shared catalog"""
+        return self.catalog.get_restaurants()
     
     def check_availability(self, restaurant_id, date, time, party_size):
         """Check if restaurant has availability"""
-        restaurants = self.load_restaurants()
-        
-        for restaurant in restaurants:
-            if restaurant['id'] == restaurant_id:
-                # Simple availability check (in real app, check actual bookings)
-                capacity = restaurant.get('capacity', 0)
-                if party_size <= capacity:
-                    return True
-        return False
+        with tracing.span('availability_check'):
+            return self.availability.is_available(restaurant_id, date, time, party_size)
     
-    def make_reservation(self, restaurant_id, date, time, party_size, customer_name, phone):
+    def check_availability_many(self, requests):
+        """Check many slots in one pass.
+
+        requests are dicts with restaurant_id, date, time and party_size; each
+        comes back with available and remaining_tables added.
+        """
+        with tracing.span('availability_check', batch=len(requests)):
+            results = self.availability.check_many([_slot(request) for request in requests])
+        return [dict(request, available=available, remaining_tables=remaining)
+                for request, (available, remaining) in zip(requests, results)]
+    
+    def find_available_slots(self, date, time, party_size, max_results=5, restaurant_ids=None):
+        """Find the free slots closest to the requested time"""
+        with tracing.span('availability_check', nearest=True):
+            return self.availability.find_nearest_slots(date, time, party_size, max_results, restaurant_ids)
+    
+    def prefetch_availability(self):
+        """Warm the availability engine so the next slot search does not build it"""
+        with tracing.span('availability_prefetch'):
+            self.availability.prefetch()
+    
+    def make_reservation(self, restaurant_id, date, time, party_size, customer_name, phone, special_requests=''):
         """Create a new reservation"""
-        if self.check_availability(restaurant_id, date, time, party_size):
-            reservation = {
-                'id': str(uuid.uuid4()),
-                'restaurant_id': restaurant_id,
-                'date': date,
-                'time': time,
-                'party_size': party_size,
-                'customer_name': customer_name,
-                'phone': phone,
-                'status': 'confirmed',
-                'created_at': datetime.now().isoformat()
-            }
+        with tracing.span('booking'):
+            return self._make_reservation(restaurant_id, date, time, party_size, customer_name, phone,
+                                          special_requests)
+    
+    def _make_reservation(self, restaurant_id, date, time, party_size, customer_name, phone, special_requests):
+        if self.availability.reserve(restaurant_id, date, time, party_size):
+            reservation = _new_reservation(restaurant_id, date, time, party_size, customer_name, phone,
+                                           special_requests)
             
-            self.reservations.append(reservation)
-            log_message(f"Reservation created: {reservation['id']}")
+            capacity = self.availability.capacity(restaurant_id, date, time)
+            try:
+                self.store.add(reservation, capacity)
+            except SlotFullError:
+                self.availability.release(restaurant_id, date, time, party_size)
+                log_message("Slot filled by another worker: %s %s %s", restaurant_id, date, time)
+                return None
+            except Exception as e:
+                self.availability.release(restaurant_id, date, time, party_size)
+                log_error("Failed to save reservation: %s", e)
+                return None
+            log_message("Reservation created: %s", reservation['id'])
             return reservation
         else:
             return None
     
+    def make_reservations(self, bookings):
+        """Book several slots all-or-nothing, e.g. the tables of a group event.
+
+        bookings are dicts with the make_reservation arguments. Returns
+        (reservations, unavailable): the confirmed reservations, saved in a
+        single commit, or None and the indexes of the bookings that had no
+        room (empty if saving failed). On any failure nothing stays booked.
+        """
+        if not bookings:
+            return [], []
+        slots = [_slot(booking) for booking in bookings]
+        with tracing.span('booking', batch=len(bookings)):
+            unavailable = self.availability.reserve_many(slots)
+            if unavailable:
+                return None, unavailable
+            reservations = [
+                _new_reservation(booking['restaurant_id'], booking['date'], booking['time'],
+                                 booking['party_size'], booking['customer_name'], booking['phone'],
+                                 booking.get('special_requests'))
+                for booking in bookings
+            ]
+            capacities = [self.availability.capacity(*slot[:3]) for slot in slots]
+            try:
+                self.store.add_many(reservations, capacities)
+            except SlotFullError as e:
+                self.availability.release_many(slots)
+                log_message("Group reservation slot filled by another worker: %d", e.index)
+                return None, [e.index]
+            except Exception as e:
+                self.availability.release_many(slots)
+                log_error("Failed to save group reservation: %s", e)
+                return None, []
+        log_message("Group reservation created: %d bookings", len(reservations))
+        return reservations, []
+    
+    def get_reservation(self, reservation_id):
+        """Look up a reservation by confirmation number"""
+        return self.store.get(reservation_id.strip())
+    
+    def find_reservations(self, phone=None, customer_name=None, restaurant_id=None, date=None):
+        """Look up reservations by phone, customer name, or restaurant and date"""
+        if phone:
+            reservations = self.store.find_by_phone(phone)
+        elif customer_name:
+            reservations = self.store.find_by_name(customer_name)
+        elif restaurant_id and date:
+            return self.store.find_by_restaurant_date(restaurant_id, date)
+        else:
+            return []
+        
+        if phone and customer_name:
+            name = customer_name.strip().lower()
+            reservations = [r for r in reservations if r['customer_name'].strip().lower() == name]
+        if restaurant_id:
+            reservations = [r for r in reservations if r['restaurant_id'] == restaurant_id]
+        if date:
+            reservations = [r for r in reservations if r['date'] == date]
+        return reservations
+    
+    def cancel_reservation(self, reservation_id):
+        """Cancel a reservation and free its tables"""
+        reservation = self.get_reservation(reservation_id)
+        if not reservation or reservation['status'] != 'confirmed':
+            return None
+        
+        changes = {'status': 'cancelled', 'updated_at': datetime.now().isoformat()}
+        if not self.store.update(reservation['id'], changes, expected_status='confirmed'):
+            return None
+        
+        self.availability.release(reservation['restaurant_id'], reservation['date'],
+                                  reservation['time'], reservation['party_size'])
+        reservation.update(changes)
+        log_message("Reservation cancelled: %s", reservation['id'])
+        return reservation
+    
+    def modify_reservation(self, reservation_id, date=None, time=None, party_size=None, special_requests=None):
+        """Change the date, time, party size or requests of a reservation"""
+        reservation = self.get_reservation(reservation_id)
+        if not reservation or reservation['status'] != 'confirmed':
+            return None
+        
+        new_date = date or reservation['date']
+        new_time = normalize_time(time) if time else reservation['time']
+        new_party_size = party_size or reservation['party_size']
+        slot_changed = (new_date, new_time, new_party_size) != (
+            reservation['date'], reservation['time'], reservation['party_size'])
+        
+        if slot_changed and not self.availability.move(
+                reservation['restaurant_id'], reservation['date'], reservation['time'],
+                reservation['party_size'], new_date, new_time, new_party_size):
+            return None
+        
+        changes = {'date': new_date, 'time': new_time, 'party_size': new_party_size,
+                   'updated_at': datetime.now().isoformat()}
+        if special_requests is not None:
+            changes['special_requests'] = special_requests
+        
+        slot = None
+        if slot_changed:
+            slot = (reservation['restaurant_id'], new_date, new_time, new_party_size,
+                    self.availability.capacity(reservation['restaurant_id'], new_date, new_time))
+        try:
+            updated = self.store.update(reservation['id'], changes, expected_status='confirmed', slot=slot)
+        except Exception as e:
+            log_error("Failed to update reservation: %s", e)
+            updated = False
+        if not updated:
+            if slot_changed:
+                self.availability.move(reservation['restaurant_id'], new_date, new_time, new_party_size,
+                                       reservation['date'], reservation['time'], reservation['party_size'])
+            return None
+        
+        reservation.update(changes)
+        log_message("Reservation modified: %s", reservation['id'])
+        return reservation
+    
     def get_restaurant_info(self, restaurant_id):
         """Get restaurant information"""
-        restaurants = self.load_restaurants()
-        for restaurant in restaurants:
-            if restaurant['id'] == restaurant_id:
-                return restaurant
-        return None
+        return self.catalog.get_restaurant(restaurant_id)
@@ -0,0 +1,315 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from tools.availability import TABLE_SEATS, tables_needed
+from utils.logger import log_message, log_error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY,
+    restaurant_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    party_size INTEGER NOT NULL,
+    customer_name TEXT NOT NULL,
+    customer_name_key TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    phone_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    special_requests TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_phone ON reservations (phone_key);
+CREATE INDEX IF NOT EXISTS idx_reservations_name ON reservations (customer_name_key);
+CREATE INDEX IF NOT EXISTS idx_reservations_restaurant_date ON reservations (restaurant_id, date);
+CREATE INDEX IF NOT EXISTS idx_reservations_status_date ON reservations (status, date);
+"""
+
+COLUMNS = ('id', 'restaurant_id', 'date', 'time', 'party_size', 'customer_name', 'phone',
+           'status', 'special_requests', 'created_at', 'updated_at')
+
+UPDATABLE = ('date', 'time', 'party_size', 'customer_name', 'phone', 'status',
+             'special_requests', 'updated_at')
+
+
+# Tables held by confirmed bookings at one slot, counted the way the availability engine does
+BOOKED_TABLES_SQL = (f"SELECT COALESCE(SUM((party_size + {TABLE_SEATS - 1}) / {TABLE_SEATS}), 0) FROM reservations "
+                     "WHERE restaurant_id = ? AND date = ? AND time = ? AND status = 'confirmed' AND id != ?")
+
+
+class SlotFullError(Exception):
+    """Raised when a guarded write would book more tables than a slot has.
+
+    index is the position of the statement that did not fit in its job.
+    """
+
+    def __init__(self, index):
+        super().__init__(f"statement {index} has no room at its slot")
+        self.index = index
+
+
+def phone_key(phone):
+    """Digits-only form of a phone number used for lookups"""
+    return re.sub(r'\D', '', str(phone))
+
+
+def name_key(name):
+    """Case- and whitespace-insensitive form of a customer name"""
+    return ' '.join(str(name).lower().split())
+
+
+class ReservationStore:
+    """SQLite-backed reservation storage.
+
+    The database runs in WAL mode so readers never block the writer. Reads
+    use a small pool of connections; writes are queued to one writer thread
+    that commits everything waiting in a single transaction (group commit).
+    Each submitted job runs inside its own savepoint, so one failing job
+    does not roll back the others sharing its commit.
+
+    Several processes may share one database, each with its own in-memory
+    availability. Writes given a capacity therefore re-count the slot's
+    confirmed bookings inside the write transaction (BEGIN IMMEDIATE holds
+    the database lock) and match no row if the party no longer fits.
+    """
+
+    def __init__(self, db_path="data/reservations.db", pool_size=4, max_batch=128):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        writer = self._connect()
+        writer.executescript(SCHEMA)
+        writer.commit()
+        self._writer = writer
+
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        self._jobs = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name="reservation-writer", daemon=True)
+        self._thread.start()
+        log_message("Reservation store opened: %s", db_path)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA busy_timeout=5000")
+        return connection
+
+    @contextmanager
+    def _reader(self):
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def _write_loop(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._jobs.put(None)
+                    break
+                batch.append(job)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        cursor = self._writer.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for statements, result in batch:
+                cursor.execute("SAVEPOINT job")
+                try:
+                    result['rowcounts'] = [cursor.execute(sql, params).rowcount
+                                           for sql, params in statements]
+                    if result['guarded']:
+                        for index, rowcount in enumerate(result['rowcounts']):
+                            if rowcount == 0:
+                                raise SlotFullError(index)
+                    cursor.execute("RELEASE SAVEPOINT job")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT job")
+                    cursor.execute("RELEASE SAVEPOINT job")
+                    result['error'] = e
+            cursor.execute("COMMIT")
+        except Exception as e:
+            log_error("Reservation batch commit failed: %s", e)
+            try:
+                cursor.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            for _, result in batch:
+                result.setdefault('error', e)
+        finally:
+            for _, result in batch:
+                result['done'].set()
+
+    def execute(self, statements, guarded=False):
+        """Run statements as one all-or-nothing job and wait for its commit.
+
+        With guarded, a statement that matches no row fails the whole job
+        with SlotFullError.
+        """
+        if self._closed:
+            raise RuntimeError("Reservation store is closed")
+        result = {'done': threading.Event(), 'guarded': guarded}
+        self._jobs.put((list(statements), result))
+        result['done'].wait()
+        if 'error' in result:
+            raise result['error']
+        return result['rowcounts']
+
+    def _row_to_dict(self, row):
+        return {column: row[column] for column in COLUMNS}
+
+    def _query(self, sql, params=()):
+        with self._reader() as connection:
+            rows = connection.execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _fits(restaurant_id, date, time, party_size, capacity, reservation_id=''):
+        """WHERE condition (and params) that the party still fits in capacity tables at its slot"""
+        return (f"({BOOKED_TABLES_SQL}) + ? <= ?",
+                (restaurant_id, date, time, reservation_id, tables_needed(party_size), capacity))
+
+    def insert_statement(self, reservation, capacity=None):
+        """Build the INSERT for a reservation dict; with capacity, only if its slot has room"""
+        values = dict(reservation)
+        values.setdefault('special_requests', '')
+        values.setdefault('updated_at', None)
+        values['customer_name_key'] = name_key(values['customer_name'])
+        values['phone_key'] = phone_key(values['phone'])
+        columns = COLUMNS + ('customer_name_key', 'phone_key')
+        params = tuple(values[c] for c in columns)
+        if capacity is None:
+            sql = (f"INSERT INTO reservations ({', '.join(columns)}) "
+                   f"VALUES ({', '.join('?' for _ in columns)})")
+            return sql, params
+        condition, condition_params = self._fits(values['restaurant_id'], values['date'], values['time'],
+                                                 values['party_size'], capacity)
+        sql = (f"INSERT INTO reservations ({', '.join(columns)}) "
+               f"SELECT {', '.join('?' for _ in columns)} WHERE {condition}")
+        return sql, params + condition_params
+
+    def update_statement(self, reservation_id, changes, expected_status=None, slot=None):
+        """Build the UPDATE applying changes to one reservation.
+
+        slot, if given, is (restaurant_id, date, time, party_size, capacity)
+        of the booking after the change: it must still fit there, not
+        counting the reservation itself.
+        """
+        changes = {k: v for k, v in changes.items() if k in UPDATABLE}
+        if 'customer_name' in changes:
+            changes['customer_name_key'] = name_key(changes['customer_name'])
+        if 'phone' in changes:
+            changes['phone_key'] = phone_key(changes['phone'])
+        assignments = ', '.join(f"{column} = ?" for column in changes)
+        sql = f"UPDATE reservations SET {assignments} WHERE id = ?"
+        params = list(changes.values()) + [reservation_id]
+        if expected_status is not None:
+            sql += " AND status = ?"
+            params.append(expected_status)
+        if slot is not None:
+            condition, condition_params = self._fits(*slot, reservation_id=reservation_id)
+            sql += f" AND {condition}"
+            params.extend(condition_params)
+        return sql, tuple(params)
+
+    def add(self, reservation, capacity=None):
+        """Persist a new reservation; with capacity, raise SlotFullError if its slot is already full"""
+        self.execute([self.insert_statement(reservation, capacity)], guarded=capacity is not None)
+        return reservation
+
+    def add_many(self, reservations, capacities=None):
+        """Persist several reservations in a single all-or-nothing job (guarded per slot like add)"""
+        if capacities is None:
+            self.execute([self.insert_statement(r) for r in reservations])
+        else:
+            self.execute([self.insert_statement(r, c) for r, c in zip(reservations, capacities)], guarded=True)
+        return reservations
+
+    def update(self, reservation_id, changes, expected_status=None, slot=None):
+        """Apply changes to a reservation; returns False if nothing matched (or it no longer fits)"""
+        rowcounts = self.execute([self.update_statement(reservation_id, changes, expected_status, slot)])
+        return rowcounts[0] == 1
+
+    def get(self, reservation_id):
+        """Get a reservation by id (confirmation number)"""
+        rows = self._query("SELECT * FROM reservations WHERE id = ?", (reservation_id,))
+        return rows[0] if rows else None
+
+    def find_by_phone(self, phone):
+        """Reservations made with a phone number"""
+        return self._query("SELECT * FROM reservations WHERE phone_key = ? ORDER BY date, time",
+                           (phone_key(phone),))
+
+    def find_by_name(self, customer_name):
+        """Reservations made under a customer name"""
+        return self._query("SELECT * FROM reservations WHERE customer_name_key = ? ORDER BY date, time",
+                           (name_key(customer_name),))
+
+    def find_by_restaurant_date(self, restaurant_id, date):
+        """Reservations at a restaurant on a date"""
+        return self._query("SELECT * FROM reservations WHERE restaurant_id = ? AND date = ? ORDER BY time",
+                           (restaurant_id, date))
+
+    def iter_confirmed(self, since=None):
+        """Yield (restaurant_id, date, time, party_size) for confirmed bookings dated since or later"""
+        sql = "SELECT restaurant_id, date, time, party_size FROM reservations WHERE status = 'confirmed'"
+        params = ()
+        if since is not None:
+            # Served by idx_reservations_status_date, so past bookings are never read
+            sql += " AND date >= ?"
+            params = (since,)
+        with self._reader() as connection:
+            cursor = connection.execute(sql, params)
+            for row in cursor:
+                yield tuple(row)
+
+    def close(self):
+        """Flush pending writes and close all connections"""
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.put(None)
+        self._thread.join()
+        self._writer.close()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_reservation_store(db_path="data/reservations.db"):
+    """Get the shared reservation store for a database file"""
+    key = os.path.abspath(db_path)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = ReservationStore(db_path)
+                _stores[key] = store
+    return store
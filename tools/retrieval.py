@@ -0,0 +1,177 @@
+"""Retrieval of restaurant facts for general-information answers.
+
+Every restaurant is turned once (per catalog snapshot) into a short text
+chunk: name, neighborhood, cuisine, ambience, rating, features, seating
+times and contact. Chunks are indexed with BM25 over the words of the
+descriptive fields (name, neighborhood, cuisine, ambience, features), so a
+question such as "which places have a patio and live music?" or "is
+Sakura Garden romantic?" retrieves the few restaurants it is about, and
+only those go into the prompt, under a hard token cap.
+
+Query words go through the same normalization as restaurant search
+(synonyms, filler words dropped) and words not in the index are mapped to
+the closest indexed word, so typos still retrieve. Everything is local:
+no embeddings service, no network.
+"""
+import heapq
+import math
+import os
+from array import array
+from tools.search import MATCH_THRESHOLD, STOPWORDS, TrigramIndex, normalize_words, plain_words
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOP_K = int(os.getenv('FOODIESPOT_RETRIEVAL_K', '5'))
+DEFAULT_MAX_TOKENS = int(os.getenv('FOODIESPOT_RETRIEVAL_TOKENS', '400'))
+MIN_SCORE_RATIO = 0.4  # drop matches scoring under this fraction of the best one
+
+# Words asking about an attribute every restaurant has; they do not say which restaurant
+ATTRIBUTE_WORDS = frozenset("""
+address call close closed closes closing contact hour hours menu number open opening opens phone
+price prices rated rating ratings reservation reservations seat seats table tables time times
+""".split())
+
+
+def seating_times(available_tables):
+    """Sorted distinct times that have had tables, e.g. ['18:00', '19:00']"""
+    times = set()
+    for slots in (available_tables or {}).values():
+        if isinstance(slots, dict):
+            times.update(slots)
+    return sorted(times)
+
+
+def restaurant_chunk(restaurant):
+    """One restaurant as a compact line of facts"""
+    parts = [f"{restaurant.get('name', 'Unnamed')} ({restaurant.get('location', 'location unknown')})"]
+    cuisine = restaurant.get('cuisine')
+    if cuisine:
+        parts.append(', '.join(cuisine) if isinstance(cuisine, list) else str(cuisine))
+    if restaurant.get('ambience'):
+        parts.append(f"{restaurant['ambience']} ambience")
+    if restaurant.get('rating') is not None:
+        parts.append(f"rated {restaurant['rating']}/5")
+    if restaurant.get('features'):
+        parts.append('features: ' + ', '.join(restaurant['features']))
+    if restaurant.get('seating_capacity'):
+        parts.append(f"seats {restaurant['seating_capacity']}")
+    hours = restaurant.get('hours') or restaurant.get('opening_hours')
+    if hours:
+        parts.append(f"hours: {hours}")
+    times = seating_times(restaurant.get('available_tables'))
+    if times:
+        parts.append(f"reservations {times[0]}-{times[-1]}" if len(times) > 1 else f"reservations at {times[0]}")
+    phone = (restaurant.get('contact') or {}).get('phone')
+    if phone:
+        parts.append(f"phone {phone}")
+    return '; '.join(parts)
+
+
+def restaurant_words(restaurant):
+    """Words a restaurant is retrieved by: name, neighborhood, cuisine, ambience and features"""
+    words = []
+    for field in ('name', 'location', 'cuisine', 'ambience', 'features'):
+        value = restaurant.get(field)
+        for item in value if isinstance(value, list) else [value] if value else []:
+            words.extend(w for w in plain_words(item) if w not in STOPWORDS)
+    return words
+
+
+class RestaurantRetriever:
+    """BM25 index over one text chunk per restaurant of a query index"""
+
+    def __init__(self, query_index, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self.positions = array('I')
+        self.lengths = array('I')
+        postings = {}  # word -> (doc ids, term frequencies)
+        locations = set()
+        for position, restaurant in query_index.iter_restaurants():
+            doc = len(self.chunks)
+            chunk = restaurant_chunk(restaurant)
+            self.chunks.append(chunk)
+            self.positions.append(position)
+            if restaurant.get('location'):
+                locations.add(str(restaurant['location']))
+            words = restaurant_words(restaurant)
+            self.lengths.append(len(words))
+            counts = {}
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+            for word, count in counts.items():
+                posting = postings.get(word)
+                if posting is None:
+                    posting = postings[word] = (array('I'), array('H'))
+                posting[0].append(doc)
+                posting[1].append(min(count, 0xFFFF))
+        self.postings = postings
+        self.size = len(self.chunks)
+        self.average_length = sum(self.lengths) / self.size if self.size else 0.0
+        self.words = TrigramIndex(postings)
+        self.overview = (f"FoodieSpot has {self.size} locations across the city"
+                         + (f" ({', '.join(sorted(locations))})." if locations else "."))
+
+    def __len__(self):
+        return self.size
+
+    def query_words(self, text):
+        """Indexed words for a question: normalized, typos mapped to the closest indexed word"""
+        words = []
+        for word in normalize_words(text):
+            for part in plain_words(word):
+                if part in STOPWORDS or part in ATTRIBUTE_WORDS:
+                    continue
+                if part not in self.postings:
+                    match = self.words.match(part, threshold=MATCH_THRESHOLD, limit=1)
+                    if not match:
+                        continue
+                    part = self.words.terms[match[0][1]]
+                if part not in words:
+                    words.append(part)
+        return words
+
+    def _idf(self, word):
+        df = len(self.postings[word][0])
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def retrieve(self, text, top_k=DEFAULT_TOP_K):
+        """[(score, chunk)] of the restaurants best matching text, best first"""
+        words = self.query_words(text)
+        if not words or not self.size:
+            return []
+        k1, b, average = self.k1, self.b, self.average_length or 1.0
+        scores = {}
+        for word in words:
+            idf = self._idf(word)
+            docs, frequencies = self.postings[word]
+            for doc, tf in zip(docs, frequencies):
+                norm = k1 * (1 - b + b * self.lengths[doc] / average)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        # Ties go to the better-rated restaurant where positions are rating ranks
+        best = heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], self.positions[item[0]]))
+        cutoff = best[0][1] * MIN_SCORE_RATIO if best else 0.0
+        return [(score, self.chunks[doc]) for doc, score in best if score >= cutoff]
+
+    def context(self, text, top_k=DEFAULT_TOP_K, max_tokens=DEFAULT_MAX_TOKENS):
+        """Prompt context for a question: the overview plus retrieved chunks, within max_tokens"""
+        budget = max_tokens * CHARS_PER_TOKEN
+        overview = self.overview
+        if len(overview) > budget:
+            overview = overview[:max(0, budget - 4)].rsplit(', ', 1)[0] + ' ...'
+        lines = [overview]
+        used = len(overview)
+        retrieved = self.retrieve(text, top_k)
+        if retrieved:
+            header = "Restaurants relevant to the question:"
+            used += len(header) + 1
+            lines.append(header)
+            for _, chunk in retrieved:
+                line = f"- {chunk}"
+                if used + len(line) + 1 > budget:
+                    break
+                lines.append(line)
+                used += len(line) + 1
+            if len(lines) == 2:
+                lines.pop()
+        return "\n".join(lines)
@@ -0,0 +1,344 @@
+"""Typo-tolerant restaurant search.
+
+Free text such as "japaneese sushi place in midtwn" or LLM output like
+"Italian cuisine." is resolved against the catalog in three steps:
+
+1. normalize: lowercase words, synonyms ("ramen" -> japanese, "veggie" ->
+   vegetarian) and filler words ("place", "food", "show me") dropped
+2. match word n-grams against the values of each indexed field through a
+   trigram index, scoring candidates by trigram overlap and by edit
+   distance (so transpositions in short words like "thia" still match)
+3. run the matched values as filters on the catalog's query index, ranked
+   by rating; if that finds fewer than max_results, the weakest filters
+   are relaxed one at a time and those results follow
+
+Unrecognized text matches nothing rather than everything. Restaurant
+names have their own trigram index, built on first use, for
+name lookups such as the booking form's picker.
+"""
+import re
+import threading
+from array import array
+from tools.index import INDEXED_FIELDS
+
+MATCH_THRESHOLD = 0.75
+NAME_THRESHOLD = 0.5
+SUBSTRING_SCORE = 0.95
+MAX_NGRAM = 3
+MAX_EDIT_LENGTH = 12  # longer text (names, phrases) is scored on trigram overlap alone
+
+# Weight of each field when deciding which filters to relax first
+FIELD_WEIGHTS = {'cuisine': 3.0, 'location': 2.0, 'features': 1.5, 'ambience': 1.0}
+
+SYNONYMS = {
+    'ramen': 'japanese', 'udon': 'japanese', 'izakaya': 'japanese', 'sashimi': 'sushi',
+    'pasta': 'italian', 'trattoria': 'italian', 'pizzeria': 'pizza',
+    'taco': 'mexican', 'tacos': 'mexican', 'burrito': 'mexican', 'burritos': 'mexican',
+    'curry': 'indian', 'tandoori': 'indian', 'biryani': 'indian',
+    'dim sum': 'chinese', 'dumplings': 'chinese', 'noodles': 'chinese',
+    'pho': 'vietnamese', 'banh mi': 'vietnamese', 'kimchi': 'korean', 'korean bbq': 'korean',
+    'burger': 'american', 'burgers': 'american', 'diner': 'american',
+    'barbecue': 'bbq', 'barbeque': 'bbq', 'steak': 'steakhouse', 'steaks': 'steakhouse',
+    'fish': 'seafood', 'oysters': 'seafood', 'tapas': 'spanish', 'paella': 'spanish',
+    'gyro': 'greek', 'falafel': 'lebanese', 'hummus': 'lebanese', 'bistro': 'french',
+    'veggie': 'vegetarian', 'plant based': 'vegan', 'plant-based': 'vegan',
+    'outdoor': 'outdoor seating', 'outside': 'outdoor seating', 'patio': 'outdoor seating',
+    'terrace': 'outdoor seating', 'roof': 'rooftop', 'kid friendly': 'kids menu',
+    'family friendly': 'family', 'date night': 'romantic', 'fancy': 'upscale', 'fine dining': 'upscale',
+    'parking': 'parking available', 'wifi': 'free wifi', 'dog friendly': 'pet friendly',
+}
+
+STOPWORDS = frozenset("""
+a an and any are around at best can cuisine dinner do eat eating find food for from give good have
+i in is it like looking lunch me near nice of on or place places please recommend recommendation
+recommendations restaurant restaurants serve serves serving show some somewhere spot spots suggest the
+there to want we what where which with would you your
+""".split())
+
+
+def plain_words(text):
+    """Lowercase words of text, punctuation dropped"""
+    words = re.findall(r"[a-z0-9][a-z0-9'&-]*", str(text).lower())
+    return [w[:-2] if w.endswith("'s") else w for w in words]
+
+
+def normalize_words(text):
+    """Lowercase words of text with synonyms applied and filler words removed"""
+    words = plain_words(text)
+    result = []
+    i = 0
+    while i < len(words):
+        # Two-word synonyms first ("dim sum", "date night")
+        pair = ' '.join(words[i:i + 2])
+        if i + 1 < len(words) and pair in SYNONYMS:
+            result.extend(SYNONYMS[pair].split())
+            i += 2
+            continue
+        word = words[i]
+        if word in SYNONYMS:
+            result.extend(SYNONYMS[word].split())
+        elif word not in STOPWORDS:
+            result.append(word)
+        i += 1
+    return result
+
+
+def trigrams(text):
+    """Padded character trigrams of a term ("  a", " ab", "abc", ..., "yz ")"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit=None):
+    """Optimal string alignment distance (adjacent transpositions count as one edit)"""
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _edit_limit(length):
+    """Edits tolerated in a word of this length; very short words must match exactly"""
+    return 0 if length <= 3 else 1 if length <= 5 else 2 if length <= 10 else 3
+
+
+def similarity(query, term, edits=True):
+    """0..1 score: the better of trigram Dice overlap and normalized edit distance"""
+    if query == term:
+        return 1.0
+    query_grams, term_grams = trigrams(query), trigrams(term)
+    dice = 2 * len(query_grams & term_grams) / (len(query_grams) + len(term_grams))
+    longest = max(len(query), len(term))
+    limit = _edit_limit(longest)
+    if not limit or not edits:
+        # One typo in three letters is a different word
+        return dice if limit else 0.0
+    distance = edit_distance(query, term, limit)
+    edit_score = 1 - distance / longest if distance <= limit else 0.0
+    return max(dice, edit_score)
+
+
+class TrigramIndex:
+    """Trigram postings over a set of terms, for fuzzy term lookup"""
+
+    def __init__(self, terms=(), max_posting_fraction=0.2):
+        self.terms = []
+        self._ids = {}
+        self._postings = {}
+        self.max_posting_fraction = max_posting_fraction
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        """Add a term (if new) and return its id"""
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[term] = len(self.terms)
+            self.terms.append(term)
+            for gram in trigrams(term):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    posting = self._postings[gram] = array('I')
+                posting.append(term_id)
+        return term_id
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, term):
+        return term in self._ids
+
+    def term_id(self, term):
+        return self._ids.get(term)
+
+    def match(self, text, threshold=MATCH_THRESHOLD, limit=5, substring=False):
+        """[(score, term_id)] of the best matching terms, best first.
+
+        With substring=True, terms containing text score SUBSTRING_SCORE
+        (for matching names as they are typed).
+        """
+        exact = self._ids.get(text)
+        if exact is not None and limit == 1:
+            return [(1.0, exact)]
+        grams = trigrams(text)
+        postings = [self._postings[g] for g in grams if g in self._postings]
+        # Skip trigrams shared by a large part of the terms ("  t", "the"), unless nothing else is left
+        cap = max(64, int(len(self.terms) * self.max_posting_fraction))
+        selective = [p for p in postings if len(p) <= cap] or postings
+        shared = {}
+        for posting in selective:
+            for term_id in posting:
+                shared[term_id] = shared.get(term_id, 0) + 1
+        skipped = len(postings) - len(selective)
+
+        # A term within the edit limit still shares all but 3 trigrams per edit
+        edit_floor = len(grams) - 3 * _edit_limit(len(text) + 3)
+        scored = []
+        for term_id, count in shared.items():
+            term = self.terms[term_id]
+            hits = count + skipped
+            if substring and hits >= len(grams) - 2 and text in term:
+                scored.append((1.0 if text == term else SUBSTRING_SCORE, term_id))
+                continue
+            # Upper bound of the Dice score, counting skipped trigrams as shared
+            if 2 * hits / (len(grams) + len(term) + 1) < threshold and hits < edit_floor:
+                continue
+            # Edit distance is only worth computing when the term can be within the edit limit
+            score = similarity(text, term, edits=hits >= edit_floor and len(text) <= MAX_EDIT_LENGTH)
+            if score >= threshold:
+                scored.append((score, term_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:limit]
+
+
+class SearchQuery:
+    """What a piece of text resolved to: catalog values per field and leftover words"""
+
+    def __init__(self, text):
+        self.text = text
+        self.words = normalize_words(text)
+        self.filters = {}  # field -> [(value, score)], best first
+        self.unmatched = []
+
+    def value(self, field):
+        """Best matching value for a field, or None"""
+        matches = self.filters.get(field)
+        return matches[0][0] if matches else None
+
+    def values(self, field):
+        return [value for value, _ in self.filters.get(field, [])]
+
+    def as_dict(self):
+        return {
+            'cuisine': self.value('cuisine'),
+            'location': self.value('location'),
+            'ambience': self.value('ambience'),
+            'features': self.values('features'),
+            'unmatched': list(self.unmatched),
+        }
+
+    def __bool__(self):
+        return bool(self.filters)
+
+
+class RestaurantSearch:
+    """Fuzzy search over a query index (RestaurantIndex or ColumnarCatalog)"""
+
+    def __init__(self, query_index):
+        self.query_index = query_index
+        self.fields = {field: TrigramIndex(sorted(query_index.field_values(field))) for field in INDEXED_FIELDS}
+        self._names = None
+        self._name_positions = None
+        self._names_lock = threading.Lock()
+
+    def resolve(self, field, text, threshold=MATCH_THRESHOLD):
+        """Catalog value of a field that text most likely means, or None"""
+        words = normalize_words(text)
+        if not words:
+            return None
+        matches = self.fields[field].match(' '.join(words), threshold, limit=1)
+        return self.fields[field].terms[matches[0][1]] if matches else None
+
+    def parse(self, text):
+        """Resolve every recognizable field value mentioned in text"""
+        query = SearchQuery(text)
+        words = query.words
+        used = [False] * len(words)
+        candidates = []
+        for n in range(min(MAX_NGRAM, len(words)), 0, -1):
+            for start in range(len(words) - n + 1):
+                phrase = ' '.join(words[start:start + n])
+                for field, index in self.fields.items():
+                    for score, term_id in index.match(phrase, limit=1):
+                        candidates.append((score, n, start, field, index.terms[term_id]))
+        # Best scores first, longer phrases winning ties; each word is used once
+        candidates.sort(key=lambda c: (-c[0], -c[1], c[2]))
+        for score, n, start, field, value in candidates:
+            if any(used[start:start + n]):
+                continue
+            if field != 'features' and field in query.filters:
+                continue
+            used[start:start + n] = [True] * n
+            query.filters.setdefault(field, []).append((value, round(score, 3)))
+        query.unmatched = [word for word, taken in zip(words, used) if not taken]
+        return query
+
+    def search(self, text, max_results=5, **overrides):
+        """Top restaurants for free text: all matched filters first, then relaxed ones.
+
+        overrides (cuisine=, location=, ambience=, features=) replace what
+        the text says for those fields, e.g. slots from structured
+        extraction; they are resolved the same way. Returns [] when nothing
+        in the text or overrides matches the catalog.
+        """
+        query = self.parse(text)
+        for field, value in overrides.items():
+            if not value:
+                continue
+            values = [value] if isinstance(value, str) else value
+            query.filters[field] = [(self.resolve(field, v) or v.strip().lower(), 1.0) for v in values]
+        if not query:
+            return []
+
+        filters = [(field, value, score * FIELD_WEIGHTS.get(field, 1.0))
+                   for field, matches in query.filters.items() for value, score in matches]
+        results, seen = [], set()
+        while filters and len(results) < max_results:
+            for restaurant in self._run(filters, max_results):
+                key = restaurant.get('id') or id(restaurant)
+                if key not in seen:
+                    seen.add(key)
+                    results.append(restaurant)
+                    if len(results) >= max_results:
+                        break
+            # Drop the least important filter and try again
+            filters.remove(min(filters, key=lambda f: f[2]))
+        return results
+
+    def _run(self, filters, max_results):
+        params = {'features': []}
+        for field, value, _ in filters:
+            if field == 'features':
+                params['features'].append(value)
+            else:
+                params[field] = value
+        return self.query_index.query(max_results=max_results, **params)
+
+    def _name_index(self):
+        if self._names is None:
+            with self._names_lock:
+                if self._names is None:
+                    names = TrigramIndex()
+                    positions = {}
+                    for position, name in self.query_index.iter_names():
+                        term_id = names.add(' '.join(plain_words(name)))
+                        positions.setdefault(term_id, []).append(position)
+                    self._name_positions = positions
+                    self._names = names
+        return self._names
+
+    def search_names(self, text, max_results=5, threshold=NAME_THRESHOLD):
+        """[(score, restaurant)] whose names best match text, best first"""
+        names = self._name_index()
+        normalized = ' '.join(plain_words(text))
+        if not normalized:
+            return []
+        index = self.query_index
+        hits = []
+        for score, term_id in names.match(normalized, threshold, limit=max_results, substring=True):
+            for position in self._name_positions[term_id]:
+                hits.append((score, index.rating_at(position), position))
+        hits.sort(key=lambda h: (-h[0], -h[1], h[2]))
+        return [(round(score, 3), index.restaurant_at(position)) for score, _, position in hits[:max_results]]
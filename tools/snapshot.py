@@ -0,0 +1,158 @@
+"""Binary catalog snapshots that workers open with mmap.
+
+Compile once, offline or at deploy time:
+
+    python -m tools.snapshot data/restaurant_data.json
+
+This writes data/restaurant_data.snapshot next to the JSON. The file holds
+the ColumnarCatalog columns (fixed-width arrays, packed strings and the
+precomputed rating/id/name orders) behind a small JSON header with the
+string table, vocabularies and the size and mtime of the source JSON.
+
+RestaurantCatalog opens a snapshot when one exists for its data file and
+still matches the JSON; every column is a zero-copy memoryview over a
+read-only mmap, so startup does no parsing and all worker processes share
+one page-cache copy. A missing, stale or unreadable snapshot falls back to
+parsing the JSON.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+from tools.columnar import ARRAY_COLUMNS, STRING_COLUMNS, ColumnarCatalog, PackedStrings, load_columnar
+from utils.logger import log_message, log_error
+
+MAGIC = b'FSCAT\x00\x01\x00'
+FORMAT_VERSION = 2
+ALIGNMENT = 8
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file cannot be used"""
+
+
+def snapshot_path_for(data_file):
+    """Default snapshot location for a JSON data file"""
+    return os.path.splitext(data_file)[0] + '.snapshot'
+
+
+def _source_signature(data_file):
+    stat = os.stat(data_file)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _sections(catalog):
+    """(name, typecode, buffer) for every column"""
+    for name in STRING_COLUMNS:
+        packed = getattr(catalog, name)
+        yield f'{name}.blob', 'B', packed.blob
+        yield f'{name}.ends', packed.ends.typecode, packed.ends
+    for name in ARRAY_COLUMNS:
+        column = getattr(catalog, name)
+        yield name, column.typecode, column
+
+
+def compile_snapshot(data_file, snapshot_file=None):
+    """Convert a restaurant_data.json file into a binary snapshot; returns its path"""
+    snapshot_file = snapshot_file or snapshot_path_for(data_file)
+    source = _source_signature(data_file)
+    catalog = load_columnar(data_file)
+
+    sections = {}
+    offset = 0
+    payload = []
+    for name, typecode, column in _sections(catalog):
+        data = memoryview(column).cast('B')
+        sections[name] = {'offset': offset, 'nbytes': len(data), 'typecode': typecode}
+        payload.append((offset, data))
+        offset = _align(offset + len(data))
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'source': source,
+        'size': catalog.size,
+        'values': catalog.values,
+        'dates': catalog.dates,
+        'times': catalog.times,
+        'vocab': catalog.vocab,
+        'extras': catalog.extras,
+        'sections': sections,
+    }).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    temp_path = f"{snapshot_file}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for section_offset, data in payload:
+            f.seek(data_start + section_offset)
+            f.write(data)
+    os.replace(temp_path, snapshot_file)
+    log_message("Catalog snapshot written: %s (%d restaurants)", snapshot_file, catalog.size)
+    return snapshot_file
+
+
+def open_snapshot(snapshot_file):
+    """Open a snapshot as a ColumnarCatalog backed by a read-only mmap"""
+    with open(snapshot_file, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise SnapshotError(f"{snapshot_file} is not a catalog snapshot")
+    header_length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 8], 'little')
+    header_start = len(MAGIC) + 8
+    header = json.loads(mapped[header_start:header_start + header_length])
+    if header.get('version') != FORMAT_VERSION or header.get('byteorder') != sys.byteorder:
+        raise SnapshotError(f"{snapshot_file} was written by an incompatible version or platform")
+
+    data_start = _align(header_start + header_length)
+    buffer = memoryview(mapped)
+
+    def section(name):
+        info = header['sections'][name]
+        start = data_start + info['offset']
+        view = buffer[start:start + info['nbytes']]
+        return view if info['typecode'] == 'B' else view.cast(info['typecode'])
+
+    columns = {name: PackedStrings(section(f'{name}.blob'), section(f'{name}.ends')) for name in STRING_COLUMNS}
+    columns.update((name, section(name)) for name in ARRAY_COLUMNS)
+    vocab = {field: {int(code): value for code, value in codes.items()} for field, codes in header['vocab'].items()}
+    extras = {int(row): value for row, value in header['extras'].items()}
+    catalog = ColumnarCatalog(columns, header['values'], header['dates'], header['times'], extras, vocab)
+    catalog.source = header['source']
+    return catalog
+
+
+def load_snapshot(data_file, snapshot_file=None):
+    """The snapshot for data_file if it exists and is up to date, else None"""
+    snapshot_file = snapshot_file or snapshot_path_for(data_file)
+    if not os.path.exists(snapshot_file):
+        return None
+    try:
+        catalog = open_snapshot(snapshot_file)
+    except (OSError, ValueError, KeyError, SnapshotError) as e:
+        log_error("Ignoring catalog snapshot %s: %s", snapshot_file, e)
+        return None
+    if os.path.exists(data_file) and catalog.source != _source_signature(data_file):
+        log_error("Catalog snapshot %s is older than %s; recompile it. Using JSON.", snapshot_file, data_file)
+        return None
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile restaurant_data.json into a binary catalog snapshot")
+    parser.add_argument('data_file', nargs='?', default='data/restaurant_data.json')
+    parser.add_argument('--output', help="snapshot path (default: next to the JSON, .snapshot)")
+    args = parser.parse_args()
+    path = compile_snapshot(args.data_file, args.output)
+    print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
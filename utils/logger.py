@@ -1,23 +1,265 @@
+"""Non-blocking logging for FoodieSpot.
+
+log_message/log_error only check the level and put the record on a
+bounded queue; a background thread formats queued records and writes them
+in batches (one write and flush per batch per handler). Configuration
+comes from the environment or configure_logging():
+
+- FOODIESPOT_LOG_LEVEL: minimum level (default INFO)
+- FOODIESPOT_LOG_FORMAT: 'text' (default) or 'json', one object per line
+- FOODIESPOT_LOG_FILE: also write to this file, rotated at
+  FOODIESPOT_LOG_MAX_BYTES (default 10 MB) keeping FOODIESPOT_LOG_BACKUPS
+  (default 5) old files
+- FOODIESPOT_LOG_SAMPLE_RATE: fraction of sample=True info lines kept
+  (default 1.0)
+
+Pass values as %-style args (log_message("Loaded %d rows", n)) rather than
+f-strings so nothing is formatted when the level is disabled; args should
+be immutable values, since they are formatted on the writer thread.
+"""
+import atexit
+import json
 import logging
 import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+QUEUE_SIZE = 10000
+MAX_BATCH = 256
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in every 1/rate INFO records that ask to be sampled, per message template"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.set_rate(rate)
+        self._seen = {}
+
+    def set_rate(self, rate):
+        rate = min(1.0, max(0.0, float(rate)))
+        self.every = round(1 / rate) if rate > 0 else 0
+
+    def filter(self, record):
+        if not getattr(record, 'sample', False) or record.levelno > logging.INFO or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        # Races between threads only shift which line is kept
+        seen = self._seen.get(record.msg, 0)
+        self._seen[record.msg] = seen + 1
+        return seen % self.every == 0
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records are dropped (and counted) when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Leave msg % args to the writer thread; only tracebacks must be rendered here
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that writes a whole batch with one write and flush"""
+
+    def emit_batch(self, records):
+        try:
+            self.stream.write(''.join(self.format(r) + self.terminator for r in records))
+            self.flush()
+        except Exception:
+            self.handleError(records[0])
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that writes a whole batch with one write and flush"""
+
+    def emit_batch(self, records):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            size = self.stream.tell()
+            pending = []
+            for record in records:
+                line = self.format(record) + self.terminator
+                if self.maxBytes and size and size + len(line) > self.maxBytes:
+                    self.stream.write(''.join(pending))
+                    pending = []
+                    self.doRollover()
+                    size = 0
+                pending.append(line)
+                size += len(line)
+            self.stream.write(''.join(pending))
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[0])
+
+
+class BatchingListener:
+    """Background thread draining the log queue and writing records in batches"""
+
+    def __init__(self, log_queue, handlers, max_batch=MAX_BATCH):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.max_batch = max_batch
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="foodiespot-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far, then stop the thread"""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.close()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # Whatever queued up while the last batch was written goes out together
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            records = [r for r in batch if r is not _STOP]
+            if records:
+                self._write(records)
+            if stop:
+                return
+
+    def _write(self, records):
+        for handler in self.handlers:
+            accepted = [r for r in records if r.levelno >= handler.level]
+            if accepted:
+                handler.emit_batch(accepted)
+
+
+_logger = logging.getLogger("foodiespot")
+# Set now so level checks work before the pipeline is started
+_logger.setLevel(os.getenv('FOODIESPOT_LOG_LEVEL', 'INFO').upper())
+_lock = threading.Lock()
+_setup_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_sampler = SamplingFilter(1.0)
+
+
+def configure_logging(level=None, fmt=None, log_file=None, sample_rate=None,
+                      max_bytes=None, backups=None):
+    """(Re)build the logging pipeline; unset arguments come from the environment"""
+    global _listener, _queue_handler
+    level = level or os.getenv('FOODIESPOT_LOG_LEVEL', 'INFO')
+    fmt = fmt or os.getenv('FOODIESPOT_LOG_FORMAT', 'text')
+    log_file = log_file if log_file is not None else os.getenv('FOODIESPOT_LOG_FILE')
+    sample_rate = sample_rate if sample_rate is not None else float(os.getenv('FOODIESPOT_LOG_SAMPLE_RATE', '1.0'))
+    max_bytes = max_bytes if max_bytes is not None else int(os.getenv('FOODIESPOT_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    backups = backups if backups is not None else int(os.getenv('FOODIESPOT_LOG_BACKUPS', '5'))
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _logger.removeHandler(_queue_handler)
+
+        formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers = [BatchStreamHandler(sys.stderr)]
+        if log_file:
+            handlers.append(BatchRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(QUEUE_SIZE)
+        _sampler.set_rate(sample_rate)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(_sampler)
+        _logger.setLevel(level.upper() if isinstance(level, str) else level)
+        _logger.propagate = False
+        _logger.addHandler(_queue_handler)
+        _listener = BatchingListener(log_queue, handlers)
+        _listener.start()
+    return _logger
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+
+
+atexit.register(shutdown_logging)
+
 
 def setup_logger():
-    """Setup basic logger"""
-    logger = logging.getLogger("foodiespot")
-    if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-    return logger
-
-def log_message(message):
-    """Log info message"""
-    logger = setup_logger()
-    logger.info(message)
-
-def log_error(error_message):
+    """Return the foodiespot logger, configuring it on first use"""
+    if _listener is None:
+        with _setup_lock:
+            if _listener is None:
+                configure_logging()
+    return _logger
+
+
+def dropped_records():
+    """Number of records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def log_message(message, *args, sample=False):
+    """Log info message; sample=True marks high-volume lines subject to sampling"""
+    if _logger.isEnabledFor(logging.INFO):
+        setup_logger()
+        _logger.info(message, *args, extra={'sample': True} if sample else None)
+
+
+def log_debug(message, *args):
+    """Log debug message"""
+    if _logger.isEnabledFor(logging.DEBUG):
+        setup_logger()
+        _logger.debug(message, *args)
+
+
+def log_error(error_message, *args):
     """Log error message"""
-    logger = setup_logger()
-    logger.error(f"ERROR: {error_message}")
+    if _logger.isEnabledFor(logging.ERROR):
+        setup_logger()
+        _logger.error("ERROR: " + str(error_message), *args)
@@ -0,0 +1,308 @@
+"""Per-stage latency tracing and Prometheus-format metrics.
+
+Tracing is off unless FOODIESPOT_TRACING=1 (or configure(enabled=True)) is
+set; while off, span() hands back a shared no-op and count() returns at
+once, so instrumented code pays only a function call. When on:
+
+- every span records its duration in the foodiespot_stage_seconds
+  histogram, labelled by stage
+- counters track LLM tokens (from the OpenRouter `usage` field), response
+  cache hits and misses, retries, request outcomes and where intents came
+  from (the local classifier's hit rate)
+- with FOODIESPOT_TRACE_FILE set, each turn is appended to that file as
+  one JSON line listing its spans
+
+render_metrics() returns the Prometheus text exposition (the API server
+serves it on /metrics).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from utils.logger import log_error
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS = {
+    'foodiespot_stage_seconds': ('histogram', "Time spent in each stage of a turn"),
+    'foodiespot_turns_total': ('counter', "Agent turns by resolved intent"),
+    'foodiespot_llm_requests_total': ('counter', "LLM API responses by HTTP status or error"),
+    'foodiespot_llm_retries_total': ('counter', "LLM API retries by reason"),
+    'foodiespot_llm_tokens_total': ('counter', "LLM tokens reported by the API"),
+    'foodiespot_llm_cache_total': ('counter', "LLM response cache lookups by result"),
+    'foodiespot_llm_coalesced_total': ('counter', "LLM calls that shared an identical request already in flight"),
+    'foodiespot_llm_throttled_total': ('counter', "LLM calls turned away by the rate limiter, by reason"),
+    'foodiespot_intent_total': ('counter', "Intents by source: the local classifier or the LLM"),
+}
+
+_enabled = os.getenv('FOODIESPOT_TRACING', '').lower() in ('1', 'true', 'yes')
+_trace_file = os.getenv('FOODIESPOT_TRACE_FILE') or None
+_trace_lock = threading.Lock()
+
+_current_trace = contextvars.ContextVar('foodiespot_trace', default=None)
+_current_span = contextvars.ContextVar('foodiespot_span', default=None)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by (name, labels)"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then sum and count
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h[0]), h[1], h[2]) for key, h in self._histograms.items()}
+
+        lines = []
+        names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+        for name in names:
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+_registry = MetricsRegistry()
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Times one stage; records it in the stage histogram and the current trace"""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.parent = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited from another context (e.g. a generator closed elsewhere)
+            _current_span.set(self.parent)
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs['error'] = exc_type.__name__
+        _registry.observe('foodiespot_stage_seconds', self.duration, stage=self.name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self)
+        return False
+
+
+class Trace:
+    """Spans recorded during one agent turn"""
+
+    def __init__(self, name, attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.start = None
+        self.started_at = None
+        self._token = None
+        self._lock = threading.Lock()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, span):
+        entry = {
+            'stage': span.name,
+            'parent': span.parent.name if span.parent else None,
+            'start_ms': round((span.start - self.start) * 1000, 3),
+            'duration_ms': round(span.duration * 1000, 3),
+        }
+        if span.attrs:
+            entry.update(span.attrs)
+        with self._lock:
+            self.spans.append(entry)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        try:
+            _current_trace.reset(self._token)
+        except ValueError:
+            _current_trace.set(None)
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs['error'] = exc_type.__name__
+        _registry.observe('foodiespot_stage_seconds', duration, stage=self.name)
+        _registry.inc('foodiespot_turns_total', intent=self.attrs.get('intent', 'unknown'))
+        if _trace_file:
+            self._write(duration)
+        return False
+
+    def _write(self, duration):
+        record = {
+            'trace_id': self.id,
+            'name': self.name,
+            'timestamp': round(self.started_at, 3),
+            'duration_ms': round(duration * 1000, 3),
+        }
+        record.update(self.attrs)
+        record['spans'] = sorted(self.spans, key=lambda s: s['start_ms'])
+        line = json.dumps(record, default=str) + "\n"
+        try:
+            with _trace_lock, open(_trace_file, 'a') as f:
+                f.write(line)
+        except OSError as e:
+            log_error("Failed to write trace: %s", e)
+
+
+def configure(enabled=None, trace_file=None):
+    """Turn tracing on or off and set (or clear, with '') the JSON trace file"""
+    global _enabled, _trace_file
+    if enabled is not None:
+        _enabled = bool(enabled)
+    if trace_file is not None:
+        _trace_file = trace_file or None
+
+
+def is_enabled():
+    return _enabled
+
+
+def span(name, **attrs):
+    """Context manager timing one stage of the current turn"""
+    if not _enabled:
+        return NOOP_SPAN
+    return Span(name, attrs)
+
+
+def turn(name='turn', **attrs):
+    """Context manager wrapping one agent turn; spans inside it form its trace"""
+    if not _enabled:
+        return NOOP_SPAN
+    return Trace(name, attrs)
+
+
+def annotate(**attrs):
+    """Attach attributes to the current turn (e.g. the resolved intent)"""
+    if not _enabled:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.set(**attrs)
+
+
+def count(name, value=1, **labels):
+    """Increment a counter (see METRICS for the names in use)"""
+    if not _enabled:
+        return
+    _registry.inc(name, value, **labels)
+
+
+def record_usage(usage):
+    """Count tokens from an OpenRouter `usage` object and note them on the current span"""
+    if not _enabled or not usage:
+        return
+    prompt = usage.get('prompt_tokens') or 0
+    completion = usage.get('completion_tokens') or 0
+    _registry.inc('foodiespot_llm_tokens_total', prompt, type='prompt')
+    _registry.inc('foodiespot_llm_tokens_total', completion, type='completion')
+    current = _current_span.get()
+    if current is not None:
+        current.attrs['prompt_tokens'] = current.attrs.get('prompt_tokens', 0) + prompt
+        current.attrs['completion_tokens'] = current.attrs.get('completion_tokens', 0) + completion
+
+
+def current_span():
+    """The innermost open span, or the no-op span"""
+    return (_current_span.get() if _enabled else None) or NOOP_SPAN
+
+
+def render_metrics():
+    return _registry.render()
+
+
+def get_metrics_registry():
+    return _registry